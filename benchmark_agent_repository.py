@@ -0,0 +1,97 @@
+"""
+Micro-benchmark del AgentRepository.
+
+Compara las búsquedas indexadas (índice invertido de capacidades, conjunto
+de agentes activos y resumen cacheado por versión) con un recorrido lineal
+del catálogo, para catálogos de 10k y 100k agentes.
+
+La capacidad consultada la tienen siempre 10 agentes, de modo que si la
+búsqueda es O(resultado) su coste no debe crecer con el catálogo.
+
+Uso:
+    python benchmark_agent_repository.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Añadir src al path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from agent_repository import AgentRepository
+from orchestrator_state import AgentSpec
+
+
+def build_repository(size: int) -> AgentRepository:
+    """
+    Crea un repositorio con `size` agentes sintéticos.
+    """
+    repo = AgentRepository()
+    rare_every = size // 10
+    for i in range(size):
+        capabilities = [f"cap_{i % 1000}", f"skill_{i % 37}"]
+        if i % rare_every == 1:
+            capabilities.append("rare_capability")
+        repo.add_agent(AgentSpec(
+            agent_id=f"agent_{i}",
+            role=f"Agente sintético {i}",
+            capabilities=capabilities,
+            tools=[],
+            system_prompt="Agente de prueba.",
+            active=i % 5 != 0,
+        ))
+    return repo
+
+
+def linear_find(repo: AgentRepository, capability: str) -> list[AgentSpec]:
+    """
+    Implementación previa: recorrido completo del catálogo.
+    """
+    return [
+        spec for spec in repo._catalog.values()
+        if capability in spec.capabilities and spec.active
+    ]
+
+
+def time_per_call(fn, repeat: int) -> float:
+    """
+    Tiempo medio por llamada en microsegundos.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run_benchmark(size: int, repeat: int = 200) -> None:
+    print(f"\n📦 Catálogo de {size:,} agentes")
+    print("-" * 80)
+
+    repo = build_repository(size)
+    matches = repo.find_agent_by_capability("rare_capability")
+    assert matches == linear_find(repo, "rare_capability") and len(matches) == 10
+
+    indexed = time_per_call(lambda: repo.find_agent_by_capability("rare_capability"), repeat)
+    linear = time_per_call(lambda: linear_find(repo, "rare_capability"), max(1, repeat // 20))
+    print(f"find_agent_by_capability  indexado: {indexed:10.2f} µs   lineal: {linear:12.2f} µs")
+
+    repo.get_catalog_summary()
+    cached = time_per_call(repo.get_catalog_summary, repeat)
+    repo.update_agent("agent_1", {"role": "Rol actualizado"})
+    start = time.perf_counter()
+    repo.get_catalog_summary()
+    rebuild = (time.perf_counter() - start) * 1e6
+    print(f"get_catalog_summary       cacheado: {cached:10.2f} µs   reconstrucción: {rebuild:12.2f} µs")
+
+    active = time_per_call(repo.get_all_agents, max(1, repeat // 20))
+    print(f"get_all_agents            ({len(repo.get_all_agents()):,} activos): {active:10.2f} µs")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("BENCHMARK: AgentRepository")
+    print("=" * 80)
+    for catalog_size in (10_000, 100_000):
+        run_benchmark(catalog_size)
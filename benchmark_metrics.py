@@ -0,0 +1,92 @@
+"""
+Micro-benchmark de la instrumentación de métricas del orquestador.
+
+Mide el coste añadido por cada punto de instrumentación del camino
+caliente (nodo medido frente a la función sin envolver, registro de la
+petición y callback de llamada al proveedor) y lo suma para una petición
+típica: 4 nodos medidos, 2 llamadas al LLM y el registro final.
+
+También mide el coste de exportar el registro (render), que solo se paga
+en cada scrape y no por petición.
+
+Uso:
+    python benchmark_metrics.py
+"""
+
+import sys
+import time
+from pathlib import Path
+from uuid import uuid4
+
+# Añadir src al path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from metrics_registry import OrchestratorMetrics, ProviderCallHandler
+
+NODES_PER_REQUEST = 4
+LLM_CALLS_PER_REQUEST = 2
+
+
+def time_per_call(fn, repeat: int) -> float:
+    """
+    Tiempo medio por llamada en microsegundos.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def node(state, config=None):
+    return state
+
+
+def run_benchmark(repeat: int = 200_000) -> None:
+    metrics = OrchestratorMetrics()
+    timed, _ = metrics.instrument("router", node)
+    state = {"messages": []}
+
+    raw = time_per_call(lambda: node(state), repeat)
+    wrapped = time_per_call(lambda: timed(state), repeat)
+    node_overhead = wrapped - raw
+    print(f"nodo medido               sin envolver: {raw:8.3f} µs   medido: {wrapped:8.3f} µs   "
+          f"coste: {node_overhead:6.3f} µs")
+
+    request = time_per_call(lambda: metrics.record_request(0.8, False), repeat)
+    print(f"record_request                                                      coste: {request:6.3f} µs")
+
+    handler = ProviderCallHandler(metrics, default_model="gpt-4o")
+    response = LLMResult(generations=[[ChatGeneration(message=AIMessage(
+        content="ok",
+        usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150},
+        response_metadata={"model_name": "gpt-4o"},
+    ))]])
+
+    def provider_call():
+        run_id = uuid4()
+        handler.on_chat_model_start({}, [], run_id=run_id)
+        handler.on_llm_end(response, run_id=run_id)
+
+    uuid_cost = time_per_call(uuid4, repeat // 4)
+    provider = time_per_call(provider_call, repeat // 4) - uuid_cost
+    print(f"callback del proveedor (inicio + fin)                               coste: {provider:6.3f} µs")
+
+    per_request = NODES_PER_REQUEST * node_overhead + LLM_CALLS_PER_REQUEST * provider + request
+    print("-" * 80)
+    print(f"Total por petición ({NODES_PER_REQUEST} nodos, {LLM_CALLS_PER_REQUEST} llamadas al LLM): "
+          f"{per_request:.2f} µs")
+
+    metrics.watch_viability(type("Monitor", (), {"snapshot": lambda self: None})())
+    render = time_per_call(metrics.registry.render, 2_000)
+    print(f"render del registro (por scrape): {render:.1f} µs")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("BENCHMARK DE LA INSTRUMENTACIÓN DE MÉTRICAS")
+    print("=" * 80)
+    run_benchmark()
@@ -4,7 +4,9 @@ Aplicación principal del Sistema Autopoiético de Agentes.
 Punto de entrada para ejecutar el orquestador y procesar tareas.
 """
 
+import atexit
 import os
+import queue
 import sys
 from pathlib import Path
 
@@ -14,7 +16,8 @@ sys.path.insert(0, str(src_path))
 
 from autopoietic_orchestrator import create_orchestrator
 from dotenv import load_dotenv
-from event_manager import EventManager
+from event_journal import EventJournal
+from sqlite_checkpointer import SqliteCheckpointSaver
 
 
 def main():
@@ -37,12 +40,29 @@ def main():
     provider = (os.getenv("LLM_PROVIDER", "openai") or "openai").lower()
     print(f"Proveedor LLM configurado: {provider}")
 
+    # Persistencia de sesiones entre reinicios (opcional): CHECKPOINT_DB=checkpoints.db
+    checkpointer = None
+    checkpoint_db = os.getenv("CHECKPOINT_DB")
+    if checkpoint_db:
+        checkpointer = SqliteCheckpointSaver(
+            checkpoint_db,
+            max_checkpoints_per_thread=20,
+            max_age_seconds=7 * 24 * 3600,
+        )
+        print(f"Checkpoints persistentes en: {checkpoint_db}")
+
+    # Métricas Prometheus en un puerto local (opcional): METRICS_PORT=9464
+    metrics_port = os.getenv("METRICS_PORT")
+    metrics_port = int(metrics_port) if metrics_port else None
+
     # Construir orquestador según provider
     if provider == "cloudflare":
         # Cloudflare no requiere base_url; credenciales van en .env
         orchestrator = create_orchestrator(
             model_name=os.getenv("CLOUDFLARE_MODEL", "llama-2-7b"),
             llm_provider="cloudflare",
+            checkpointer=checkpointer,
+            metrics_port=metrics_port,
         )
     elif provider == "lmstudio":
         orchestrator = create_orchestrator(
@@ -50,6 +70,8 @@ def main():
             base_url=os.getenv("LM_STUDIO_BASE_URL", "http://localhost:1234/v1"),
             api_key="sk-no-key",
             llm_provider="lmstudio",
+            checkpointer=checkpointer,
+            metrics_port=metrics_port,
         )
     else:
         # OpenAI por defecto
@@ -57,6 +79,8 @@ def main():
             model_name=os.getenv("OPENAI_MODEL", "gpt-4"),
             api_key=os.getenv("OPENAI_API_KEY"),
             llm_provider="openai",
+            checkpointer=checkpointer,
+            metrics_port=metrics_port,
         )
     
     # Para LM Studio (local):
@@ -66,6 +90,24 @@ def main():
     #     api_key="sk-no-key"
     # )
     
+    if metrics_port is not None:
+        metrics_server = orchestrator.serve_metrics(metrics_port)
+        print(f"📈 Métricas en http://127.0.0.1:{metrics_server.port}/metrics")
+    
+    # Diario persistente de eventos (opcional): EVENT_JOURNAL_DIR=events
+    journal_dir = os.getenv("EVENT_JOURNAL_DIR")
+    if journal_dir:
+        journal = EventJournal(journal_dir)
+        orchestrator.event_manager.add_sink(journal)
+        atexit.register(journal.close)
+        print(f"Diario de eventos en: {journal_dir}")
+    
+    # Los eventos que requieren confirmación llegan por el bus del orquestador
+    confirmations = queue.Queue()
+    orchestrator.event_bus.subscribe(
+        lambda event: confirmations.put(event) if event.requires_confirmation else None
+    )
+    
     # Mostrar catálogo de agentes disponibles
     print("\n📋 CATÁLOGO DE AGENTES DISPONIBLES:")
     print("-" * 80)
@@ -124,20 +166,24 @@ def main():
                     content = getattr(last_msg, "content", str(last_msg))
                     print(content)
             
-            # Manejar eventos que requieren confirmación
-            event_manager = EventManager()
-            events_to_confirm = [event for event in event_manager.events.values() if event.requires_confirmation]
+            # La propuesta de nuevo agente se genera en segundo plano;
+            # esperarla antes de pedir confirmación
+            orchestrator.wait_for_metaproduction()
+            orchestrator.event_bus.drain()
             
-            for event in events_to_confirm:
+            # Manejar eventos que requieren confirmación
+            while not confirmations.empty():
+                event = confirmations.get_nowait()
                 print(f"\n[CONFIRMACIÓN REQUERIDA] {event.event_description}")
                 confirmation = input("¿Proceder? (Y/n): ").strip().lower()
-                if confirmation == 'y':
+                confirmed = confirmation == 'y'
+                if confirmed:
                     print(f"Evento '{event.event_name}' confirmado.")
                     # Aquí se podría ejecutar la acción asociada al evento
                 else:
                     print(f"Evento '{event.event_name}' cancelado.")
-                # Eliminar el evento después de manejarlo
-                del event_manager.events[event.event_time]
+                # Sacar el evento de pendientes (queda en el registro)
+                orchestrator.event_manager.resolve_confirmation(event.event_id, confirmed)
 
             print("\n" + "=" * 80)
         
@@ -179,16 +225,22 @@ def demo_examples():
         "Revisa este código Python y encuentra posibles bugs: def suma(a,b): return a+b+1",
     ]
     
-    for i, example in enumerate(examples, 1):
+    # Los ejemplos se procesan como lote concurrente; se muestran en orden
+    batch = [(example, f"demo_{i}") for i, example in enumerate(examples, 1)]
+    for outcome in orchestrator.invoke_many(batch, max_concurrency=4, ordered=True):
         print(f"\n\n{'='*80}")
-        print(f"EJEMPLO {i}")
+        print(f"EJEMPLO {outcome.index + 1}")
         print(f"{'='*80}")
-        print(f"\n👤 Tarea: {example}")
+        print(f"\n👤 Tarea: {examples[outcome.index]}")
         
-        result = orchestrator.invoke(example, thread_id=f"demo_{i}")
+        if not outcome.ok:
+            print(f"\n❌ Error: {outcome.error}")
+            continue
         
+        result = outcome.value
         print(f"\n📊 Ruta: {result.get('route')}")
         print(f"📈 Complejidad: {result.get('task_complexity', 0):.2f}")
+        print(f"⏱️  Latencia: {outcome.latency_ms:.0f} ms")
         
         messages = result.get("messages", [])
         if messages:
@@ -0,0 +1,146 @@
+"""
+Índice vectorial de agentes para selección semántica.
+
+Cada agente activo se representa por el embedding de su rol, capacidades
+y prompt de sistema. Los vectores (normalizados) viven en una matriz NumPy
+contigua, de modo que seleccionar el agente para una tarea es un único
+producto matriz-vector más un top-k, sin bucles de Python sobre el catálogo.
+"""
+
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from orchestrator_state import AgentSpec
+
+
+class AgentVectorIndex:
+    """
+    Índice incremental agent_id -> embedding sobre una matriz NumPy.
+
+    Las altas y actualizaciones escriben una fila; las bajas mueven la
+    última fila al hueco (O(1)). La matriz crece duplicando su capacidad.
+    `upsert_many` calcula los embeddings de varios agentes en una sola
+    llamada al proveedor (`embed_documents`).
+    """
+
+    def __init__(self, embeddings: Embeddings, initial_capacity: int = 64):
+        """
+        Args:
+            embeddings: Modelo de embeddings (e.g. CloudflareEmbeddings bge)
+            initial_capacity: Filas reservadas inicialmente
+        """
+        self.embeddings = embeddings
+        self._capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._rows
+
+    @staticmethod
+    def agent_text(spec: AgentSpec) -> str:
+        """Texto que representa al agente en el espacio de embeddings."""
+        return (
+            f"{spec.role}. "
+            f"Capacidades: {', '.join(spec.capabilities)}. "
+            f"{spec.system_prompt}"
+        )
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embedding normalizado de una tarea."""
+        return self._normalize(self.embeddings.embed_query(text))
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Versión asíncrona de embed_query."""
+        return self._normalize(await self.embeddings.aembed_query(text))
+
+    def upsert(self, spec: AgentSpec) -> None:
+        """Inserta o reemplaza el vector de un agente."""
+        self.upsert_many([spec])
+
+    def upsert_many(self, specs: Sequence[AgentSpec]) -> None:
+        """Inserta o reemplaza los vectores de varios agentes (una llamada)."""
+        if not specs:
+            return
+        vectors = self.embeddings.embed_documents([self.agent_text(spec) for spec in specs])
+        self._write(specs, vectors)
+
+    async def aupsert_many(self, specs: Sequence[AgentSpec]) -> None:
+        """Versión asíncrona de upsert_many."""
+        if not specs:
+            return
+        vectors = await self.embeddings.aembed_documents([self.agent_text(spec) for spec in specs])
+        self._write(specs, vectors)
+
+    def _write(self, specs: Sequence[AgentSpec], vectors: Sequence[Sequence[float]]) -> None:
+        for spec, vector in zip(specs, vectors):
+            self._write_row(spec.agent_id, self._normalize(vector))
+
+    def _write_row(self, agent_id: str, vector: np.ndarray) -> None:
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self._capacity, vector.shape[0]), dtype=np.float32)
+
+            row = self._rows.get(agent_id)
+            if row is None:
+                row = len(self._ids)
+                if row >= self._matrix.shape[0]:
+                    grown = np.zeros((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=np.float32)
+                    grown[:row] = self._matrix[:row]
+                    self._matrix = grown
+                self._ids.append(agent_id)
+                self._rows[agent_id] = row
+            self._matrix[row] = vector
+
+    def remove(self, agent_id: str) -> None:
+        """Elimina un agente del índice (swap con la última fila)."""
+        with self._lock:
+            row = self._rows.pop(agent_id, None)
+            if row is None:
+                return
+            last = len(self._ids) - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._ids.pop()
+
+    def search(self, vector: Sequence[float], k: int = 1) -> list[tuple[str, float]]:
+        """
+        Los `k` agentes más similares al vector de consulta.
+
+        Args:
+            vector: Embedding normalizado de la consulta (ndarray o lista,
+                p. ej. el `task_embedding` que deja el router en el estado)
+            k: Número de agentes a devolver
+
+        Returns:
+            Lista de (agent_id, similitud coseno) ordenada de mayor a menor
+        """
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or self._matrix is None:
+                return []
+            scores = self._matrix[:size] @ np.asarray(vector, dtype=np.float32)
+            k = min(k, size)
+            if k < size:
+                top = np.argpartition(scores, -k)[-k:]
+                top = top[np.argsort(scores[top])[::-1]]
+            else:
+                top = np.argsort(scores)[::-1]
+            return [(self._ids[i], float(scores[i])) for i in top]
@@ -6,8 +6,12 @@ especificaciones de agentes disponibles y permitiendo la metaproducción
 (creación y modificación de agentes).
 """
 
-from typing import Optional
+import threading
+from typing import Any, Callable, Optional, Sequence
+from langchain_core.embeddings import Embeddings
+
 from orchestrator_state import AgentSpec
+from agent_index import AgentVectorIndex
 
 
 class AgentRepository:
@@ -16,11 +20,50 @@ class AgentRepository:
     
     Este es el componente que almacena la 'estructura' (agentes concretos)
     mientras se mantiene la 'organización' (invariantes y roles).
+    
+    Además del catálogo mantiene índices derivados (agentes activos,
+    índice invertido capacidad -> agentes y vistas cacheadas por versión)
+    que se actualizan solo en add_agent, update_agent y deactivate_agent;
+    las especificaciones deben modificarse a través de esos métodos.
     """
+    # Campos cuyo cambio obliga a recalcular el embedding del agente
+    _EMBEDDED_FIELDS = ("role", "capabilities", "system_prompt")
+
     # Catalogo de agentes 
-    def __init__(self):
+
+    def __init__(self, embeddings: Optional[Embeddings] = None):
+        """
+        Args:
+            embeddings: Modelo de embeddings (opcional); si se indica, se
+                mantiene un índice vectorial de agentes activos para la
+                selección semántica (ver search_agents); los embeddings
+                del catálogo inicial y los de altas y cambios posteriores
+                se calculan en lote en la siguiente búsqueda (el
+                constructor no llama al proveedor)
+        """
         self._catalog: dict[str, AgentSpec] = {}
+        # Versión monótona del catálogo: cambia con cada modificación efectiva
+        self._version = 0
+        # Índices derivados (dicts como conjuntos ordenados por inserción)
+        self._active: dict[str, None] = {}
+        self._capability_index: dict[str, dict[str, None]] = {}
+        # Vistas derivadas del catálogo: nombre -> (versión, valor)
+        self._views: dict[str, tuple[int, Any]] = {}
+        self._vector_index = AgentVectorIndex(embeddings) if embeddings is not None else None
+        # Agentes activos pendientes de (re)calcular su embedding
+        self._vector_pending: dict[str, None] = {}
+        self._vector_lock = threading.Lock()
         self._initialize_default_agents()
+
+    @property
+    def version(self) -> int:
+        """
+        Versión actual del catálogo.
+        
+        Permite a las cachés derivadas (decisiones del router, resúmenes)
+        detectar que el catálogo ha cambiado desde que se calcularon.
+        """
+        return self._version
     
     def _initialize_default_agents(self):
         """
@@ -72,7 +115,15 @@ Proporciona información basada en datos meteorológicos actuales.""",
         """
         Añade una especificación de agente al catálogo.
         """
+        if spec.agent_id in self._catalog:
+            self._unindex_lookup(spec.agent_id)
         self._catalog[spec.agent_id] = spec
+        self._version += 1
+        if spec.active:
+            self._index_lookup(spec)
+            self._index_vector(spec)
+        else:
+            self._unindex_vector(spec.agent_id)
     
     def get_agent(self, agent_id: str) -> Optional[AgentSpec]:
         """
@@ -84,16 +135,19 @@ Proporciona información basada en datos meteorológicos actuales.""",
         """
         Obtiene todas las especificaciones de agentes activos.
         """
-        return [spec for spec in self._catalog.values() if spec.active]
+        return [self._catalog[agent_id] for agent_id in self._active]
     
     # Filtra
     def find_agent_by_capability(self, capability: str) -> list[AgentSpec]:
         """
-        Busca agentes que tengan una capacidad específica.
+        Busca agentes activos que tengan una capacidad específica.
+        
+        Usa el índice invertido: el coste es proporcional al número de
+        resultados, no al tamaño del catálogo.
         """
         return [
-            spec for spec in self._catalog.values()
-            if capability in spec.capabilities and spec.active
+            self._catalog[agent_id]
+            for agent_id in self._capability_index.get(capability, ())
         ]
     
     # Actualiza
@@ -108,10 +162,25 @@ Proporciona información basada en datos meteorológicos actuales.""",
             return False
         
         spec = self._catalog[agent_id]
-        for key, value in updates.items():
-            if hasattr(spec, key):
-                setattr(spec, key, value)
+        changed = {
+            key for key, value in updates.items()
+            if hasattr(spec, key) and getattr(spec, key) != value
+        }
+        if not changed:
+            return True
+        
+        # Desindexar con los valores antiguos antes de modificar la spec
+        self._unindex_lookup(agent_id)
+        for key in changed:
+            setattr(spec, key, updates[key])
         
+        self._version += 1
+        if spec.active:
+            self._index_lookup(spec)
+            if "active" in changed or changed.intersection(self._EMBEDDED_FIELDS):
+                self._index_vector(spec)
+        else:
+            self._unindex_vector(agent_id)
         return True
     
     def deactivate_agent(self, agent_id: str) -> bool:
@@ -119,20 +188,177 @@ Proporciona información basada en datos meteorológicos actuales.""",
         Desactiva un agente (sin eliminarlo del catálogo).
         """
         if agent_id in self._catalog:
-            self._catalog[agent_id].active = False
+            if self._catalog[agent_id].active:
+                self._unindex_lookup(agent_id)
+                self._catalog[agent_id].active = False
+                self._version += 1
+                self._unindex_vector(agent_id)
             return True
         return False
     
     def get_catalog_summary(self) -> list[dict]:
         """
         Obtiene un resumen del catálogo para el estado del grafo.
+        
+        El resumen se reconstruye solo cuando cambia la versión del
+        catálogo; la lista devuelta es compartida y no debe modificarse.
         """
-        return [
+        return self.cached_view("catalog_summary", lambda repo: [
             {
                 "agent_id": spec.agent_id,
                 "role": spec.role,
                 "capabilities": spec.capabilities,
                 "active": spec.active,
             }
-            for spec in self._catalog.values()
+            for spec in repo._catalog.values()
+        ])
+
+    def cached_view(self, name: str, builder: Callable[["AgentRepository"], Any]) -> Any:
+        """
+        Devuelve una vista derivada del catálogo memoizada por versión.
+        
+        `builder` solo se ejecuta si la vista no existe o el catálogo ha
+        cambiado desde que se construyó (e.g. el bloque de catálogo
+        formateado para el prompt del router).
+        """
+        cached = self._views.get(name)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        value = builder(self)
+        self._views[name] = (self._version, value)
+        return value
+
+    def _index_lookup(self, spec: AgentSpec) -> None:
+        """Registra un agente activo en los índices de búsqueda."""
+        self._active[spec.agent_id] = None
+        for capability in spec.capabilities:
+            self._capability_index.setdefault(capability, {})[spec.agent_id] = None
+
+    def _unindex_lookup(self, agent_id: str) -> None:
+        """Elimina un agente de los índices de búsqueda."""
+        if self._active.pop(agent_id, False) is False:
+            return
+        for capability in self._catalog[agent_id].capabilities:
+            holders = self._capability_index.get(capability)
+            if holders is not None:
+                holders.pop(agent_id, None)
+                if not holders:
+                    del self._capability_index[capability]
+
+    ###
+    # Índice vectorial para selección semántica
+    ###
+
+    @property
+    def has_vector_index(self) -> bool:
+        """Si el repositorio mantiene un índice de embeddings de agentes."""
+        return self._vector_index is not None
+
+    def _index_vector(self, spec: AgentSpec) -> None:
+        """Marca el agente para calcular su embedding en el próximo lote."""
+        if self._vector_index is None:
+            return
+        with self._vector_lock:
+            self._vector_pending[spec.agent_id] = None
+
+    def _unindex_vector(self, agent_id: str) -> None:
+        if self._vector_index is not None:
+            with self._vector_lock:
+                self._vector_pending.pop(agent_id, None)
+            self._vector_index.remove(agent_id)
+
+    def _take_pending_vectors(self) -> list[AgentSpec]:
+        with self._vector_lock:
+            pending = [
+                self._catalog[agent_id]
+                for agent_id in self._vector_pending
+                if agent_id in self._active
+            ]
+            self._vector_pending.clear()
+        return pending
+
+    def _restore_pending_vectors(self, specs: list[AgentSpec], error: Exception) -> None:
+        """Deja los agentes pendientes para reintentar en la próxima búsqueda."""
+        print(f"⚠️  No se pudieron indexar {len(specs)} agentes: {error}")
+        with self._vector_lock:
+            for spec in specs:
+                self._vector_pending.setdefault(spec.agent_id, None)
+
+    def _drop_deactivated(self, specs: list[AgentSpec]) -> None:
+        # Un agente desactivado mientras se calculaba su embedding no se indexa
+        for spec in specs:
+            if spec.agent_id not in self._active:
+                self._vector_index.remove(spec.agent_id)
+
+    def _flush_vectors(self) -> None:
+        """Calcula en una sola llamada los embeddings pendientes."""
+        if self._vector_index is None or not self._vector_pending:
+            return
+        pending = self._take_pending_vectors()
+        try:
+            self._vector_index.upsert_many(pending)
+        except Exception as e:
+            self._restore_pending_vectors(pending, e)
+            return
+        self._drop_deactivated(pending)
+
+    async def _aflush_vectors(self) -> None:
+        """Versión asíncrona de _flush_vectors."""
+        if self._vector_index is None or not self._vector_pending:
+            return
+        pending = self._take_pending_vectors()
+        try:
+            await self._vector_index.aupsert_many(pending)
+        except Exception as e:
+            self._restore_pending_vectors(pending, e)
+            return
+        self._drop_deactivated(pending)
+
+    def search_agents(
+        self,
+        task: str,
+        k: int = 1,
+        vector: Optional[Sequence[float]] = None,
+    ) -> list[tuple[AgentSpec, float]]:
+        """
+        Agentes activos más similares a la tarea según el índice vectorial.
+        
+        Args:
+            task: Tarea del usuario
+            k: Número de agentes a devolver
+            vector: Embedding normalizado de la tarea ya calculado (el
+                `task_embedding` del router); si falta, se calcula aquí
+        
+        Returns:
+            Lista de (AgentSpec, similitud) de mayor a menor; vacía si no
+            hay índice configurado
+        """
+        if self._vector_index is None:
+            return []
+        self._flush_vectors()
+        if vector is None:
+            vector = self._vector_index.embed_query(task)
+        return self._resolve_matches(self._vector_index.search(vector, k))
+
+    async def asearch_agents(
+        self,
+        task: str,
+        k: int = 1,
+        vector: Optional[Sequence[float]] = None,
+    ) -> list[tuple[AgentSpec, float]]:
+        """
+        Versión asíncrona de search_agents (el embedding no bloquea el loop).
+        """
+        if self._vector_index is None:
+            return []
+        await self._aflush_vectors()
+        if vector is None:
+            vector = await self._vector_index.aembed_query(task)
+        return self._resolve_matches(self._vector_index.search(vector, k))
+
+    def _resolve_matches(self, matches: list[tuple[str, float]]) -> list[tuple[AgentSpec, float]]:
+        return [
+            (self._catalog[agent_id], score)
+            for agent_id, score in matches
+            if agent_id in self._catalog
         ]
@@ -12,22 +12,40 @@ productiva y permite la metaproducción.
 
 from typing import Optional, Any
 from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 
-from orchestrator_state import OrchestratorState, RouteLabel
+from orchestrator_state import OrchestratorState, RouteLabel, SystemInvariants, merge_usage_summary
 from agent_repository import AgentRepository
 from meta_agent_router import MetaAgentRouter
 from execution_nodes import DirectExecutionNode, StructuralDiagnosisNode
 from langchain_openai import ChatOpenAI
 import os
-import requests
-from typing import List, Any, Dict
-from langchain_core.language_models.llms import BaseLLM
+import time
+import asyncio
+import threading
+from typing import List, Any, Dict, Iterable, Iterator, AsyncIterable, AsyncIterator, Union
+from pydantic import Field
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
-from langchain_core.outputs import Generation, LLMResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.caches import BaseCache
+from langchain_core.embeddings import Embeddings
 from abc import ABC, abstractmethod
 
+from cloudflare_client import CloudflareBaseLLM
+from concurrency import Outcome, aiter_bounded, iter_bounded
+from semantic_cache import SemanticDecisionCache
+from routing_classifier import DecisionLog, RoutingClassifier
+from speculative import SpeculativeRouterNode
+from conversation_memory import ConversationMemory
+from event_bus import EventBus
+from event_manager import EventManager
+from token_budget import TokenBudget
+from deadline import Deadline
+from viability_metrics import ViabilityMonitor
+from cost_accounting import CostAccountingNode, PriceTable
+from metrics_registry import MetricsServer, OrchestratorMetrics
+
 
 class CloudflareResponseParser(ABC):
     """Clase base abstracta para analizar las respuestas de la IA de Cloudflare."""
@@ -88,35 +106,38 @@ class ResultFormatParser(CloudflareResponseParser):
         return None
 
 
-class CloudflareWorkersAI(BaseLLM):
+class CloudflareWorkersAI(CloudflareBaseLLM):
     """
     Cliente LangChain para Cloudflare Workers AI (API directa).
     Más simple que usar AI Gateway - no requiere configuración adicional.
+    
+    Transporte, lotes, streaming y `batch` con errores por elemento
+    vienen de CloudflareBaseLLM (cloudflare_client).
     """
     
-    account_id: str
-    auth_token: str
-    model: str = "@cf/meta/llama-2-7b-chat-int8"
+    response_parsers: List[CloudflareResponseParser] = Field(
+        default_factory=lambda: [OutputFormatParser(), ResultFormatParser()]
+    )
     
     def __init__(self, account_id: str, auth_token: str, model: str = "@cf/meta/llama-2-7b-chat-int8", **kwargs):
         super().__init__(account_id=account_id, auth_token=auth_token, model=model, **kwargs)
-        self.response_parsers: List[CloudflareResponseParser] = [
-            OutputFormatParser(),
-            ResultFormatParser(),
-        ]
 
     @property
     def _llm_type(self) -> str:
         return "cloudflare_workers_ai"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        """Parámetros que distinguen las respuestas (usados como clave de caché)."""
+        return {"model": self.model}
     
-    def _call(
+    def _build_request(
         self,
         prompt: str,
         stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
-    ) -> str:
-        """Llamada directa a Cloudflare Workers AI."""
+    ) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Construye URL, cabeceras y payload para /ai/v1/responses."""
         url = f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/v1/responses"
         
         headers = {
@@ -128,64 +149,121 @@ class CloudflareWorkersAI(BaseLLM):
             "model": self.model,
             "input": prompt
         }
+        # Límite de la respuesta (e.g. la reserva de TokenBudget vía bind)
+        if kwargs.get("max_tokens"):
+            payload["max_output_tokens"] = kwargs["max_tokens"]
+        return url, headers, payload
+
+    def _parse_result(self, result: Any) -> str:
+        """Extrae el texto de la respuesta usando los parsers registrados."""
+        if isinstance(result, dict):
+            for parser in self.response_parsers:
+                parsed_text = parser.parse(result)
+                if parsed_text is not None:
+                    return parsed_text
         
-        try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            result = response.json()
-            
-            if isinstance(result, dict):
-                for parser in self.response_parsers:
-                    parsed_text = parser.parse(result)
-                    if parsed_text is not None:
-                        return parsed_text
-            
-            # Fallback: devolver todo como string
-            return str(result)
-            
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Error conectando con Cloudflare: {str(e)}")
+        # Fallback: devolver todo como string
+        return str(result)
     
-    def _generate(
-        self,
-        prompts: List[str],
-        stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
-        **kwargs: Any,
-    ) -> LLMResult:
-        """Genera respuestas para múltiples prompts."""
-        generations = []
-        for prompt in prompts:
-            text = self._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
-            generations.append([Generation(text=text)])
-        
-        return LLMResult(generations=generations)
-    
-    def _format_messages_to_prompt(self, messages: List[BaseMessage]) -> str:
-        """Convierte mensajes de LangChain a prompt de texto."""
+    def _format_messages_to_prompt(self, messages: List[Any]) -> str:
+        """Convierte mensajes de LangChain (u objetos role/content) a prompt de texto."""
         parts = []
         for msg in messages:
-            if isinstance(msg, HumanMessage):
+            if isinstance(msg, dict):
+                role = {"user": "User", "assistant": "Assistant", "system": "System"}.get(
+                    msg.get("role", "user"), "User"
+                )
+                parts.append(f"{role}: {msg.get('content', '')}")
+            elif isinstance(msg, HumanMessage):
                 parts.append(f"User: {msg.content}")
             elif isinstance(msg, AIMessage):
                 parts.append(f"Assistant: {msg.content}")
             elif isinstance(msg, SystemMessage):
                 parts.append(f"System: {msg.content}")
         return "\n\n".join(parts) + "\n\nAssistant:"
+
+    def _input_to_prompt(self, input: Any) -> str:
+        """Normaliza la entrada de invoke/ainvoke a un prompt de texto."""
+        if isinstance(input, str):
+            return input
+        if isinstance(input, list):
+            return self._format_messages_to_prompt(input)
+        if hasattr(input, "to_messages"):
+            # PromptValue producido por `prompt | llm`
+            return self._format_messages_to_prompt(input.to_messages())
+        return str(input)
     
     def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
-        """Invoke compatible con LangChain (acepta string o mensajes)."""
-        if isinstance(input, str):
-            prompt = input
-        elif isinstance(input, list):
-            prompt = self._format_messages_to_prompt(input)
-        else:
-            prompt = str(input)
+        """
+        Invoke compatible con LangChain (acepta string o mensajes).
         
-        content = self._call(prompt, **kwargs)
+        Pasa por `BaseLLM.invoke`, de modo que se aplican los callbacks y
+        la caché de respuestas configurada en `self.cache`.
+        """
+        content = super().invoke(self._input_to_prompt(input), config=config, **kwargs)
+        return AIMessage(content=content)
+
+    async def ainvoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
+        """Versión asíncrona de invoke sobre el cliente HTTP asíncrono."""
+        content = await super().ainvoke(self._input_to_prompt(input), config=config, **kwargs)
         return AIMessage(content=content)
 
 
+# Nodos cuyos registros de tokens indican la ruta DIAGNOSTICO_ESTRUCTURAL
+_DIAGNOSIS_USAGE_NODES = frozenset({"provisional", "capability_gap", "agent_design"})
+
+
+def _collect_usage(update: Any, collected: dict) -> None:
+    """
+    Acumula en `collected` los registros de tokens y el coste de la
+    petición de un evento "updates" del stream.
+    """
+    if not isinstance(update, dict):
+        return
+    for node_update in update.values():
+        if not isinstance(node_update, dict):
+            continue
+        if node_update.get("token_usage"):
+            collected["token_usage"].extend(node_update["token_usage"])
+        if node_update.get("request_cost"):
+            collected["request_cost"] = node_update["request_cost"]
+
+
+class _StreamTimer:
+    """
+    Mide el time-to-first-token de una petición en modo stream "tokens".
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.token_count = 0
+
+    def wrap(self, stream_mode: str, chunk: Any) -> dict:
+        """Normaliza un chunk de LangGraph a un evento del orquestador."""
+        if stream_mode == "custom":
+            if isinstance(chunk, dict) and chunk.get("type") == "token":
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.token_count += 1
+                return chunk
+            return {"type": "custom", "data": chunk}
+        return {"type": "update", "data": chunk}
+
+    def metrics(self) -> dict:
+        """Evento final con las métricas de latencia de la petición."""
+        end = time.perf_counter()
+        ttft_ms = None
+        if self.first_token_at is not None:
+            ttft_ms = (self.first_token_at - self.start) * 1000
+        return {
+            "type": "metrics",
+            "ttft_ms": ttft_ms,
+            "total_ms": (end - self.start) * 1000,
+            "tokens": self.token_count,
+        }
+
+
 class AutopoieticOrchestrator:
     """
     Orquestador principal del sistema autopoiético de agentes.
@@ -205,6 +283,26 @@ class AutopoieticOrchestrator:
         enable_checkpointing: bool = True,
         llm: Optional[Any] = None,
         permissions_manager: Optional[Any] = None,  # Añadido
+        response_cache: Optional[BaseCache] = None,
+        embeddings: Optional[Embeddings] = None,
+        semantic_cache_threshold: float = 0.92,
+        agent_selection_threshold: float = 0.5,
+        background_metaproduction: bool = True,
+        routing_classifier: Optional[RoutingClassifier] = None,
+        routing_classifier_threshold: float = 0.9,
+        decision_log: Optional[DecisionLog] = None,
+        speculative_execution: bool = False,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        conversation_memory: bool = True,
+        memory_max_tokens: Optional[int] = None,
+        event_manager: Optional[EventManager] = None,
+        token_budget: Optional[TokenBudget] = None,
+        enforce_deadline: bool = False,
+        max_latency_ms: Optional[float] = None,
+        viability_window: int = 1024,
+        price_table: Optional[PriceTable] = None,
+        metrics: Optional[OrchestratorMetrics] = None,
+        metrics_port: Optional[int] = None,
     ):
         """
         Inicializa el orquestador autopoiético.
@@ -215,9 +313,60 @@ class AutopoieticOrchestrator:
             api_key: Clave API
             enable_checkpointing: Si se habilita persistencia
             permissions_manager: Gestor de permisos (opcional)
+            response_cache: Caché de respuestas (e.g. ResponseCache) aplicada
+                al LLM compartido por todos los nodos (opcional)
+            embeddings: Modelo de embeddings (e.g. CloudflareEmbeddings bge);
+                habilita la caché semántica de decisiones del router y el
+                índice vectorial para seleccionar agentes
+            semantic_cache_threshold: Similitud mínima para reutilizar una
+                decisión de enrutamiento
+            agent_selection_threshold: Similitud mínima para elegir un agente
+                del índice vectorial (si no, se usa el asistente general)
+            background_metaproduction: Si la propuesta de nuevo agente de la
+                ruta DIAGNOSTICO_ESTRUCTURAL se genera en segundo plano
+                (la respuesta provisional no espera al diseño)
+            routing_classifier: Clasificador local entrenado con el registro
+                de decisiones; omite el LLM del router cuando está seguro
+            routing_classifier_threshold: Confianza mínima del clasificador
+            decision_log: Registro JSONL de decisiones del router (datos de
+                entrenamiento del clasificador)
+            speculative_execution: Si la ejecución directa arranca en
+                paralelo con el router (ver speculation_stats)
+            checkpointer: Checkpointer a usar (e.g. SqliteCheckpointSaver
+                para persistir hilos entre reinicios con retención acotada);
+                por defecto MemorySaver si enable_checkpointing
+            conversation_memory: Si los agentes reciben el historial del
+                hilo (turnos recientes + resumen incremental de los antiguos)
+            memory_max_tokens: Presupuesto de tokens por petición de la
+                memoria (por defecto max_tokens_per_request)
+            event_manager: Registro de eventos del orquestador (por defecto
+                uno propio, no el compartido del proceso); sus eventos se
+                publican en `self.event_bus`
+            token_budget: Presupuesto de tokens por llamada al LLM (por
+                defecto SystemInvariants.BUDGETS); los prompts que lo
+                superan se recortan y el uso se acumula en `token_usage`
+            enforce_deadline: Si cada petición tiene un plazo que acota los
+                timeouts de las llamadas (las síncronas, a través del
+                timeout del transporte HTTP) y hace que los nodos degraden
+                (enrutar sin LLM, metaproducción en segundo plano, respuesta
+                parcial) en lugar de esperar. Desactivado por defecto: un
+                modelo lento o local supera fácilmente los 5 s del
+                presupuesto y las peticiones se degradarían siempre
+            max_latency_ms: Plazo por petición (por defecto
+                SystemInvariants.BUDGETS["max_latency_ms"]); darlo activa
+                el plazo aunque enforce_deadline sea False
+            viability_window: Peticiones de la ventana de métricas de
+                viabilidad (ver viability_metrics)
+            price_table: Precios por modelo para el coste de cada petición
+                (`request_cost`) y de cada hilo (`thread_cost`); por
+                defecto cost_accounting.DEFAULT_PRICES
+            metrics: Métricas operativas (por defecto unas propias); ver
+                metrics_snapshot y serve_metrics
+            metrics_port: Si se indica, expone las métricas en formato
+                Prometheus en http://127.0.0.1:<puerto>/metrics
         """
         # Inicializar repositorio de agentes
-        self.agent_repository = AgentRepository()
+        self.agent_repository = AgentRepository(embeddings=embeddings)
         
         # Asignar gestor de permisos
         self.permissions_manager = permissions_manager
@@ -225,6 +374,45 @@ class AutopoieticOrchestrator:
         # Preparar instancia LLM común para todos los nodos (inyectable)
         self.llm = llm or self._build_default_llm(model_name=model_name, base_url=base_url, api_key=api_key)
 
+        # Caché de respuestas sobre el LLM compartido (router, ejecución, diagnóstico)
+        self.response_cache = response_cache
+        if response_cache is not None:
+            self.llm.cache = response_cache
+
+        # Caché semántica de decisiones del router (requiere embeddings)
+        self.embeddings = embeddings
+        self.decision_cache = None
+        if embeddings is not None:
+            self.decision_cache = SemanticDecisionCache(
+                embeddings, threshold=semantic_cache_threshold
+            )
+
+        # Presupuesto de tokens compartido por todos los nodos
+        self.token_budget = token_budget or TokenBudget()
+
+        # Coste por petición y por hilo (nodo "accounting" al final del grafo)
+        llm_model = getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+        self.cost_accounting = CostAccountingNode(price_table=price_table, default_model=llm_model)
+        
+        # Métricas operativas (nodos, proveedor, cachés, eventos)
+        self.metrics = metrics or OrchestratorMetrics()
+        # Callback de llamadas al proveedor: va en la configuración de cada
+        # ejecución (ver _run_config), sin modificar los callbacks del LLM
+        self._provider_handler = self.metrics.provider_handler(model=llm_model)
+        if response_cache is not None and hasattr(response_cache, "hits"):
+            self.metrics.watch_response_cache(response_cache)
+        if self.decision_cache is not None:
+            self.metrics.watch_decision_cache(self.decision_cache)
+
+        # KPIs de viabilidad en vivo: se inyectan en `viability_kpis`
+        self.viability = ViabilityMonitor(window_size=viability_window)
+        self.metrics.watch_viability(self.viability)
+
+        # Plazo por petición (None = sin plazo)
+        self.max_latency_ms = None
+        if enforce_deadline or max_latency_ms:
+            self.max_latency_ms = max_latency_ms or SystemInvariants.BUDGETS["max_latency_ms"]
+        
         # Inicializar componentes
         self.router = MetaAgentRouter(
             agent_repository=self.agent_repository,
@@ -233,14 +421,40 @@ class AutopoieticOrchestrator:
             api_key=api_key,
             temperature=0.0,  # Determinístico para routing
             llm=self.llm,
+            decision_cache=self.decision_cache,
+            classifier=routing_classifier,
+            classifier_threshold=routing_classifier_threshold,
+            decision_log=decision_log,
+            token_budget=self.token_budget,
         )
         
+        # Coste de la metaproducción en segundo plano pendiente de cargar
+        # a cada hilo (ver _charge_thread_usage)
+        self._deferred_thread_cost: dict[str, dict] = {}
+        self._deferred_cost_lock = threading.Lock()
+        
+        # Registro y bus de eventos propios de este orquestador
+        self.event_manager = event_manager if event_manager is not None else EventManager.isolated()
+        self.event_bus = EventBus()
+        self.event_manager.add_sink(self.event_bus)
+        self.metrics.watch_event_manager(self.event_manager)
+        
+        # Memoria conversacional por hilo (nodo "memory" antes del router)
+        self.memory = None
+        if conversation_memory:
+            self.memory = ConversationMemory(
+                self.llm, max_tokens=memory_max_tokens, token_budget=self.token_budget
+            )
+        
         self.direct_executor = DirectExecutionNode(
             agent_repository=self.agent_repository,
             model_name=model_name,
             base_url=base_url,
             api_key=api_key,
             llm=self.llm,
+            selection_threshold=agent_selection_threshold,
+            memory=self.memory,
+            token_budget=self.token_budget,
         )
         
         self.structural_diagnosis = StructuralDiagnosisNode(
@@ -249,32 +463,75 @@ class AutopoieticOrchestrator:
             base_url=base_url,
             api_key=api_key,
             llm=self.llm,
+            background_metaproduction=background_metaproduction,
+            memory=self.memory,
+            event_manager=self.event_manager,
+            token_budget=self.token_budget,
+            on_background_usage=self._charge_thread_usage,
         )
         
+        # Router con ejecución directa especulativa (opcional)
+        self.speculative_router = None
+        if speculative_execution:
+            self.speculative_router = SpeculativeRouterNode(
+                router=self.router,
+                direct_executor=self.direct_executor,
+                on_background_usage=self._charge_thread_usage,
+            )
+        
         # Construir grafo
         self.graph = self._build_graph()
         
         # Compilar con checkpointer si está habilitado
-        checkpointer = MemorySaver() if enable_checkpointing else None
+        if checkpointer is None and enable_checkpointing:
+            checkpointer = MemorySaver()
+        self.checkpointer = checkpointer
         self.app = self.graph.compile(checkpointer=checkpointer)
+        # Grafo sin persistencia para los elementos de lote sin thread_id
+        self._stateless_app = self.app if checkpointer is None else None
+        
+        if metrics_port is not None:
+            self.serve_metrics(metrics_port)
     
     def _build_graph(self) -> StateGraph:
         """
         Construye el grafo de estados de LangGraph.
         
         Estructura del grafo:
-        START → router → {DIAGNOSTICO_ESTRUCTURAL, EJECUCION_DIRECTA} → END
+        START → [memory] → router → {DIAGNOSTICO_ESTRUCTURAL, EJECUCION_DIRECTA} → accounting → END
         """
         # Crear grafo con el estado tipado
         graph = StateGraph(OrchestratorState)
         
-        # Añadir nodos
-        graph.add_node("router", self.router.evaluate_task)
-        graph.add_node("direct_execution", self.direct_executor.execute)
-        graph.add_node("structural_diagnosis", self.structural_diagnosis.diagnose)
+        # Añadir nodos (variante síncrona para invoke/stream, asíncrona para
+        # ainvoke), medidos en orchestrator_node_seconds
+        def node(name: str, func, afunc) -> RunnableLambda:
+            timed, atimed = self.metrics.instrument(name, func, afunc)
+            return RunnableLambda(timed, afunc=atimed)
+        
+        if self.speculative_router is not None:
+            router_node = node("router", self.speculative_router.evaluate, self.speculative_router.aevaluate)
+        else:
+            router_node = node("router", self.router.evaluate_task, self.router.aevaluate_task)
+        graph.add_node("router", router_node)
+        graph.add_node(
+            "direct_execution",
+            node("direct_execution", self.direct_executor.execute, self.direct_executor.aexecute),
+        )
+        graph.add_node(
+            "structural_diagnosis",
+            node("structural_diagnosis", self.structural_diagnosis.diagnose, self.structural_diagnosis.adiagnose),
+        )
+        
+        graph.add_node("accounting", self.cost_accounting.account)
         
-        # Arista inicial: START → router
-        graph.add_edge(START, "router")
+        # Arista inicial: START → [memory] → router
+        if self.memory is not None:
+            graph.add_node("memory", node("memory", self.memory.update, self.memory.aupdate))
+            graph.add_edge(START, "memory")
+            graph.add_edge("memory", "router")
+        else:
+            graph.add_edge(START, "router")
         
         # Aristas condicionales desde el router
         graph.add_conditional_edges(
@@ -283,13 +540,14 @@ class AutopoieticOrchestrator:
             {
                 "DIAGNOSTICO_ESTRUCTURAL": "structural_diagnosis",
                 "EJECUCION_DIRECTA": "direct_execution",
-                "END": END,
+                "END": "accounting",
             }
         )
         
-        # Aristas finales: ambos nodos de ejecución terminan
-        graph.add_edge("direct_execution", END)
-        graph.add_edge("structural_diagnosis", END)
+        # Aristas finales: ambos nodos de ejecución pasan por la contabilidad
+        graph.add_edge("direct_execution", "accounting")
+        graph.add_edge("structural_diagnosis", "accounting")
+        graph.add_edge("accounting", END)
         
         return graph
 
@@ -341,10 +599,125 @@ class AutopoieticOrchestrator:
 
         return ChatOpenAI(**llm_kwargs)
     
+    def _charge_thread_usage(self, thread_id: Optional[str], records: list[dict]) -> None:
+        """
+        Carga al hilo los tokens gastados fuera de una petición (metaproducción
+        en segundo plano), que ya no caben en su `request_cost`.
+        
+        El coste queda pendiente y se suma a `thread_cost` en la siguiente
+        petición del hilo: escribir el checkpoint ahora competiría con la
+        petición que lo lanzó, que puede seguir en curso y lo sobrescribiría.
+        """
+        if not thread_id or self.checkpointer is None:
+            return
+        summary = self.cost_accounting.summarize(records)
+        with self._deferred_cost_lock:
+            self._deferred_thread_cost[thread_id] = merge_usage_summary(
+                self._deferred_thread_cost.get(thread_id), summary
+            )
+
+    def _initial_state(self, user_input: str, thread_id: Optional[str] = None) -> dict:
+        """
+        Estado inicial del grafo para una entrada del usuario (con el coste
+        pendiente del hilo, ver _charge_thread_usage).
+        """
+        state = {
+            "messages": [{"role": "user", "content": user_input}],
+            "route": None,
+            "task_complexity": None,
+            # KPIs de la ventana hasta la petición anterior (None si no hay)
+            "viability_kpis": self.viability.snapshot(),
+            "context": None,
+            "agent_catalog": None,
+            # None reinicia el acumulado de la petición anterior del hilo
+            "token_usage": None,
+            "request_cost": None,
+            # El embedding de la tarea anterior no vale para esta
+            "task_embedding": None,
+        }
+        if thread_id:
+            with self._deferred_cost_lock:
+                deferred = self._deferred_thread_cost.pop(thread_id, None)
+            if deferred is not None:
+                # El reductor de thread_cost lo suma al acumulado del hilo
+                state["thread_cost"] = deferred
+        return state
+
+    def _run_config(self, thread_id: Optional[str], deadline_ms: Optional[float] = None) -> dict:
+        """
+        Configuración de ejecución (thread_id para checkpointing, plazo
+        de la petición, que empieza a contar ahora, y callback de métricas
+        del proveedor).
+        """
+        configurable = {}
+        if thread_id:
+            configurable["thread_id"] = thread_id
+        budget_ms = deadline_ms or self.max_latency_ms
+        if budget_ms:
+            configurable["deadline"] = Deadline.after_ms(budget_ms).expires_at
+        return {"configurable": configurable, "callbacks": [self._provider_handler]}
+
+    def _record_request(
+        self,
+        start: float,
+        final: Optional[dict],
+        failed: bool = False,
+    ) -> None:
+        """
+        Registra una petición terminada en las métricas de viabilidad y
+        en las operativas.
+        
+        Args:
+            final: Estado final (o las claves `token_usage` y
+                `request_cost` recogidas del stream)
+        
+        Cuenta como error si el grafo lanzó una excepción o si alguna
+        llamada al LLM falló o venció el plazo.
+        """
+        final = final or {}
+        usage = final.get("token_usage") or []
+        request_cost = final.get("request_cost") or {}
+        route = "EJECUCION_DIRECTA"
+        if any(record["node"] in _DIAGNOSIS_USAGE_NODES for record in usage):
+            route = "DIAGNOSTICO_ESTRUCTURAL"
+        elapsed = time.perf_counter() - start
+        failed = failed or any(record.get("error") for record in usage)
+        self.metrics.record_request(elapsed, failed)
+        self.viability.record(
+            latency_ms=elapsed * 1000,
+            error=failed,
+            cost=request_cost.get("cost", 0.0),
+            tokens=sum(record["prompt_tokens"] + record["completion_tokens"] for record in usage),
+            route=route,
+        )
+
+    def _run_graph(self, app: Any, state: dict, config: dict) -> dict:
+        """Ejecuta el grafo y registra la petición en las métricas."""
+        start = time.perf_counter()
+        try:
+            result = app.invoke(state, config=config)
+        except Exception:
+            self._record_request(start, None, failed=True)
+            raise
+        self._record_request(start, result)
+        return result
+
+    async def _arun_graph(self, app: Any, state: dict, config: dict) -> dict:
+        """Versión asíncrona de _run_graph."""
+        start = time.perf_counter()
+        try:
+            result = await app.ainvoke(state, config=config)
+        except Exception:
+            self._record_request(start, None, failed=True)
+            raise
+        self._record_request(start, result)
+        return result
+
     def invoke(
         self, 
         user_input: str, 
-        thread_id: Optional[str] = None
+        thread_id: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
     ) -> dict:
         """
         Invoca el orquestador con una entrada del usuario.
@@ -352,77 +725,228 @@ class AutopoieticOrchestrator:
         Args:
             user_input: Tarea o consulta del usuario
             thread_id: ID de hilo para persistencia (opcional)
+            deadline_ms: Plazo de esta petición (por defecto max_latency_ms)
             
         Returns:
             Estado final del grafo después de la ejecución
         """
         # Preparar estado inicial
-        initial_state = {
-            "messages": [{"role": "user", "content": user_input}],
-            "route": None,
-            "task_complexity": None,
-            "viability_kpis": None,
-            "context": None,
-            "agent_catalog": None,
-        }
+        initial_state = self._initial_state(user_input, thread_id)
         
-        # Configuración para checkpointing
-        config = {}
-        if thread_id:
-            config["configurable"] = {"thread_id": thread_id}
+        # Configuración para checkpointing y plazo
+        config = self._run_config(thread_id, deadline_ms)
         
         # Ejecutar el grafo
-        result = self.app.invoke(initial_state, config=config)
+        result = self._run_graph(self.app, initial_state, config)
         
         return result
     
     async def ainvoke(
         self, 
         user_input: str, 
-        thread_id: Optional[str] = None
+        thread_id: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
     ) -> dict:
         """
         Versión asíncrona de invoke.
+        
+        Cada nodo se ejecuta con su variante asíncrona, por lo que las
+        llamadas al LLM no bloquean el event loop y muchas sesiones pueden
+        avanzar de forma concurrente en el mismo proceso.
         """
-        initial_state = {
-            "messages": [{"role": "user", "content": user_input}],
-            "route": None,
-            "task_complexity": None,
-            "viability_kpis": None,
-            "context": None,
-            "agent_catalog": None,
-        }
+        initial_state = self._initial_state(user_input, thread_id)
         
-        config = {}
-        if thread_id:
-            config["configurable"] = {"thread_id": thread_id}
+        config = self._run_config(thread_id, deadline_ms)
         
-        result = await self.app.ainvoke(initial_state, config=config)
+        result = await self._arun_graph(self.app, initial_state, config)
         
         return result
     
-    def stream(self, user_input: str, thread_id: Optional[str] = None):
+    def stream(
+        self,
+        user_input: str,
+        thread_id: Optional[str] = None,
+        mode: str = "updates",
+        deadline_ms: Optional[float] = None,
+    ):
         """
         Ejecuta el grafo con streaming de eventos.
         
         Útil para UIs reactivas que necesitan updates incrementales.
+        
+        Args:
+            user_input: Tarea o consulta del usuario
+            thread_id: ID de hilo para persistencia (opcional)
+            mode: "updates" emite la actualización completa de cada nodo;
+                "tokens" emite además los tokens de la respuesta según llegan
+                como {"type": "token", ...}, las actualizaciones como
+                {"type": "update", ...} y al final {"type": "metrics", ...}
+                con el time-to-first-token de la petición
+            deadline_ms: Plazo de esta petición (por defecto max_latency_ms)
         """
-        initial_state = {
-            "messages": [{"role": "user", "content": user_input}],
-            "route": None,
-            "task_complexity": None,
-            "viability_kpis": None,
-            "context": None,
-            "agent_catalog": None,
-        }
+        if mode not in ("updates", "tokens"):
+            raise ValueError(f"Modo de streaming no soportado: {mode}")
         
-        config = {}
-        if thread_id:
-            config["configurable"] = {"thread_id": thread_id}
+        initial_state = self._initial_state(user_input, thread_id)
+        
+        config = self._run_config(thread_id, deadline_ms)
+        
+        start = time.perf_counter()
+        usage = {"token_usage": [], "request_cost": None}
+        try:
+            if mode == "updates":
+                for event in self.app.stream(initial_state, config=config):
+                    _collect_usage(event, usage)
+                    yield event
+            else:
+                config.setdefault("configurable", {})["stream_tokens"] = True
+                timer = _StreamTimer()
+                for stream_mode, chunk in self.app.stream(
+                    initial_state, config=config, stream_mode=["updates", "custom"]
+                ):
+                    if stream_mode == "updates":
+                        _collect_usage(chunk, usage)
+                    yield timer.wrap(stream_mode, chunk)
+                yield timer.metrics()
+        except Exception:
+            self._record_request(start, usage, failed=True)
+            raise
+        self._record_request(start, usage)
+
+    async def astream(
+        self,
+        user_input: str,
+        thread_id: Optional[str] = None,
+        mode: str = "updates",
+        deadline_ms: Optional[float] = None,
+    ):
+        """
+        Versión asíncrona de stream (mismos modos y formato de eventos).
+        """
+        if mode not in ("updates", "tokens"):
+            raise ValueError(f"Modo de streaming no soportado: {mode}")
+        
+        initial_state = self._initial_state(user_input, thread_id)
+        
+        config = self._run_config(thread_id, deadline_ms)
         
-        for event in self.app.stream(initial_state, config=config):
-            yield event
+        start = time.perf_counter()
+        usage = {"token_usage": [], "request_cost": None}
+        try:
+            if mode == "updates":
+                async for event in self.app.astream(initial_state, config=config):
+                    _collect_usage(event, usage)
+                    yield event
+            else:
+                config.setdefault("configurable", {})["stream_tokens"] = True
+                timer = _StreamTimer()
+                async for stream_mode, chunk in self.app.astream(
+                    initial_state, config=config, stream_mode=["updates", "custom"]
+                ):
+                    if stream_mode == "updates":
+                        _collect_usage(chunk, usage)
+                    yield timer.wrap(stream_mode, chunk)
+                yield timer.metrics()
+        except Exception:
+            self._record_request(start, usage, failed=True)
+            raise
+        self._record_request(start, usage)
     
+    @staticmethod
+    def _split_batch_item(item: Any) -> tuple[str, Optional[str]]:
+        """
+        Normaliza un elemento de lote: "tarea" o ("tarea", thread_id).
+        """
+        if isinstance(item, str):
+            return item, None
+        user_input, thread_id = item
+        return user_input, thread_id
+
+    def _batch_app(self, thread_id: Optional[str]):
+        """
+        Grafo con el que se ejecuta un elemento de lote.
+        
+        Los elementos sin thread_id usan un grafo sin checkpointer: no
+        requieren hilo y no acumulan checkpoints en memoria durante lotes
+        de miles de tareas.
+        """
+        if thread_id:
+            return self.app
+        if self._stateless_app is None:
+            self._stateless_app = self.graph.compile()
+        return self._stateless_app
+
+    def _invoke_batch_item(self, item: Any, thread_locks: dict) -> dict:
+        user_input, thread_id = self._split_batch_item(item)
+        app = self._batch_app(thread_id)
+        state = self._initial_state(user_input, thread_id)
+        if not thread_id:
+            return self._run_graph(app, state, self._run_config(thread_id))
+        # Las tareas de un mismo hilo se ejecutan en serie (comparten
+        # checkpoint); el plazo cuenta desde que empieza cada una
+        with thread_locks.setdefault(thread_id, threading.Lock()):
+            return self._run_graph(app, state, self._run_config(thread_id))
+
+    async def _ainvoke_batch_item(self, item: Any, thread_locks: dict) -> dict:
+        user_input, thread_id = self._split_batch_item(item)
+        app = self._batch_app(thread_id)
+        state = self._initial_state(user_input, thread_id)
+        if not thread_id:
+            return await self._arun_graph(app, state, self._run_config(thread_id))
+        async with thread_locks.setdefault(thread_id, asyncio.Lock()):
+            return await self._arun_graph(app, state, self._run_config(thread_id))
+
+    def invoke_many(
+        self,
+        tasks: Iterable[Any],
+        max_concurrency: int = 8,
+        ordered: bool = False,
+    ) -> Iterator[Outcome]:
+        """
+        Procesa un lote de tareas con concurrencia acotada.
+        
+        Args:
+            tasks: Iterable (consumido de forma perezosa) de tareas, cada una
+                "tarea" o ("tarea", thread_id)
+            max_concurrency: Ejecuciones del grafo en vuelo como máximo
+            ordered: Emitir en el orden de entrada (True) o según terminan;
+                las tareas que comparten thread_id se ejecutan en serie
+            
+        Yields:
+            Outcome por tarea: `index` y `item` de entrada, `value` con el
+            estado final, `error` si falló (el lote continúa) y `latency_ms`
+            
+        Ejemplo:
+            >>> for outcome in orchestrator.invoke_many(tickets, max_concurrency=16):
+            ...     if outcome.ok:
+            ...         guardar(outcome.index, outcome.value["messages"][-1].content)
+        """
+        # Cerrojos por thread_id, válidos durante el lote
+        thread_locks: dict[str, threading.Lock] = {}
+        return iter_bounded(
+            lambda item: self._invoke_batch_item(item, thread_locks),
+            tasks, max_concurrency, ordered,
+        )
+
+    def abatch(
+        self,
+        tasks: Union[Iterable[Any], AsyncIterable[Any]],
+        max_concurrency: int = 32,
+        ordered: bool = False,
+    ) -> AsyncIterator[Outcome]:
+        """
+        Versión asíncrona de invoke_many (generador asíncrono).
+        
+        Todas las ejecuciones comparten el event loop, por lo que admite
+        una concurrencia mayor que la variante con hilos; `tasks` puede ser
+        también un iterable asíncrono.
+        """
+        thread_locks: dict[str, asyncio.Lock] = {}
+        return aiter_bounded(
+            lambda item: self._ainvoke_batch_item(item, thread_locks),
+            tasks, max_concurrency, ordered,
+        )
+
     def get_graph_visualization(self) -> str:
         """
         Retorna una representación visual del grafo (si está disponible).
@@ -436,6 +960,56 @@ class AutopoieticOrchestrator:
         except Exception as e:
             return f"Error generating visualization: {str(e)}"
     
+    def wait_for_metaproduction(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que terminen las propuestas de agente en segundo plano.
+        
+        Returns:
+            True si no queda ninguna pendiente
+        """
+        return self.structural_diagnosis.wait_for_metaproduction(timeout)
+
+    async def adrain_metaproduction(self, timeout: Optional[float] = None) -> bool:
+        """
+        Versión asíncrona de wait_for_metaproduction; debe llamarse antes de
+        cerrar el event loop usado en ainvoke/astream.
+        """
+        return await self.structural_diagnosis.adrain_metaproduction(timeout)
+
+    def speculation_stats(self) -> Optional[dict]:
+        """
+        Tasa de acierto y tokens desperdiciados de la ejecución especulativa
+        (None si el modo especulativo no está activo).
+        """
+        if self.speculative_router is None:
+            return None
+        return self.speculative_router.stats.snapshot()
+
+    def viability_kpis(self) -> Optional[dict]:
+        """
+        KPIs de viabilidad de la ventana actual (latencia p50/p95/p99, tasa
+        de error, coste y tokens por petición); None si aún no hay peticiones.
+        """
+        return self.viability.snapshot()
+
+    def metrics_snapshot(self) -> dict:
+        """
+        Valores actuales de las métricas operativas (los mismos que se
+        exportan en formato Prometheus).
+        """
+        return self.metrics.registry.snapshot()
+
+    def serve_metrics(self, port: int = 9464, host: str = "127.0.0.1") -> MetricsServer:
+        """
+        Expone las métricas en http://host:port/metrics (formato de
+        exposición de Prometheus) desde un hilo en segundo plano.
+
+        Returns:
+            El servidor (idempotente: las llamadas siguientes devuelven el
+            mismo); `server.port` es el puerto real si se pidió el 0
+        """
+        return self.metrics.serve(port=port, host=host)
+
     def get_agent_catalog(self) -> list[dict]:
         """
         Obtiene el catálogo actual de agentes.
@@ -469,6 +1043,12 @@ def create_orchestrator(
     api_key: Optional[str] = None,
     llm_provider: str = "openai",
     permissions_manager: Optional[Any] = None,  # Añadido
+    response_cache: Optional[BaseCache] = None,
+    embeddings: Optional[Embeddings] = None,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    metrics_port: Optional[int] = None,
+    enforce_deadline: bool = False,
+    max_latency_ms: Optional[float] = None,
 ) -> AutopoieticOrchestrator:
     """
     Factory function para crear un orquestador autopoiético.
@@ -478,6 +1058,16 @@ def create_orchestrator(
         base_url: URL base para API compatible con OpenAI (e.g., LM Studio)
         api_key: Clave API
         llm_provider: Proveedor de LLM ("openai", "cloudflare", "lmstudio")
+        response_cache: Caché de respuestas del LLM (opcional)
+        embeddings: Embeddings para la caché semántica del router (opcional)
+        checkpointer: Checkpointer persistente (opcional, e.g. SqliteCheckpointSaver)
+        metrics_port: Puerto local para exponer métricas Prometheus (opcional)
+        enforce_deadline: Aplicar un plazo a cada petición (por defecto no:
+            las peticiones esperan a que respondan las llamadas al LLM)
+        max_latency_ms: Plazo por petición; darlo activa el plazo (por
+            defecto SystemInvariants.BUDGETS["max_latency_ms"] = 5000 ms
+            si enforce_deadline). También se puede fijar por petición con
+            `deadline_ms` en invoke/ainvoke
         
     Returns:
         Instancia del orquestador
@@ -553,4 +1143,10 @@ def create_orchestrator(
         api_key=api_key,
         llm=llm,
         permissions_manager=permissions_manager,  # Añadido
+        response_cache=response_cache,
+        embeddings=embeddings,
+        checkpointer=checkpointer,
+        metrics_port=metrics_port,
+        enforce_deadline=enforce_deadline,
+        max_latency_ms=max_latency_ms,
     )
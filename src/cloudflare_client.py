@@ -0,0 +1,339 @@
+"""
+Base común de los clientes LangChain de Cloudflare Workers AI.
+
+CloudflareLLM (query_llm, endpoint /ai/run) y CloudflareWorkersAI
+(autopoietic_orchestrator, endpoint /ai/v1/responses) solo difieren en
+cómo construyen la petición y leen la respuesta. Lo demás vive aquí:
+
+- Transporte HTTP con pool keep-alive compartido por todas las llamadas
+- Generación de lotes con concurrencia acotada (`batch_concurrency`) y
+  uso de tokens total en `llm_output["token_usage"]`
+- Streaming SSE token a token, con el uso del evento final en un último
+  fragmento vacío
+- `batch(..., return_exceptions=True)` con el error de cada elemento en
+  su posición
+
+Las subclases implementan `_build_request` y `_parse_result`.
+"""
+
+from abc import abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from langchain_core.runnables.config import get_config_list
+from pydantic import PrivateAttr
+
+from concurrency import Outcome, arun_bounded, run_bounded
+from cost_accounting import parse_usage
+from http_transport import HTTPTransport, RetryPolicy
+
+
+class CloudflareBaseLLM(BaseLLM):
+    """
+    Clase base abstracta de los clientes LLM de Cloudflare Workers AI.
+    """
+
+    account_id: str
+    auth_token: str
+    model: str = "@cf/meta/llama-2-7b-chat-int8"
+    timeout: float = 30.0
+    max_retries: int = 3
+    pool_maxsize: int = 10
+    http2: bool = False
+    # Máximo de llamadas en vuelo al generar lotes (llm.batch / generate)
+    batch_concurrency: int = 8
+
+    # Transporte con pool keep-alive compartido por todas las llamadas del cliente
+    _transport: Optional[HTTPTransport] = PrivateAttr(default=None)
+
+    @property
+    def transport(self) -> HTTPTransport:
+        """Transporte HTTP del cliente (creado bajo demanda)."""
+        if self._transport is None:
+            self._transport = HTTPTransport(
+                timeout=self.timeout,
+                pool_maxsize=self.pool_maxsize,
+                http2=self.http2,
+                retry_policy=RetryPolicy(max_retries=self.max_retries),
+            )
+        return self._transport
+
+    @abstractmethod
+    def _build_request(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+        """URL, cabeceras y payload de la petición para `prompt`."""
+        pass
+
+    @abstractmethod
+    def _parse_result(self, result: Any) -> str:
+        """Texto generado a partir del cuerpo de la respuesta."""
+        pass
+
+    def _request(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> tuple[str, Optional[tuple[int, int]]]:
+        """
+        Una llamada al modelo.
+
+        Returns:
+            (texto, (tokens de entrada, tokens de salida) o None si la
+            respuesta no trae `usage`)
+        """
+        url, headers, payload = self._build_request(prompt, stop=stop, **kwargs)
+        try:
+            result = self.transport.post_json(url, headers=headers, payload=payload)
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
+        return self._parse_result(result), parse_usage(result)
+
+    async def _arequest(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> tuple[str, Optional[tuple[int, int]]]:
+        """Versión asíncrona de _request (no bloquea el event loop)."""
+        url, headers, payload = self._build_request(prompt, stop=stop, **kwargs)
+        try:
+            result = await self.transport.apost_json(url, headers=headers, payload=payload)
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
+        return self._parse_result(result), parse_usage(result)
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Llamada directa a Cloudflare Workers AI."""
+        return self._request(prompt, stop=stop, **kwargs)[0]
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Llamada asíncrona a Cloudflare Workers AI (no bloquea el event loop)."""
+        return (await self._arequest(prompt, stop=stop, **kwargs))[0]
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """
+        Genera respuestas para múltiples prompts.
+
+        Con más de un prompt las llamadas se lanzan en paralelo (como máximo
+        `batch_concurrency` en vuelo) preservando el orden; si alguna falla
+        se propaga su excepción (ver batch con return_exceptions).
+
+        El uso de tokens reportado va en `llm_output["token_usage"]` (no en
+        las generaciones, que se guardan en la caché de respuestas).
+        """
+        if len(prompts) == 1:
+            outcomes = [Outcome(index=0, value=self._request(prompts[0], stop=stop, **kwargs))]
+        else:
+            outcomes = run_bounded(
+                lambda prompt: self._request(prompt, stop=stop, **kwargs),
+                prompts,
+                max_concurrency=self.batch_concurrency,
+            )
+        return self._outcomes_to_result(outcomes)
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """Versión asíncrona de _generate (misma concurrencia acotada)."""
+        if len(prompts) == 1:
+            outcomes = [Outcome(index=0, value=await self._arequest(prompts[0], stop=stop, **kwargs))]
+        else:
+            outcomes = await arun_bounded(
+                lambda prompt: self._arequest(prompt, stop=stop, **kwargs),
+                prompts,
+                max_concurrency=self.batch_concurrency,
+            )
+        return self._outcomes_to_result(outcomes)
+
+    def _outcomes_to_result(self, outcomes: List[Outcome]) -> LLMResult:
+        """
+        Convierte los resultados (texto, uso) del lote en un LLMResult
+        ordenado, con el uso total en `llm_output`.
+
+        Raises:
+            La excepción del primer prompt fallido: un fallo nunca se
+            devuelve como una generación vacía con apariencia de éxito
+        """
+        for outcome in outcomes:
+            if not outcome.ok:
+                raise outcome.error
+        generations = []
+        prompt_tokens = completion_tokens = 0
+        reported = False
+        for outcome in outcomes:
+            text, usage = outcome.value
+            generations.append([Generation(text=text)])
+            if usage is not None:
+                reported = True
+                prompt_tokens += usage[0]
+                completion_tokens += usage[1]
+        llm_output = {"model_name": self.model}
+        if reported:
+            llm_output["token_usage"] = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        return LLMResult(generations=generations, llm_output=llm_output)
+
+    @staticmethod
+    def _stream_delta(data: Any) -> Optional[str]:
+        """Extrae el fragmento de texto de un evento SSE de Workers AI."""
+        if not isinstance(data, dict):
+            return None
+        # Formato /ai/v1/responses (compatible con OpenAI Responses)
+        if data.get("type") == "response.output_text.delta":
+            return data.get("delta")
+        # Formato /ai/run de Workers AI
+        if isinstance(data.get("response"), str):
+            return data["response"]
+        return None
+
+    @staticmethod
+    def _stream_usage(data: Any) -> Optional[tuple[int, int]]:
+        """Uso de tokens de un evento SSE (evento final), si lo trae."""
+        if isinstance(data, dict) and data.get("type") == "response.completed":
+            return parse_usage(data.get("response"))
+        return parse_usage(data)
+
+    def _usage_chunk(self, usage: tuple[int, int]) -> GenerationChunk:
+        return GenerationChunk(
+            text="",
+            generation_info={
+                "model_name": self.model,
+                "token_usage": {"prompt_tokens": usage[0], "completion_tokens": usage[1]},
+            },
+        )
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """
+        Streaming token a token usando el modo SSE (`stream: true`) de
+        Workers AI; el uso de tokens del evento final se emite en un
+        último fragmento vacío.
+        """
+        url, headers, payload = self._build_request(prompt, stop=stop, **kwargs)
+        payload["stream"] = True
+
+        usage = None
+        try:
+            for data in self.transport.stream_sse(url, headers=headers, payload=payload):
+                usage = self._stream_usage(data) or usage
+                text = self._stream_delta(data)
+                if not text:
+                    continue
+                chunk = GenerationChunk(text=text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
+        if usage is not None:
+            yield self._usage_chunk(usage)
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """Versión asíncrona de _stream."""
+        url, headers, payload = self._build_request(prompt, stop=stop, **kwargs)
+        payload["stream"] = True
+
+        usage = None
+        try:
+            async for data in self.transport.astream_sse(url, headers=headers, payload=payload):
+                usage = self._stream_usage(data) or usage
+                text = self._stream_delta(data)
+                if not text:
+                    continue
+                chunk = GenerationChunk(text=text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
+        if usage is not None:
+            yield self._usage_chunk(usage)
+
+    def batch(
+        self,
+        inputs: List[Any],
+        config: Optional[Any] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[Any]:
+        """
+        Con `return_exceptions=True` cada prompt se genera por separado (en
+        paralelo, acotado) y el error de un elemento se devuelve en su
+        posición; BaseLLM devolvería la misma excepción para todo el lote.
+        """
+        if not return_exceptions or len(inputs) <= 1:
+            return super().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        configs = get_config_list(config, len(inputs))
+        outcomes = run_bounded(
+            lambda index: BaseLLM.batch(self, [inputs[index]], configs[index], **kwargs)[0],
+            range(len(inputs)),
+            max_concurrency=configs[0].get("max_concurrency") or self.batch_concurrency,
+        )
+        return [outcome.value if outcome.ok else outcome.error for outcome in outcomes]
+
+    async def abatch(
+        self,
+        inputs: List[Any],
+        config: Optional[Any] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[Any]:
+        """Versión asíncrona de batch."""
+        if not return_exceptions or len(inputs) <= 1:
+            return await super().abatch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        configs = get_config_list(config, len(inputs))
+        outcomes = await arun_bounded(
+            lambda index: BaseLLM.abatch(self, [inputs[index]], configs[index], **kwargs),
+            range(len(inputs)),
+            max_concurrency=configs[0].get("max_concurrency") or self.batch_concurrency,
+        )
+        return [outcome.value[0] if outcome.ok else outcome.error for outcome in outcomes]
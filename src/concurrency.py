@@ -0,0 +1,195 @@
+"""
+Utilidades de concurrencia acotada para lotes de llamadas al LLM.
+
+Permiten procesar muchos elementos con un máximo de llamadas en vuelo,
+preservando el orden de entrada y capturando el error de cada elemento
+sin abortar el resto del lote.
+
+Cada elemento se ejecuta en una copia del contexto del llamador (las
+tareas asyncio ya la copian; los hilos del pool no), de modo que el plazo
+de la petición (deadline_scope) y el registro de uso (track_usage) llegan
+también a las llamadas del lote.
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, Sequence, Union
+
+
+@dataclass
+class Outcome:
+    """
+    Resultado de procesar un elemento del lote.
+    """
+    index: int
+    value: Any = None
+    error: Optional[BaseException] = None
+    latency_ms: float = 0.0
+    item: Any = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _timed(fn: Callable[[Any], Any], index: int, item: Any) -> Outcome:
+    start = time.perf_counter()
+    try:
+        value = fn(item)
+        return Outcome(index=index, value=value, latency_ms=(time.perf_counter() - start) * 1000, item=item)
+    except Exception as e:
+        return Outcome(index=index, error=e, latency_ms=(time.perf_counter() - start) * 1000, item=item)
+
+
+async def _atimed(fn: Callable[[Any], Awaitable[Any]], index: int, item: Any) -> Outcome:
+    start = time.perf_counter()
+    try:
+        value = await fn(item)
+        return Outcome(index=index, value=value, latency_ms=(time.perf_counter() - start) * 1000, item=item)
+    except Exception as e:
+        return Outcome(index=index, error=e, latency_ms=(time.perf_counter() - start) * 1000, item=item)
+
+
+def _submit(executor: ThreadPoolExecutor, fn: Callable[[Any], Any], index: int, item: Any):
+    # Una copia por elemento: un mismo Context no puede ejecutarse en dos hilos a la vez
+    return executor.submit(contextvars.copy_context().run, _timed, fn, index, item)
+
+
+def run_bounded(
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    max_concurrency: int = 8,
+) -> list[Outcome]:
+    """
+    Aplica `fn` a cada elemento con como máximo `max_concurrency` hilos.
+
+    Returns:
+        Lista de Outcome en el mismo orden que `items`
+    """
+    if not items:
+        return []
+    workers = max(1, min(max_concurrency, len(items)))
+    if workers == 1:
+        return [_timed(fn, i, item) for i, item in enumerate(items)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [_submit(executor, fn, i, item) for i, item in enumerate(items)]
+        return [future.result() for future in futures]
+
+
+async def arun_bounded(
+    fn: Callable[[Any], Awaitable[Any]],
+    items: Sequence[Any],
+    max_concurrency: int = 8,
+) -> list[Outcome]:
+    """
+    Versión asíncrona de run_bounded: un semáforo limita las corrutinas en vuelo.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def worker(index: int, item: Any) -> Outcome:
+        async with semaphore:
+            return await _atimed(fn, index, item)
+
+    return list(await asyncio.gather(*(worker(i, item) for i, item in enumerate(items))))
+
+
+def iter_bounded(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_concurrency: int = 8,
+    ordered: bool = True,
+) -> Iterator[Outcome]:
+    """
+    Variante en streaming de run_bounded para lotes grandes o ilimitados.
+
+    `items` se consume de forma perezosa: nunca hay más de `max_concurrency`
+    elementos en vuelo, así que la memoria no crece con el tamaño del lote.
+    Con `ordered=False` cada Outcome se emite en cuanto termina; con
+    `ordered=True` se respeta el orden de entrada (un elemento lento retiene
+    a los siguientes, pero no se lanzan más de `max_concurrency`).
+    """
+    workers = max(1, max_concurrency)
+    source = enumerate(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: deque = deque()
+
+        def refill() -> None:
+            while len(in_flight) < workers:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    return
+                in_flight.append(_submit(executor, fn, index, item))
+
+        refill()
+        while in_flight:
+            if ordered:
+                yield in_flight.popleft().result()
+            else:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+                    yield future.result()
+            refill()
+
+
+async def aiter_bounded(
+    fn: Callable[[Any], Awaitable[Any]],
+    items: Union[Iterable[Any], AsyncIterable[Any]],
+    max_concurrency: int = 8,
+    ordered: bool = True,
+) -> AsyncIterator[Outcome]:
+    """
+    Versión asíncrona de iter_bounded; `items` puede ser un iterable
+    síncrono o asíncrono (e.g. un cursor de base de datos).
+    """
+    workers = max(1, max_concurrency)
+    if hasattr(items, "__aiter__"):
+        source = items.__aiter__()
+
+        async def next_item() -> Any:
+            return await source.__anext__()
+    else:
+        sync_source = iter(items)
+
+        async def next_item() -> Any:
+            try:
+                return next(sync_source)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    in_flight: deque = deque()
+    index = 0
+    exhausted = False
+
+    async def refill() -> None:
+        nonlocal index, exhausted
+        while not exhausted and len(in_flight) < workers:
+            try:
+                item = await next_item()
+            except StopAsyncIteration:
+                exhausted = True
+                return
+            in_flight.append(asyncio.ensure_future(_atimed(fn, index, item)))
+            index += 1
+
+    try:
+        await refill()
+        while in_flight:
+            if ordered:
+                yield await in_flight.popleft()
+            else:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    in_flight.remove(task)
+                    yield task.result()
+            await refill()
+    finally:
+        # Si el consumidor abandona el generador, cancelar lo que quede en vuelo
+        for task in in_flight:
+            task.cancel()
@@ -0,0 +1,289 @@
+"""
+Memoria conversacional con presupuesto de tokens por hilo.
+
+Con checkpointing un thread_id acumula mensajes sin límite, mientras que
+los agentes solo recibían el último mensaje. ConversationMemory construye
+el contexto de cada prompt a partir del historial del hilo:
+
+- Los turnos recientes se envían literalmente
+- Los antiguos se pliegan en un resumen incremental que se guarda en el
+  propio estado (y por tanto en el checkpoint): cada turno solo resume
+  los mensajes nuevos que salen de la ventana, nunca todo el historial
+
+Así el tamaño del prompt, la latencia y el coste se mantienen planos sin
+importar la longitud de la conversación.
+"""
+
+from typing import Any, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+
+from orchestrator_state import OrchestratorState, SystemInvariants
+from token_budget import MESSAGE_OVERHEAD_TOKENS, TokenBudget, message_text
+from cost_accounting import UsageTracker, track_usage
+from deadline import (
+    MIN_SUMMARY_MS,
+    DeadlineExceeded,
+    acall_with_deadline,
+    call_with_deadline,
+    resolve_deadline,
+)
+
+
+# Nombre con el que el router marca sus notas internas en el historial
+ROUTER_MESSAGE_NAME = "router"
+
+
+class ConversationMemory:
+    """
+    Etapa de memoria del grafo (nodo "memory", antes del router) y
+    constructor del historial que reciben los agentes.
+
+    Reparto del presupuesto (`max_tokens`, por defecto
+    SystemInvariants.BUDGETS["max_tokens_per_request"]):
+    - `history_share` para los turnos recientes literales
+    - `summary_max_tokens` para el resumen de los turnos antiguos
+    - el resto queda para el prompt del agente, la tarea y la respuesta
+
+    Al superar el presupuesto de historial se pliegan los mensajes más
+    antiguos hasta dejar la ventana en la mitad del presupuesto; así el
+    resumen se actualiza cada varios turnos y no en cada uno.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        max_tokens: Optional[int] = None,
+        history_share: float = 0.5,
+        summary_max_tokens: int = 500,
+        token_budget: Optional[TokenBudget] = None,
+    ):
+        """
+        Args:
+            llm: LLM usado para resumir (el compartido del orquestador)
+            max_tokens: Presupuesto total por petición
+            history_share: Fracción del presupuesto para turnos literales
+            summary_max_tokens: Longitud máxima del resumen
+            token_budget: Contador y registro de uso (por defecto uno con
+                el mismo max_tokens)
+        """
+        self.llm = llm
+        self.max_tokens = max_tokens or SystemInvariants.BUDGETS["max_tokens_per_request"]
+        self.history_budget = int(self.max_tokens * history_share)
+        self.summary_max_tokens = summary_max_tokens
+        self.token_budget = token_budget or TokenBudget(self.max_tokens)
+        self.counter = self.token_budget.counter
+
+    ###
+    # Selección del historial
+    ###
+
+    @staticmethod
+    def _is_conversational(message: Any) -> bool:
+        """Descarta las notas internas del router."""
+        return getattr(message, "name", None) != ROUTER_MESSAGE_NAME
+
+    @staticmethod
+    def _current_turn_start(messages: list) -> int:
+        """Índice del último mensaje del usuario (la tarea en curso)."""
+        for index in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[index], HumanMessage):
+                return index
+        return len(messages)
+
+    def _pending(self, state: OrchestratorState) -> tuple[int, int]:
+        """
+        Rango [inicio, fin) del historial aún no resumido, sin el turno actual.
+        """
+        messages = state.get("messages") or []
+        start = state.get("summarized_until") or 0
+        end = self._current_turn_start(messages)
+        return min(start, end), end
+
+    def _window_start(self, messages: list, start: int, end: int, budget: int) -> int:
+        """
+        Primer índice de la ventana reciente que cabe en `budget` tokens.
+        """
+        used = 0
+        index = end
+        while index > start:
+            message = messages[index - 1]
+            cost = self.counter.count_message(message) if self._is_conversational(message) else 0
+            if used + cost > budget:
+                break
+            used += cost
+            index -= 1
+        return index
+
+    ###
+    # Nodo del grafo: resumen incremental
+    ###
+
+    def _fold_range(self, state: OrchestratorState) -> Optional[tuple[int, int]]:
+        """
+        Mensajes a plegar en el resumen, o None si el historial cabe.
+        """
+        messages = state.get("messages") or []
+        start, end = self._pending(state)
+        pending_tokens = sum(
+            self.counter.count_message(message)
+            for message in messages[start:end]
+            if self._is_conversational(message)
+        )
+        if pending_tokens <= self.history_budget:
+            return None
+        return start, self._window_start(messages, start, end, self.history_budget // 2)
+
+    def update(self, state: OrchestratorState, config: Optional[RunnableConfig] = None) -> OrchestratorState:
+        """
+        Nodo del grafo: pliega en el resumen los turnos que exceden el presupuesto.
+
+        Si el plazo de la petición no deja tiempo para resumir, el pliegue
+        se pospone al siguiente turno (el contexto se recorta por ventana).
+
+        Returns:
+            Actualización parcial (resumen y marca) o {} si no hace falta
+        """
+        fold = self._fold_range(state)
+        if fold is None:
+            return {}
+        deadline = resolve_deadline(config)
+        if deadline is not None and not deadline.allows(MIN_SUMMARY_MS):
+            return {}
+        start, until = fold
+        prompt = self._summary_prompt(state, start, until)
+        try:
+            with track_usage() as tracker:
+                response = call_with_deadline(deadline, self.llm.invoke, prompt)
+        except DeadlineExceeded:
+            print("⏱️  Plazo agotado resumiendo el historial; se pospone")
+            return {}
+        except Exception as e:
+            print(f"⚠️  No se pudo resumir el historial: {e}")
+            return {}
+        return self._summary_update(prompt, response, until, tracker)
+
+    async def aupdate(self, state: OrchestratorState, config: Optional[RunnableConfig] = None) -> OrchestratorState:
+        """
+        Versión asíncrona de update.
+        """
+        fold = self._fold_range(state)
+        if fold is None:
+            return {}
+        deadline = resolve_deadline(config)
+        if deadline is not None and not deadline.allows(MIN_SUMMARY_MS):
+            return {}
+        start, until = fold
+        prompt = self._summary_prompt(state, start, until)
+        try:
+            with track_usage() as tracker:
+                response = await acall_with_deadline(deadline, self.llm.ainvoke(prompt))
+        except DeadlineExceeded:
+            print("⏱️  Plazo agotado resumiendo el historial; se pospone")
+            return {}
+        except Exception as e:
+            print(f"⚠️  No se pudo resumir el historial: {e}")
+            return {}
+        return self._summary_update(prompt, response, until, tracker)
+
+    def _summary_prompt(self, state: OrchestratorState, start: int, until: int) -> list[dict]:
+        """
+        Prompt de resumen incremental: resumen previo + mensajes que salen de la ventana.
+
+        Si no cabe en el presupuesto de tokens se recortan los mensajes
+        nuevos y, en último caso, el resumen previo.
+        """
+        previous = state.get("conversation_summary") or "(sin resumen previo)"
+        transcript = "\n".join(
+            f"{'Usuario' if isinstance(message, HumanMessage) else 'Asistente'}: {message_text(message)}"
+            for message in state["messages"][start:until]
+            if self._is_conversational(message)
+        )
+        template = """Actualiza el resumen de una conversación entre un usuario y un sistema de agentes.
+
+**Resumen previo:**
+{previous}
+
+**Mensajes nuevos a incorporar:**
+{transcript}
+
+Devuelve solo el resumen actualizado (máximo {max_chars} caracteres), conservando hechos, decisiones, preferencias del usuario y tareas pendientes."""
+        texts, _, _ = self.token_budget.fit(
+            [("template", template), ("previous", previous), ("transcript", transcript)],
+            trim_order=["transcript", "previous"],
+            reserved=MESSAGE_OVERHEAD_TOKENS,
+        )
+        prompt = template.format(
+            previous=texts["previous"],
+            transcript=texts["transcript"],
+            max_chars=self.summary_max_tokens * 3,
+        )
+        return [{"role": "user", "content": prompt}]
+
+    def _summary_update(
+        self,
+        prompt: list[dict],
+        response: Any,
+        until: int,
+        tracker: UsageTracker,
+    ) -> OrchestratorState:
+        completion = message_text(response)
+        # Recortar si el modelo no respeta la longitud pedida
+        summary = self.counter.truncate(completion.strip(), self.summary_max_tokens)
+        usage = tracker.apply(self.token_budget.usage("memory", self.counter.count_messages(prompt), completion))
+        return {
+            "conversation_summary": summary,
+            "summarized_until": until,
+            "token_usage": [usage],
+        }
+
+    ###
+    # Historial para los prompts de los agentes
+    ###
+
+    def context_messages(
+        self,
+        state: OrchestratorState,
+        max_tokens: Optional[int] = None,
+    ) -> list[BaseMessage]:
+        """
+        Historial a insertar en el prompt de un agente: resumen (si existe)
+        y turnos recientes literales dentro del presupuesto, sin notas del
+        router ni el turno actual.
+
+        Args:
+            max_tokens: Límite adicional (lo que deja libre el resto del
+                prompt); se descartan primero los turnos más antiguos y,
+                si ni el resumen cabe, se recorta el resumen
+        """
+        messages = state.get("messages") or []
+        start, end = self._pending(state)
+
+        context: list[BaseMessage] = []
+        budget = self.history_budget
+        summary = state.get("conversation_summary")
+        if summary:
+            summary_message = SystemMessage(content=f"Resumen de la conversación previa:\n{summary}")
+            summary_tokens = self.counter.count_message(summary_message)
+            if max_tokens is not None and summary_tokens > max_tokens:
+                summary_message = SystemMessage(
+                    content=self.counter.truncate(summary_message.content, max(0, max_tokens - MESSAGE_OVERHEAD_TOKENS))
+                )
+                summary_tokens = self.counter.count_message(summary_message)
+            if summary_message.content:
+                context.append(summary_message)
+                if max_tokens is not None:
+                    max_tokens -= summary_tokens
+        if max_tokens is not None:
+            budget = min(budget, max(0, max_tokens))
+        window = self._window_start(messages, start, end, budget)
+
+        for message in messages[window:end]:
+            if not self._is_conversational(message):
+                continue
+            if isinstance(message, BaseMessage):
+                context.append(message)
+            else:
+                context.append(AIMessage(content=message_text(message)))
+        return context
@@ -0,0 +1,269 @@
+"""
+Contabilidad de tokens y coste por petición.
+
+Los registros de `token_usage` se basaban solo en estimaciones del
+contador local. Este módulo:
+
+- Lee el uso real que devuelve el proveedor: `usage_metadata` de los
+  mensajes de ChatOpenAI y `usage` de Cloudflare /ai/v1/responses (o
+  /ai/run), vía un callback de LangChain que los nodos activan alrededor
+  de cada llamada (`track_usage`)
+- Convierte tokens en coste con una tabla de precios por modelo
+  configurable (PriceTable)
+- Agrega el coste por nodo y por agent_id; el nodo de contabilidad del
+  grafo lo publica por petición (`request_cost`) y acumulado por hilo
+  (`thread_cost`)
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from orchestrator_state import OrchestratorState, SystemInvariants
+
+# Precios de referencia en USD por millón de tokens (entrada, salida).
+# Ajustar con PriceTable(prices=...) o PriceTable.from_json
+DEFAULT_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "@cf/openai/gpt-oss-120b": (0.35, 0.75),
+    "@cf/openai/gpt-oss-20b": (0.20, 0.30),
+}
+
+
+class PriceTable:
+    """
+    Precio por modelo en USD por millón de tokens (entrada, salida).
+
+    Un modelo sin entrada exacta usa la del prefijo más largo que coincida
+    (e.g. "gpt-4o-2024-08-06" → "gpt-4o"); si no hay ninguno, el precio
+    por defecto.
+    """
+
+    def __init__(
+        self,
+        prices: Optional[dict[str, tuple[float, float]]] = None,
+        default_price: tuple[float, float] = (0.0, 0.0),
+    ):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self.default_price = default_price
+        self._resolved: dict[str, tuple[float, float]] = {}
+
+    @classmethod
+    def from_json(cls, path: str, **kwargs) -> "PriceTable":
+        """
+        Carga la tabla de un JSON {"modelo": [entrada, salida], ...}.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(prices={model: tuple(price) for model, price in data.items()}, **kwargs)
+
+    def price(self, model: Optional[str]) -> tuple[float, float]:
+        if not model:
+            return self.default_price
+        price = self._resolved.get(model)
+        if price is None:
+            price = self.prices.get(model)
+            if price is None:
+                prefixes = [known for known in self.prices if model.startswith(known)]
+                price = self.prices[max(prefixes, key=len)] if prefixes else self.default_price
+            self._resolved[model] = price
+        return price
+
+    def cost(self, model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+        input_price, output_price = self.price(model)
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def parse_usage(data: Any) -> Optional[tuple[int, int]]:
+    """
+    (tokens de entrada, tokens de salida) del cuerpo de una respuesta.
+
+    Acepta `usage` de OpenAI (prompt_tokens / completion_tokens), de la
+    API Responses (input_tokens / output_tokens) y de Workers AI
+    (`result.usage`). None si la respuesta no trae uso.
+    """
+    if not isinstance(data, dict):
+        return None
+    usage = data.get("usage")
+    if usage is None and isinstance(data.get("result"), dict):
+        usage = data["result"].get("usage")
+    if not isinstance(usage, dict):
+        return None
+    prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion_tokens = usage.get("completion_tokens", usage.get("output_tokens"))
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    return int(prompt_tokens or 0), int(completion_tokens or 0)
+
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Callback que acumula el uso reportado por el proveedor en las
+    llamadas al LLM hechas dentro de `track_usage`.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reported = False
+        self.model: Optional[str] = None
+        # Coste ya conocido (las respuestas de la caché de LangChain traen 0)
+        self.cost: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized: Any, prompts: list, **kwargs: Any) -> None:
+        with self._lock:
+            self.started += 1
+
+    def on_chat_model_start(self, serialized: Any, messages: list, **kwargs: Any) -> None:
+        with self._lock:
+            self.started += 1
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = getattr(message, "usage_metadata", None)
+                if metadata:
+                    self._add(
+                        metadata.get("input_tokens", 0),
+                        metadata.get("output_tokens", 0),
+                        (message.response_metadata or {}).get("model_name"),
+                        metadata.get("total_cost"),
+                    )
+                    found = True
+                elif generation.generation_info and generation.generation_info.get("token_usage"):
+                    # Streaming de Cloudflare: uso en el último fragmento
+                    info = generation.generation_info
+                    usage = parse_usage({"usage": info["token_usage"]})
+                    if usage is not None:
+                        self._add(*usage, info.get("model_name"))
+                        found = True
+        if not found and response.llm_output:
+            usage = parse_usage({"usage": response.llm_output.get("token_usage")})
+            if usage is not None:
+                self._add(*usage, response.llm_output.get("model_name"))
+
+    def _add(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        model: Optional[str],
+        cost: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            self.reported = True
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.model = model or self.model
+            if cost is not None:
+                self.cost = (self.cost or 0.0) + cost
+
+    def apply(self, record: dict) -> dict:
+        """
+        Completa un registro de `token_usage` con el uso del proveedor:
+        sustituye los tokens estimados, añade el modelo y, si la respuesta
+        salió de la caché sin llegar al proveedor, coste 0.
+        """
+        if self.reported:
+            record["prompt_tokens"] = self.prompt_tokens
+            record["completion_tokens"] = self.completion_tokens
+            record["usage_source"] = "provider"
+            if self.cost is not None:
+                record["cost"] = self.cost
+        else:
+            record["usage_source"] = "estimate"
+            if self.started == 0:
+                # BaseLLM no inicia callbacks para respuestas cacheadas
+                record["cost"] = 0.0
+        if self.model:
+            record["model"] = self.model
+        return record
+
+
+_usage_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("usage_tracker", default=None)
+# Las llamadas hechas con el contexto activo añaden el tracker a sus callbacks
+register_configure_hook(_usage_tracker, inheritable=True)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageTracker]:
+    """
+    Registra el uso del proveedor de las llamadas al LLM del bloque (se
+    propaga a hilos y tareas que copian el contexto, como
+    acall_with_deadline).
+    """
+    tracker = UsageTracker()
+    token = _usage_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _usage_tracker.reset(token)
+
+
+def _empty_totals() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+
+def _add_totals(totals: dict, record: dict, cost: float) -> None:
+    totals["calls"] += 1
+    totals["prompt_tokens"] += record["prompt_tokens"]
+    totals["completion_tokens"] += record["completion_tokens"]
+    totals["cost"] += cost
+
+
+class CostAccountingNode:
+    """
+    Nodo final del grafo: coste de la petición a partir de `token_usage`.
+
+    Devuelve `request_cost` (total de la petición, por nodo y por
+    agent_id) y la misma agregación en `thread_cost`, que el reductor
+    acumula por hilo.
+    """
+
+    def __init__(self, price_table: Optional[PriceTable] = None, default_model: Optional[str] = None):
+        """
+        Args:
+            price_table: Precios por modelo (por defecto DEFAULT_PRICES)
+            default_model: Modelo de los registros sin modelo reportado
+                (estimaciones), normalmente el del LLM compartido
+        """
+        self.price_table = price_table or PriceTable()
+        self.default_model = default_model
+
+    def summarize(self, records: list[dict]) -> dict:
+        """Agregación de los registros de tokens de una petición."""
+        summary = {**_empty_totals(), "by_node": {}, "by_agent": {}}
+        for record in records:
+            cost = record.get("cost")
+            if cost is None:
+                cost = self.price_table.cost(
+                    record.get("model") or self.default_model,
+                    record["prompt_tokens"],
+                    record["completion_tokens"],
+                )
+            _add_totals(summary, record, cost)
+            _add_totals(summary["by_node"].setdefault(record["node"], _empty_totals()), record, cost)
+            if record.get("agent_id"):
+                _add_totals(summary["by_agent"].setdefault(record["agent_id"], _empty_totals()), record, cost)
+        return summary
+
+    def account(self, state: OrchestratorState) -> OrchestratorState:
+        """Nodo del grafo: publica el coste de la petición y lo suma al del hilo."""
+        summary = self.summarize(state.get("token_usage") or [])
+        max_cost = SystemInvariants.BUDGETS["max_cost_per_request"]
+        if summary["cost"] > max_cost:
+            print(f"⚠️  Coste de la petición {summary['cost']:.4f} supera max_cost_per_request ({max_cost})")
+        return {"request_cost": summary, "thread_cost": summary}
@@ -0,0 +1,159 @@
+"""
+Plazos por petición (SystemInvariants.BUDGETS["max_latency_ms"]).
+
+Si el plazo está activado (enforce_deadline / max_latency_ms, o
+`deadline_ms` en la petición), AutopoieticOrchestrator fija un Deadline
+al empezar cada invoke/ainvoke y lo propaga de dos formas:
+
+- En la configuración del grafo (`configurable["deadline"]`, instante
+  monotónico de vencimiento), para que cada nodo decida con el tiempo
+  restante: omitir el resumen de memoria, enrutar sin LLM, no hacer la
+  metaproducción en línea...
+- En una ContextVar (establecida por call_with_deadline /
+  acall_with_deadline alrededor de cada llamada al LLM), para que el
+  transporte HTTP ajuste el timeout de cada petición y sus reintentos al
+  tiempo restante
+
+Las llamadas al LLM de los nodos se acotan con call_with_deadline /
+acall_with_deadline: al vencer el plazo se lanza DeadlineExceeded y el
+nodo responde con lo que tenga en lugar de seguir esperando. Las
+síncronas se hacen en el hilo del llamador (sin hilos vigilantes): las
+acota el transporte HTTP, cuyo timeout ya se recorta al tiempo restante.
+"""
+
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+# Tiempo mínimo restante (ms) para que merezca la pena cada paso opcional
+MIN_LLM_CALL_MS = 300
+MIN_SUMMARY_MS = 2000
+MIN_INLINE_METAPRODUCTION_MS = 4000
+
+
+class DeadlineExceeded(TimeoutError):
+    """Se agotó el plazo de la petición."""
+
+
+class Deadline:
+    """
+    Instante de vencimiento de una petición (reloj monotónico).
+    """
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after_ms(cls, budget_ms: float) -> "Deadline":
+        return cls(time.monotonic() + budget_ms / 1000)
+
+    @classmethod
+    def from_config(cls, config: Optional[RunnableConfig]) -> Optional["Deadline"]:
+        """Plazo propagado en la configuración del grafo (None si no hay)."""
+        if not config:
+            return None
+        expires_at = config.get("configurable", {}).get("deadline")
+        return cls(expires_at) if expires_at is not None else None
+
+    def remaining(self) -> float:
+        """Segundos restantes (negativo si ya venció)."""
+        return self.expires_at - time.monotonic()
+
+    def remaining_ms(self) -> float:
+        return self.remaining() * 1000
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, min_ms: float) -> bool:
+        """Si quedan al menos `min_ms` milisegundos."""
+        return self.remaining_ms() >= min_ms
+
+    def share(self, fraction: float) -> "Deadline":
+        """Plazo que vence tras `fraction` del tiempo restante (sub-tarea)."""
+        return Deadline(time.monotonic() + max(0.0, self.remaining()) * fraction)
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Plazo de la petición en curso en este contexto (None si no hay)."""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Establece el plazo de la petición en curso dentro del bloque."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def request_timeout(default: float) -> float:
+    """
+    Timeout para una petición HTTP: `default` acotado por el plazo actual.
+
+    Raises:
+        DeadlineExceeded: Si el plazo ya venció
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Plazo de la petición agotado")
+    return min(default, remaining)
+
+
+def resolve_deadline(config: Optional[RunnableConfig]) -> Optional[Deadline]:
+    """Plazo del nodo: el de la configuración o, si no, el del contexto."""
+    return Deadline.from_config(config) or current_deadline()
+
+
+def call_with_deadline(deadline: Optional[Deadline], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Ejecuta `fn` en este hilo con `deadline` como plazo de la petición en
+    curso: dentro de `fn` el plazo acota el timeout de cada petición HTTP
+    y sus reintentos (ver request_timeout), que es lo que corta la llamada.
+
+    Raises:
+        DeadlineExceeded: Si el plazo ya venció al empezar, o si `fn`
+            falla con el plazo vencido (e.g. por el timeout HTTP recortado)
+    """
+    if deadline is None:
+        return fn(*args, **kwargs)
+    if deadline.expired:
+        raise DeadlineExceeded("Plazo de la petición agotado")
+    with deadline_scope(deadline):
+        try:
+            return fn(*args, **kwargs)
+        except DeadlineExceeded:
+            raise
+        except Exception as error:
+            if deadline.expired:
+                raise DeadlineExceeded("Plazo de la petición agotado") from error
+            raise
+
+
+async def acall_with_deadline(deadline: Optional[Deadline], awaitable: Awaitable[Any]) -> Any:
+    """
+    Versión asíncrona de call_with_deadline: cancela la corrutina al vencer.
+    """
+    if deadline is None:
+        return await awaitable
+    try:
+        # wait_for copia el contexto actual en la tarea que crea
+        with deadline_scope(deadline):
+            return await asyncio.wait_for(awaitable, timeout=max(0.0, deadline.remaining()))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Plazo de la petición agotado")
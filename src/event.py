@@ -2,17 +2,23 @@ from event_manager import EventManager
 import datetime 
 
 class Event:
-    def __init__(self, event_type, event_name, event_description, requires_confirmation=False):
+    def __init__(self, event_type, event_name, event_description, requires_confirmation=False, event_manager=None, payload=None):
         self.event_time = datetime.datetime.now()
-        # Registro de eventos
-        self.event_manager_ref = EventManager()
+        # Registro de eventos (por defecto el compartido del proceso)
+        self.event_manager_ref = event_manager if event_manager is not None else EventManager()
         
         # tipo de evento, crear herramienta, crear agente, refinar prompt etc.
         self.event_type = event_type
         self.event_name = event_name 
         # Esta descripcion proviene de la IA
         self.event_description = event_description
+        # Datos estructurados del evento (e.g. la especificación propuesta)
+        self.payload = payload
         # Confirmación del usuario
         self.requires_confirmation = requires_confirmation
+        # Resultado de la confirmación (None mientras esté pendiente)
+        self.confirmed = None
+        # Id de secuencia, asignado por el EventManager al registrar
+        self.event_id = None
         self.event_manager_ref.register_event(self)
  
\ No newline at end of file
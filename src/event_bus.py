@@ -0,0 +1,303 @@
+"""
+Bus de eventos publicación/suscripción.
+
+Con solo el EventManager, los consumidores (e.g. main.py) tenían que
+consultar el registro tras cada turno. EventBus empuja cada evento a los
+suscriptores interesados en su tipo:
+
+- Suscriptores síncronos: cada uno tiene su propia cola acotada y su hilo
+  de entrega; uno lento no retrasa a los demás ni al publicador
+- Suscriptores asíncronos (funciones `async def`): se ejecutan en su
+  event loop, fuera del camino crítico, con una cola acotada propia
+- Publicar nunca bloquea: si la cola de un suscriptor está llena se
+  descarta su evento más antiguo y se contabiliza en `dropped`
+
+Cada orquestador tiene su propio bus (sumidero de su EventManager), de
+modo que varios orquestadores en un mismo proceso no comparten eventos.
+"""
+
+import asyncio
+import inspect
+import queue
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable, Optional
+
+# Marca de fin para los hilos/tareas de entrega
+_STOP = object()
+
+
+class Subscription(ABC):
+    """
+    Clase base abstracta de las suscripciones a un EventBus: cola acotada
+    + entrega en segundo plano.
+
+    Contadores: delivered (entregados), dropped (descartados por cola
+    llena), errors (excepciones del callback).
+    """
+
+    def __init__(
+        self,
+        bus: "EventBus",
+        callback: Callable[[Any], Any],
+        event_types: Optional[frozenset],
+        max_queue: int,
+    ):
+        self.bus = bus
+        self.callback = callback
+        self.event_types = event_types
+        self.max_queue = max_queue
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.active = True
+
+    @abstractmethod
+    def offer(self, event) -> None:
+        """Encola un evento para su entrega (nunca bloquea)."""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Detiene la entrega en segundo plano."""
+        pass
+
+    def unsubscribe(self) -> None:
+        """Deja de recibir eventos y detiene la entrega."""
+        self.bus._remove(self)
+        self.close()
+
+    def _handle_error(self, error: Exception) -> None:
+        self.errors += 1
+        name = getattr(self.callback, "__name__", repr(self.callback))
+        print(f"⚠️  Error en suscriptor de eventos {name}: {error}")
+
+    def stats(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class _ThreadSubscription(Subscription):
+    """Suscriptor síncrono con hilo de entrega propio."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"event-bus-{getattr(self.callback, '__name__', 'subscriber')}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def offer(self, event) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                # Descartar el más antiguo para no bloquear al publicador
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self) -> None:
+        while True:
+            event = self._queue.get()
+            try:
+                if event is _STOP:
+                    return
+                self.callback(event)
+                self.delivered += 1
+            except Exception as e:
+                self._handle_error(e)
+            finally:
+                self._queue.task_done()
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        self.offer(_STOP)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+
+class _AsyncSubscription(Subscription):
+    """Suscriptor asíncrono entregado por una tarea en su event loop."""
+
+    def __init__(self, *args, loop: asyncio.AbstractEventLoop, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task: Optional[asyncio.Task] = None
+        loop.call_soon_threadsafe(self._start)
+
+    def _start(self) -> None:
+        self._task = self.loop.create_task(self._run())
+
+    def offer(self, event) -> None:
+        if self.loop.is_closed():
+            self.dropped += 1
+            return
+        # asyncio.Queue no es thread-safe: encolar desde el propio loop
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def _run(self) -> None:
+        while True:
+            event = await self._queue.get()
+            try:
+                if event is _STOP:
+                    return
+                await self.callback(event)
+                self.delivered += 1
+            except Exception as e:
+                self._handle_error(e)
+            finally:
+                self._queue.task_done()
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    def close(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        self.offer(_STOP)
+
+
+class EventBus:
+    """
+    Bus de eventos de un orquestador.
+
+    Uso:
+        bus = EventBus()
+        event_manager.add_sink(bus)          # cada evento registrado se publica
+        sub = bus.subscribe(on_proposal, event_types=["new_agent_proposal"])
+        ...
+        sub.unsubscribe()
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        """
+        Args:
+            max_queue: Capacidad por defecto de la cola de cada suscriptor
+        """
+        self.max_queue = max_queue
+        self._subscriptions: list[Subscription] = []
+        self._by_type: dict[str, list[Subscription]] = {}
+        self._wildcard: list[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        callback: Callable[[Any], Any],
+        event_types: Optional[Iterable[str]] = None,
+        max_queue: Optional[int] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Subscription:
+        """
+        Registra un suscriptor.
+
+        Args:
+            callback: Función `f(event)` o corrutina `async def f(event)`
+            event_types: Tipos de evento a recibir (None = todos)
+            max_queue: Capacidad de su cola (por defecto la del bus)
+            loop: Event loop de un suscriptor asíncrono (por defecto el
+                loop en ejecución)
+        """
+        types = frozenset(event_types) if event_types is not None else None
+        capacity = max_queue or self.max_queue
+        if inspect.iscoroutinefunction(callback):
+            if loop is None:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    raise ValueError(
+                        "Un suscriptor asíncrono requiere un event loop en ejecución o `loop`"
+                    )
+            subscription = _AsyncSubscription(self, callback, types, capacity, loop=loop)
+        else:
+            subscription = _ThreadSubscription(self, callback, types, capacity)
+
+        with self._lock:
+            self._subscriptions.append(subscription)
+            if types is None:
+                self._wildcard = self._wildcard + [subscription]
+            else:
+                for event_type in types:
+                    self._by_type[event_type] = self._by_type.get(event_type, []) + [subscription]
+        return subscription
+
+    def _remove(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+            # Listas copiadas al modificar: publish las lee sin lock
+            if subscription.event_types is None:
+                self._wildcard = [s for s in self._wildcard if s is not subscription]
+            else:
+                for event_type in subscription.event_types:
+                    remaining = [s for s in self._by_type.get(event_type, []) if s is not subscription]
+                    if remaining:
+                        self._by_type[event_type] = remaining
+                    else:
+                        self._by_type.pop(event_type, None)
+
+    def publish(self, event) -> None:
+        """Entrega el evento a los suscriptores de su tipo (no bloquea)."""
+        for subscription in self._by_type.get(event.event_type, ()):
+            subscription.offer(event)
+        for subscription in self._wildcard:
+            subscription.offer(event)
+
+    # Interfaz de sumidero del EventManager
+    append = publish
+
+    def drain(self) -> None:
+        """
+        Espera a que los suscriptores síncronos procesen lo encolado
+        (los asíncronos se esperan con adrain).
+        """
+        for subscription in list(self._subscriptions):
+            if isinstance(subscription, _ThreadSubscription):
+                subscription.join()
+
+    async def adrain(self) -> None:
+        """Espera a los suscriptores asíncronos del loop actual."""
+        loop = asyncio.get_running_loop()
+        # Dejar que se ejecuten los _put programados con call_soon_threadsafe
+        await asyncio.sleep(0)
+        for subscription in list(self._subscriptions):
+            if isinstance(subscription, _AsyncSubscription) and subscription.loop is loop:
+                await subscription.join()
+
+    def close(self) -> None:
+        """Cancela todas las suscripciones."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.unsubscribe()
+
+    def stats(self) -> list[dict]:
+        return [
+            {"callback": getattr(s.callback, "__name__", repr(s.callback)), **s.stats()}
+            for s in list(self._subscriptions)
+        ]
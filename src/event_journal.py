@@ -0,0 +1,353 @@
+"""
+Diario de eventos persistente, solo de anexado.
+
+Los eventos de EventManager solo viven en memoria y se pierden al
+reiniciar, pese a SystemInvariants.TRACEABILITY["log_all_decisions"].
+EventJournal es un sumidero opcional del EventManager que los escribe
+como líneas JSON en ficheros segmentados y rotados:
+
+- En el camino crítico, registrar un evento solo cuesta encolar una
+  instantánea de sus campos; la serialización y la E/S las hace un hilo
+  escritor en segundo plano
+- El escritor agrupa lo que haya en la cola y hace un único write + fsync
+  por lote (fsync por lotes en lugar de por evento)
+- Al superar `segment_max_bytes` se abre un segmento nuevo
+  (events-000001.jsonl, events-000002.jsonl, ...)
+- Resolver una confirmación añade una línea de resolución (`"record":
+  "confirmation"`) con el id del evento y el resultado
+- Al reabrir tras una caída, la línea final incompleta del último
+  segmento se trunca antes de seguir escribiendo
+
+Para reproducir y consultar, iter_journal recorre los segmentos con mmap
+y solo decodifica el JSON de las líneas que pasan los filtros; cada
+evento sale con el resultado de su última resolución.
+"""
+
+import json
+import mmap
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl"
+
+# Marca de fin para el hilo escritor
+_STOP = object()
+
+# Tipo de las líneas de resolución de confirmaciones
+CONFIRMATION_RECORD = "confirmation"
+_CONFIRMATION_NEEDLE = json.dumps({"record": CONFIRMATION_RECORD})[1:-1].encode("utf-8")
+
+
+def _segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory: Union[str, Path]) -> list[Path]:
+    """Segmentos del diario en orden de escritura."""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted(directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+
+def event_record(event) -> dict:
+    """Instantánea serializable de un Event."""
+    return {
+        "event_id": event.event_id,
+        "event_time": event.event_time.isoformat(),
+        "event_type": event.event_type,
+        "event_name": event.event_name,
+        "event_description": event.event_description,
+        "requires_confirmation": event.requires_confirmation,
+        "confirmed": event.confirmed,
+        "payload": event.payload,
+    }
+
+
+def confirmation_record(event) -> dict:
+    """Línea de resolución de la confirmación de un evento."""
+    return {
+        "record": CONFIRMATION_RECORD,
+        "event_id": event.event_id,
+        "confirmed": event.confirmed,
+    }
+
+
+class EventJournal:
+    """
+    Sumidero de EventManager que persiste los eventos en disco.
+
+    Uso:
+        journal = EventJournal("events/")
+        EventManager().add_sink(journal)
+        ...
+        journal.close()  # vacía la cola y hace el último fsync
+
+    Tras `close` los eventos que sigan llegando (e.g. registrados después
+    de un cierre en atexit) no se escriben: se cuentan en `dropped`.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        max_batch: int = 1024,
+        flush_interval: float = 0.05,
+        max_queue: int = 100_000,
+        fsync: bool = True,
+    ):
+        """
+        Args:
+            directory: Directorio de los segmentos (se crea si no existe)
+            segment_max_bytes: Tamaño a partir del cual se rota el segmento
+            max_batch: Registros máximos por escritura
+            flush_interval: Espera máxima (s) del escritor por nuevos registros
+            max_queue: Capacidad de la cola; si se llena, registrar un evento
+                espera al escritor (no se descartan eventos)
+            fsync: Si cada lote se sincroniza con el disco
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._file = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._open_segment()
+
+        self._writer = threading.Thread(
+            target=self._run, name="event-journal", daemon=True
+        )
+        self._writer.start()
+
+    ###
+    # Camino crítico
+    ###
+
+    def append(self, event) -> None:
+        """Encola el evento para escribirlo (llamado por EventManager)."""
+        self._enqueue(event_record(event))
+
+    def record_confirmation(self, event) -> None:
+        """Encola la resolución de una confirmación (llamado por EventManager)."""
+        self._enqueue(confirmation_record(event))
+
+    def _enqueue(self, record: dict) -> None:
+        if self._closed:
+            # Cerrado: no se escribe, pero registrar eventos sigue funcionando
+            self.dropped += 1
+            return
+        self._queue.put(record)
+
+    ###
+    # Hilo escritor
+    ###
+
+    def _open_segment(self) -> None:
+        """Continúa el último segmento si tiene espacio; si no, abre uno nuevo."""
+        segments = list_segments(self.directory)
+        if segments:
+            last = segments[-1]
+            self._segment_number = int(last.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            size = _truncate_torn_tail(last)
+            if size < self.segment_max_bytes:
+                self._file = open(last, "ab")
+                self._segment_size = size
+                return
+        self._rotate()
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._segment_number += 1
+        self._file = open(self.directory / _segment_name(self._segment_number), "ab")
+        self._segment_size = 0
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            item = first
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, records: list[dict]) -> None:
+        try:
+            data = b"".join(
+                json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+                for record in records
+            )
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._segment_size += len(data)
+            self.written += len(records)
+            self.batches += 1
+            if self._segment_size >= self.segment_max_bytes:
+                self._rotate()
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Error escribiendo el diario de eventos: {e}")
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Escribe lo pendiente y cierra el segmento actual."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def last_event_id(self) -> int:
+        """
+        Mayor event_id ya escrito (0 si el diario está vacío); EventManager
+        continúa la numeración a partir de él tras un reinicio.
+        """
+        for segment in reversed(list_segments(self.directory)):
+            last = None
+            for line in _iter_lines(segment):
+                if _CONFIRMATION_NEEDLE not in line:
+                    last = line
+            if last is not None:
+                try:
+                    return int(json.loads(last).get("event_id") or 0)
+                except ValueError:
+                    continue
+        return 0
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "segment": self._segment_number,
+        }
+
+
+def _truncate_torn_tail(path: Path) -> int:
+    """
+    Trunca la línea final incompleta de un segmento (escritura
+    interrumpida por una caída), para que lo que se anexe después no se
+    pegue a ella. Devuelve el tamaño resultante.
+    """
+    with open(path, "r+b") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            keep = mapped.rfind(b"\n") + 1
+        if keep < size:
+            print(f"⚠️  Diario de eventos: se descarta una línea incompleta al final de {path.name}")
+            file.truncate(keep)
+        return keep
+
+
+###
+# Lectura
+###
+
+def _iter_lines(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = 0
+            size = len(mapped)
+            while start < size:
+                end = mapped.find(b"\n", start)
+                if end == -1:
+                    # Línea final incompleta (escritura interrumpida)
+                    return
+                yield mapped[start:end]
+                start = end + 1
+
+
+def iter_journal(
+    directory: Union[str, Path],
+    event_type: Optional[str] = None,
+    since_id: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Recorre los eventos del diario en orden de escritura.
+
+    Args:
+        directory: Directorio del diario
+        event_type: Solo eventos de este tipo
+        since_id: Solo eventos con event_id > since_id
+
+    El filtro por tipo descarta líneas comparando bytes antes de
+    decodificar el JSON. Las resoluciones de confirmaciones se leen en
+    una pasada previa (solo las líneas que las contienen) y se aplican a
+    `confirmed` de su evento.
+    """
+    confirmations = _confirmations(directory)
+    needle = None
+    if event_type is not None:
+        needle = json.dumps({"event_type": event_type}, ensure_ascii=False)[1:-1].encode("utf-8")
+    for segment in list_segments(directory):
+        for line in _iter_lines(segment):
+            if needle is not None and needle not in line:
+                continue
+            if _CONFIRMATION_NEEDLE in line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if event_type is not None and record.get("event_type") != event_type:
+                continue
+            if since_id is not None and (record.get("event_id") or 0) <= since_id:
+                continue
+            if record.get("event_id") in confirmations:
+                record["confirmed"] = confirmations[record["event_id"]]
+            yield record
+
+
+def _confirmations(directory: Union[str, Path]) -> dict[int, Optional[bool]]:
+    """Última resolución de cada evento con confirmación (id → confirmed)."""
+    confirmations = {}
+    for segment in list_segments(directory):
+        for line in _iter_lines(segment):
+            if _CONFIRMATION_NEEDLE not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("record") == CONFIRMATION_RECORD:
+                confirmations[record.get("event_id")] = record.get("confirmed")
+    return confirmations
@@ -1,3 +1,9 @@
+import bisect
+import itertools
+import threading
+from typing import Optional
+
+
 class SingletonMeta(type):
     _instances = {}
 
@@ -6,9 +12,226 @@ class SingletonMeta(type):
             cls._instances[cls] = super().__call__(*args, **kwargs)
         return cls._instances[cls]
 
-class EventManager(metaclass=SingletonMeta): 
+
+# Eventos retenidos por defecto antes de descartar los más antiguos
+DEFAULT_MAX_EVENTS = 10_000
+
+
+class _OrderedIndex:
+    """
+    Ids y tiempos en orden de registro, con los descartados antes de
+    `head` (se compacta de vez en cuando). Los descartes siempre son por
+    el principio: el más antiguo del registro lo es también de su tipo.
+    """
+
+    __slots__ = ("ids", "times", "head")
+
     def __init__(self):
+        self.ids = []
+        self.times = []
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.ids) - self.head
+
+    def append(self, event_id: int, event_time) -> None:
+        self.ids.append(event_id)
+        self.times.append(event_time)
+
+    def pop_oldest(self) -> int:
+        event_id = self.ids[self.head]
+        self.head += 1
+        if self.head > 1024 and self.head * 2 > len(self.ids):
+            del self.ids[:self.head]
+            del self.times[:self.head]
+            self.head = 0
+        return event_id
+
+    def slice(self, after_id=None, since=None, until=None, limit: int = 256) -> list:
+        """Ids del rango pedido, con búsqueda binaria."""
+        lo = self.head
+        if after_id is not None:
+            lo = bisect.bisect_right(self.ids, after_id, lo)
+        if since is not None:
+            lo = max(lo, bisect.bisect_left(self.times, since, lo))
+        hi = len(self.ids)
+        if until is not None:
+            hi = bisect.bisect_right(self.times, until, lo)
+        hi = min(hi, lo + limit)
+        return self.ids[lo:hi]
+
+
+class EventManager(metaclass=SingletonMeta):
+    """
+    Registro de eventos en memoria, solo de anexado y acotado.
+
+    - Cada evento recibe un id de secuencia monotónico (`event.event_id`);
+      el orden de los ids es el orden de registro, aunque dos eventos
+      compartan el mismo event_time
+    - `events` (id → evento) conserva como máximo `max_events` eventos;
+      al superarlo se descartan los más antiguos
+    - Índice ordenado (ids, tiempos) global y otro por tipo, para
+      búsquedas binarias por id o rango de tiempo (ver events_after y
+      EventRegister.query); más el índice de confirmaciones pendientes:
+      las consultas no recorren todo el registro
+
+    Los eventos que requieren confirmación permanecen en `pending` hasta
+    resolverse o hasta salir del registro por retención (así `pending`
+    tampoco crece sin límite).
+
+    Los sumideros (`add_sink`, e.g. EventJournal) reciben cada evento en
+    orden de id; su `append` debe ser barato (se llama bajo el lock). Si
+    tienen `record_confirmation(event)`, también reciben cada resolución.
+    """
+
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        if max_events < 1:
+            raise ValueError("max_events debe ser >= 1")
+        self.max_events = max_events
         self.events = {}
+        self.pending = {}
+        self._index = _OrderedIndex()
+        self._by_type: dict[str, _OrderedIndex] = {}
+        self._sequence = itertools.count(1)
+        self._sinks = []
+        # La metaproducción en segundo plano registra eventos desde otros hilos
+        self._lock = threading.Lock()
+
+    @classmethod
+    def isolated(cls, max_events: int = DEFAULT_MAX_EVENTS) -> "EventManager":
+        """
+        Registro independiente del singleton de proceso (e.g. uno por
+        orquestador); `EventManager()` sigue devolviendo el compartido.
+        """
+        instance = cls.__new__(cls)
+        instance.__init__(max_events=max_events)
+        return instance
+
+    def register_event(self, event) -> int:
+        """
+        Añade un evento al registro.
+
+        Returns:
+            Id de secuencia asignado al evento
+        """
+        with self._lock:
+            event_id = next(self._sequence)
+            event.event_id = event_id
+            self.events[event_id] = event
+            # Tiempos no decrecientes aunque dos hilos registren desordenados
+            event_time = event.event_time
+            if self._index.times and event_time < self._index.times[-1]:
+                event_time = self._index.times[-1]
+            self._index.append(event_id, event_time)
+            type_index = self._by_type.get(event.event_type)
+            if type_index is None:
+                type_index = self._by_type[event.event_type] = _OrderedIndex()
+            type_index.append(event_id, event_time)
+            if event.requires_confirmation:
+                self.pending[event_id] = event
+            for sink in self._sinks:
+                sink.append(event)
+            self._trim()
+        return event_id
+
+    def add_sink(self, sink) -> None:
+        """
+        Añade un sumidero de eventos (objeto con `append(event)`).
+
+        Si el sumidero conoce el último id persistido (`last_event_id`),
+        la numeración continúa tras él para que los ids no se repitan
+        entre reinicios.
+        """
+        with self._lock:
+            if hasattr(sink, "last_event_id"):
+                last_id = sink.last_event_id()
+                current = next(self._sequence)
+                self._sequence = itertools.count(max(current, last_id + 1))
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink) -> None:
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def _trim(self) -> None:
+        """Descarta los eventos más antiguos por encima de max_events."""
+        while len(self.events) > self.max_events:
+            event = self.events.pop(self._index.pop_oldest())
+            self.pending.pop(event.event_id, None)
+            same_type = self._by_type[event.event_type]
+            same_type.pop_oldest()
+            if not same_type:
+                del self._by_type[event.event_type]
+
+    def events_after(
+        self,
+        after_id: Optional[int] = None,
+        since=None,
+        until=None,
+        limit: int = 256,
+        event_type: Optional[str] = None,
+    ) -> list:
+        """
+        Hasta `limit` eventos retenidos en orden de id, con búsqueda binaria.
+
+        Args:
+            after_id: Solo ids mayores (cursor de paginación)
+            since: Solo eventos con event_time >= since
+            until: Solo eventos con event_time <= until
+            event_type: Solo eventos de este tipo (usa su índice)
+        """
+        with self._lock:
+            if event_type is None:
+                index = self._index
+            else:
+                index = self._by_type.get(event_type)
+                if index is None:
+                    return []
+            ids = index.slice(after_id=after_id, since=since, until=until, limit=limit)
+            return [self.events[event_id] for event_id in ids]
+
+    def get_event(self, event_id: int):
+        """Evento por id, o None si no existe o ya se descartó."""
+        return self.events.get(event_id)
+
+    def events_by_type(self, event_type) -> list:
+        """Eventos retenidos de un tipo, en orden de registro."""
+        with self._lock:
+            index = self._by_type.get(event_type)
+            if index is None:
+                return []
+            return [self.events[event_id] for event_id in index.ids[index.head:]]
+
+    def pending_confirmations(self) -> list:
+        """Eventos pendientes de confirmación, en orden de registro."""
+        with self._lock:
+            return list(self.pending.values())
+
+    def resolve_confirmation(self, event_id: int, confirmed: bool) -> Optional[object]:
+        """
+        Marca un evento como confirmado o cancelado y lo saca de pendientes.
+
+        Returns:
+            El evento resuelto, o None si no estaba pendiente
+        """
+        with self._lock:
+            event = self.pending.pop(event_id, None)
+            if event is None:
+                return None
+            event.confirmed = confirmed
+            for sink in self._sinks:
+                if hasattr(sink, "record_confirmation"):
+                    sink.record_confirmation(event)
+        return event
+
+    def set_max_events(self, max_events: int) -> None:
+        """Cambia el límite de retención (descarta el exceso de inmediato)."""
+        if max_events < 1:
+            raise ValueError("max_events debe ser >= 1")
+        with self._lock:
+            self.max_events = max_events
+            self._trim()
 
-    def register_event(self, event):
-        self.events[event.event_time] = event
\ No newline at end of file
+    def __len__(self) -> int:
+        return len(self.events)
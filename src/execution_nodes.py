@@ -6,14 +6,126 @@ Implementa los nodos que ejecutan las tareas después del enrutamiento:
 - DIAGNOSTICO_ESTRUCTURAL: Inicia metaproducción (diseño de nuevos agentes)
 """
 
-from typing import Optional, Any
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional, Any
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 
 from orchestrator_state import OrchestratorState, AgentSpec
 from agent_repository import AgentRepository
 from event import Event
+from event_manager import EventManager
+from conversation_memory import ConversationMemory
+from token_budget import MESSAGE_OVERHEAD_TOKENS, TokenBudget
+from cost_accounting import UsageTracker, track_usage
+from deadline import (
+    MIN_INLINE_METAPRODUCTION_MS,
+    Deadline,
+    DeadlineExceeded,
+    acall_with_deadline,
+    call_with_deadline,
+    resolve_deadline,
+)
+
+# Aviso añadido a una respuesta cortada por el plazo de la petición
+DEADLINE_NOTICE = "⏱️ Respuesta interrumpida: se agotó el plazo de la petición (max_latency_ms)."
+
+# Fracción del tiempo restante para la metaproducción en línea; el resto
+# queda para la respuesta provisional
+INLINE_METAPRODUCTION_SHARE = 0.5
+
+
+def _latest_user_task(state: OrchestratorState) -> str:
+    """
+    Texto del último mensaje del usuario.
+    
+    Tras el router, el último mensaje del estado es la nota del router,
+    no la tarea; por eso se busca hacia atrás el último HumanMessage.
+    """
+    for message in reversed(state["messages"]):
+        if isinstance(message, HumanMessage):
+            return message.content
+        if isinstance(message, dict) and message.get("role") == "user":
+            return message.get("content", "")
+    last_message = state["messages"][-1]
+    return last_message.content if hasattr(last_message, 'content') else str(last_message)
+
+
+def _thread_id(config: Optional[RunnableConfig]) -> Optional[str]:
+    """Hilo de la petición (None si se ejecuta sin checkpointing)."""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+
+def _wants_tokens(config: Optional[RunnableConfig]) -> bool:
+    """Indica si el orquestador pidió streaming de tokens para esta ejecución."""
+    if not config:
+        return False
+    return bool(config.get("configurable", {}).get("stream_tokens"))
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Texto de un fragmento de stream (AIMessageChunk de chat o str de LLM)."""
+    content = chunk.content if hasattr(chunk, "content") else chunk
+    return content if isinstance(content, str) else ""
+
+
+def _prompt_inputs(
+    task: str,
+    state: Optional[OrchestratorState],
+    memory: Optional[ConversationMemory],
+    system_prompt: str,
+    token_budget: TokenBudget,
+) -> tuple[dict, int, list[str]]:
+    """
+    Variables de los prompts de agente ajustadas al presupuesto de tokens:
+    la tarea y el historial del hilo (resumen + turnos recientes) si hay
+    memoria conversacional.
+
+    El historial solo ocupa lo que dejan libre el prompt de sistema y la
+    tarea; si ni estos caben, se recorta la tarea.
+
+    Returns:
+        (variables del prompt, tokens del prompt, secciones recortadas)
+    """
+    counter = token_budget.counter
+    overhead = 2 * MESSAGE_OVERHEAD_TOKENS
+    fixed = counter.count(system_prompt) + counter.count(task) + overhead
+    trimmed = []
+    if fixed > token_budget.prompt_budget:
+        texts, trimmed, fixed = token_budget.fit(
+            [("system", system_prompt), ("task", task)],
+            trim_order=["task"],
+            reserved=overhead,
+        )
+        task = texts["task"]
+
+    history = []
+    if memory is not None and state:
+        available = max(0, token_budget.prompt_budget - fixed)
+        if available < memory.history_budget + memory.summary_max_tokens:
+            history = memory.context_messages(state, max_tokens=available)
+            if len(history) < len(memory.context_messages(state)):
+                trimmed.append("history")
+        else:
+            history = memory.context_messages(state)
+
+    prompt_tokens = fixed + counter.count_messages(history)
+    return {"task": task, "history": history}, prompt_tokens, trimmed
+
+
+def _response_text(response: Any) -> str:
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+def _deadline_response(partial: str = "") -> str:
+    """Respuesta parcial (si la hubo) seguida del aviso de plazo agotado."""
+    return f"{partial}\n\n{DEADLINE_NOTICE}" if partial else DEADLINE_NOTICE
 
 
 class DirectExecutionNode:
@@ -31,8 +143,17 @@ class DirectExecutionNode:
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
         llm: Optional[Any] = None,
+        selection_threshold: float = 0.5,
+        memory: Optional[ConversationMemory] = None,
+        token_budget: Optional[TokenBudget] = None,
     ):
         self.agent_repository = agent_repository
+        # Memoria conversacional del hilo (None = solo la tarea actual)
+        self.memory = memory
+        # Presupuesto de tokens del prompt (recorta historial y tarea)
+        self.token_budget = token_budget or TokenBudget()
+        # Similitud mínima para elegir un agente del índice vectorial
+        self.selection_threshold = selection_threshold
         
         # Configurar LLM (inyectable)
         if llm is not None:
@@ -47,17 +168,27 @@ class DirectExecutionNode:
             if api_key:
                 llm_kwargs["api_key"] = api_key
             self.llm = ChatOpenAI(**llm_kwargs)
+        # La respuesta se limita a la reserva del presupuesto (max_tokens)
+        self.llm = self.token_budget.limit_completion(self.llm)
     
-    def execute(self, state: OrchestratorState) -> OrchestratorState:
+    def execute(
+        self,
+        state: OrchestratorState,
+        config: Optional[RunnableConfig] = None,
+    ) -> OrchestratorState:
         """
         Ejecuta la tarea usando un agente apropiado del catálogo.
+        
+        Si la configuración del grafo pide `stream_tokens`, los tokens de
+        la respuesta se reenvían al stream del orquestador según llegan.
+        Si vence el plazo de la petición se devuelve lo generado hasta
+        entonces con un aviso.
         """
         # Obtener el último mensaje del usuario
         if not state.get("messages"):
-            return state
+            return {}
         
-        last_message = state["messages"][-1]
-        user_task = last_message.content if hasattr(last_message, 'content') else str(last_message)
+        user_task = _latest_user_task(state)
         
         # Seleccionar el agente más apropiado
         selected_agent = self._select_agent(user_task, state)
@@ -67,19 +198,63 @@ class DirectExecutionNode:
             selected_agent = self.agent_repository.get_agent("general_assistant")
         
         # Ejecutar la tarea con el agente seleccionado
-        response = self._execute_with_agent(user_task, selected_agent, state)
+        response, usage = self._execute_with_agent(
+            user_task, selected_agent, state,
+            stream_tokens=_wants_tokens(config),
+            deadline=resolve_deadline(config),
+        )
         
         # Actualizar el estado
-        return {
-            **state,
+        return self._execution_update(selected_agent, response, usage)
+
+    async def aexecute(
+        self,
+        state: OrchestratorState,
+        config: Optional[RunnableConfig] = None,
+    ) -> OrchestratorState:
+        """
+        Versión asíncrona de execute (la llamada al LLM no bloquea el loop).
+        """
+        if not state.get("messages"):
+            return {}
+        
+        user_task = _latest_user_task(state)
+        
+        selected_agent = await self._aselect_agent(user_task, state)
+        
+        if not selected_agent:
+            selected_agent = self.agent_repository.get_agent("general_assistant")
+        
+        response, usage = await self._aexecute_with_agent(
+            user_task, selected_agent, state,
+            stream_tokens=_wants_tokens(config),
+            deadline=resolve_deadline(config),
+        )
+        
+        return self._execution_update(selected_agent, response, usage)
+
+    def _execution_update(
+        self,
+        agent: AgentSpec,
+        response: str,
+        usage: Optional[dict] = None,
+    ) -> OrchestratorState:
+        """
+        Actualización parcial del estado con la respuesta del agente (solo
+        el mensaje nuevo; add_messages lo añade al historial).
+        """
+        update = {
             "route": "END",
-            "messages": state["messages"] + [
+            "messages": [
                 {
                     "role": "assistant",
-                    "content": f"[Agente: {selected_agent.agent_id}]\n\n{response}"
+                    "content": f"[Agente: {agent.agent_id}]\n\n{response}"
                 }
             ]
         }
+        if usage is not None:
+            update["token_usage"] = [usage]
+        return update
     
     def _select_agent(
         self, 
@@ -89,10 +264,52 @@ class DirectExecutionNode:
         """
         Selecciona el agente más apropiado para la tarea.
         
-        En una implementación más sofisticada, esto podría usar
-        embeddings o clasificación para matching semántico.
+        Si el repositorio mantiene un índice de embeddings, se elige el
+        agente activo más similar (rol, capacidades y prompt) siempre que
+        supere `selection_threshold`; si no, se usa el mapa de keywords.
+        El embedding de la tarea es el que ya calculó el router
+        (`task_embedding`), si lo hay.
+        """
+        if self.agent_repository.has_vector_index:
+            try:
+                return self._pick_match(
+                    self.agent_repository.search_agents(task, k=1, vector=state.get("task_embedding"))
+                )
+            except Exception as e:
+                print(f"⚠️  Selección semántica no disponible: {e}")
+        
+        return self._select_agent_by_keywords(task)
+
+    async def _aselect_agent(
+        self, 
+        task: str, 
+        state: OrchestratorState
+    ) -> Optional[AgentSpec]:
+        """
+        Versión asíncrona de _select_agent (el embedding no bloquea el loop).
+        """
+        if self.agent_repository.has_vector_index:
+            try:
+                return self._pick_match(
+                    await self.agent_repository.asearch_agents(task, k=1, vector=state.get("task_embedding"))
+                )
+            except Exception as e:
+                print(f"⚠️  Selección semántica no disponible: {e}")
+        
+        return self._select_agent_by_keywords(task)
+
+    def _pick_match(self, matches: list[tuple[AgentSpec, float]]) -> Optional[AgentSpec]:
+        """
+        Primer agente del top-k si supera el umbral; si no, el asistente general.
+        """
+        if matches and matches[0][1] >= self.selection_threshold:
+            return matches[0][0]
+        return self.agent_repository.get_agent("general_assistant")
+
+    def _select_agent_by_keywords(self, task: str) -> Optional[AgentSpec]:
+        """
+        Selección simple basada en keywords (sin índice vectorial).
         """
-        # Por ahora, usar lógica simple basada en keywords
         task_lower = task.lower()
         
         # Mapeo de keywords a agentes
@@ -119,23 +336,111 @@ class DirectExecutionNode:
         self, 
         task: str, 
         agent: AgentSpec,
-        state: OrchestratorState
-    ) -> str:
+        state: OrchestratorState,
+        stream_tokens: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[str, dict]:
         """
         Ejecuta la tarea usando el prompt de sistema del agente.
+        
+        Con `stream_tokens` la respuesta se obtiene con `chain.stream` y
+        cada fragmento se publica con el stream writer de LangGraph.
+        
+        Args:
+            deadline: Plazo de la petición; la llamada no se espera más allá
+        
+        Returns:
+            (respuesta, registro de tokens de la llamada)
+        """
+        chain = self._agent_prompt(agent) | self.llm
+        inputs, prompt_tokens, trimmed = _prompt_inputs(
+            task, state, self.memory, agent.system_prompt, self.token_budget
+        )
+        parts = []
+        
+        def stream() -> str:
+            writer = get_stream_writer()
+            for chunk in chain.stream(inputs):
+                text = _chunk_text(chunk)
+                if text:
+                    writer({"type": "token", "agent_id": agent.agent_id, "content": text})
+                    parts.append(text)
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded("Plazo de la petición agotado")
+            return "".join(parts)
+        
+        def record(completion: Any, error: bool = False) -> dict:
+            return tracker.apply(self.token_budget.usage(
+                "direct_execution", prompt_tokens, completion, trimmed, error=error, agent_id=agent.agent_id
+            ))
+        
+        with track_usage() as tracker:
+            try:
+                if stream_tokens:
+                    response = call_with_deadline(deadline, stream)
+                else:
+                    response = _response_text(call_with_deadline(deadline, chain.invoke, inputs))
+            except DeadlineExceeded:
+                partial = "".join(parts)
+                return _deadline_response(partial), record(partial, error=True)
+            except Exception as e:
+                return f"Error al ejecutar tarea: {str(e)}", record(0, error=True)
+            return response, record(response)
+
+    async def _aexecute_with_agent(
+        self, 
+        task: str, 
+        agent: AgentSpec,
+        state: OrchestratorState,
+        stream_tokens: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[str, dict]:
+        """
+        Versión asíncrona de _execute_with_agent (al vencer el plazo se
+        cancela la llamada).
+        """
+        chain = self._agent_prompt(agent) | self.llm
+        inputs, prompt_tokens, trimmed = _prompt_inputs(
+            task, state, self.memory, agent.system_prompt, self.token_budget
+        )
+        parts = []
+        
+        async def astream() -> str:
+            writer = get_stream_writer()
+            async for chunk in chain.astream(inputs):
+                text = _chunk_text(chunk)
+                if text:
+                    writer({"type": "token", "agent_id": agent.agent_id, "content": text})
+                    parts.append(text)
+            return "".join(parts)
+        
+        def record(completion: Any, error: bool = False) -> dict:
+            return tracker.apply(self.token_budget.usage(
+                "direct_execution", prompt_tokens, completion, trimmed, error=error, agent_id=agent.agent_id
+            ))
+        
+        with track_usage() as tracker:
+            try:
+                if stream_tokens:
+                    response = await acall_with_deadline(deadline, astream())
+                else:
+                    response = _response_text(await acall_with_deadline(deadline, chain.ainvoke(inputs)))
+            except DeadlineExceeded:
+                partial = "".join(parts)
+                return _deadline_response(partial), record(partial, error=True)
+            except Exception as e:
+                return f"Error al ejecutar tarea: {str(e)}", record(0, error=True)
+            return response, record(response)
+
+    def _agent_prompt(self, agent: AgentSpec) -> ChatPromptTemplate:
+        """
+        Prompt de sistema del agente, historial del hilo y tarea del usuario.
         """
-        prompt = ChatPromptTemplate.from_messages([
+        return ChatPromptTemplate.from_messages([
             ("system", agent.system_prompt),
+            MessagesPlaceholder("history", optional=True),
             ("human", "{task}")
         ])
-        
-        chain = prompt | self.llm
-        
-        try:
-            response = chain.invoke({"task": task})
-            return response.content if hasattr(response, 'content') else str(response)
-        except Exception as e:
-            return f"Error al ejecutar tarea: {str(e)}"
 
 
 class StructuralDiagnosisNode:
@@ -144,6 +449,13 @@ class StructuralDiagnosisNode:
     
     Cuando una tarea requiere capacidades no disponibles, este nodo
     genera propuestas para crear o modificar agentes (metaproducción).
+    
+    Por defecto la metaproducción (análisis de brecha + diseño del agente)
+    corre en segundo plano: el nodo devuelve en cuanto tiene la respuesta
+    provisional y la propuesta se registra como Event al terminar (con el
+    análisis de brecha, la especificación propuesta y los tokens gastados
+    en `event.payload`). Usar wait_for_metaproduction /
+    adrain_metaproduction para esperarla.
     """
     
     def __init__(
@@ -153,8 +465,43 @@ class StructuralDiagnosisNode:
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
         llm: Optional[Any] = None,
+        background_metaproduction: bool = True,
+        max_background_workers: int = 2,
+        memory: Optional[ConversationMemory] = None,
+        event_manager: Optional[EventManager] = None,
+        token_budget: Optional[TokenBudget] = None,
+        on_background_usage: Optional[Callable[[Optional[str], list[dict]], None]] = None,
     ):
+        """
+        Args:
+            background_metaproduction: Si la propuesta de agente se genera
+                fuera del camino crítico (False = secuencial, el diagnóstico
+                completo se incluye en la respuesta)
+            max_background_workers: Hilos para la metaproducción en segundo
+                plano de la ruta síncrona
+            memory: Memoria conversacional para la respuesta provisional
+            event_manager: Registro donde se emiten las propuestas (por
+                defecto el EventManager compartido del proceso)
+            token_budget: Presupuesto de tokens de los prompts (recorta
+                catálogo, análisis de brecha, historial y tarea)
+            on_background_usage: Se llama con (thread_id, registros de
+                tokens) al terminar una metaproducción en segundo plano,
+                cuya petición ya no puede incluirlos en `token_usage`
+                (el orquestador los suma a `thread_cost`)
+        """
         self.agent_repository = agent_repository
+        self.on_background_usage = on_background_usage
+        self.memory = memory
+        self.event_manager = event_manager
+        self.token_budget = token_budget or TokenBudget()
+        self.background_metaproduction = background_metaproduction
+        self.max_background_workers = max_background_workers
+        
+        # Metaproducción en curso: futures (ruta síncrona) y tasks (asíncrona)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: set[Future] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
         
         # Configurar LLM (inyectable)
         if llm is not None:
@@ -169,6 +516,8 @@ class StructuralDiagnosisNode:
             if api_key:
                 llm_kwargs["api_key"] = api_key
             self.llm = ChatOpenAI(**llm_kwargs)
+        # La respuesta se limita a la reserva del presupuesto (max_tokens)
+        self.llm = self.token_budget.limit_completion(self.llm)
         
         # LLM con salida estructurada para diseño de agentes (opcional)
         self.structured_llm = None
@@ -178,7 +527,7 @@ class StructuralDiagnosisNode:
             except Exception:
                 self.structured_llm = None
     
-    def diagnose(self, state: OrchestratorState) -> OrchestratorState:
+    def diagnose(self, state: OrchestratorState, config: Optional[RunnableConfig] = None) -> OrchestratorState:
         """
         Diagnostica la necesidad estructural y propone un nuevo agente.
         
@@ -186,28 +535,252 @@ class StructuralDiagnosisNode:
         1. Analizar la brecha de capacidades
         2. Diseñar una especificación de agente
         3. (En implementación completa: evaluar, ensayar, asimilar)
+        
+        Con background_metaproduction los pasos 1-2 se lanzan en un hilo
+        y el usuario solo espera la respuesta provisional. Sin ella, se
+        pasan igualmente a segundo plano si el plazo de la petición no
+        deja tiempo para hacerlos en línea.
         """
         # Obtener la tarea del usuario
         if not state.get("messages"):
-            return state
+            return {}
         
-        last_message = state["messages"][-1]
-        user_task = last_message.content if hasattr(last_message, 'content') else str(last_message)
+        user_task = _latest_user_task(state)
+        general_agent = self.agent_repository.get_agent("general_assistant")
+
+        deadline = resolve_deadline(config)
+
+        if not self._inline_metaproduction(deadline):
+            self._submit_metaproduction(user_task, state, _thread_id(config))
+            provisional_response, usage = self._execute_provisional(user_task, general_agent, state, deadline)
+            return self._provisional_update(provisional_response, [usage] if usage else None)
         
-        # Analizar brecha de capacidades
-        gap_analysis = self._analyze_capability_gap(user_task, state)
+        usage = []
+        agent_proposal, gap_analysis = self._run_metaproduction(
+            user_task, state, usage, deadline.share(INLINE_METAPRODUCTION_SHARE) if deadline else None
+        )
+        provisional_response, provisional_usage = self._execute_provisional(user_task, general_agent, state, deadline)
+        if provisional_usage:
+            usage.append(provisional_usage)
+        
+        # Actualizar estado
+        return self._diagnosis_update(gap_analysis, agent_proposal, provisional_response, usage)
+
+    async def adiagnose(self, state: OrchestratorState, config: Optional[RunnableConfig] = None) -> OrchestratorState:
+        """
+        Versión asíncrona de diagnose (las llamadas al LLM no bloquean el loop).
+        
+        La metaproducción se lanza como asyncio.Task concurrente con la
+        respuesta provisional; el loop debe seguir vivo hasta que termine
+        (ver adrain_metaproduction).
+        """
+        if not state.get("messages"):
+            return {}
+        
+        user_task = _latest_user_task(state)
+        general_agent = self.agent_repository.get_agent("general_assistant")
+
+        deadline = resolve_deadline(config)
+
+        if not self._inline_metaproduction(deadline):
+            task = asyncio.create_task(
+                self._arun_background_metaproduction(user_task, state, _thread_id(config))
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            provisional_response, usage = await self._aexecute_provisional(user_task, general_agent, state, deadline)
+            return self._provisional_update(provisional_response, [usage] if usage else None)
+        
+        usage = []
+        agent_proposal, gap_analysis = await self._arun_metaproduction(
+            user_task, state, usage, deadline.share(INLINE_METAPRODUCTION_SHARE) if deadline else None
+        )
+        provisional_response, provisional_usage = await self._aexecute_provisional(user_task, general_agent, state, deadline)
+        if provisional_usage:
+            usage.append(provisional_usage)
         
-        # Generar propuesta de nuevo agente
-        agent_proposal = self._design_new_agent(user_task, gap_analysis)
+        return self._diagnosis_update(gap_analysis, agent_proposal, provisional_response, usage)
 
-        # Crear un evento que requiere confirmación
+    def _inline_metaproduction(self, deadline: Optional[Deadline]) -> bool:
+        """Si la metaproducción se hace en línea en esta petición."""
+        if self.background_metaproduction:
+            return False
+        return deadline is None or deadline.allows(MIN_INLINE_METAPRODUCTION_MS)
+
+    def _run_metaproduction(
+        self,
+        task: str,
+        state: OrchestratorState,
+        usage: Optional[list[dict]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[dict, str]:
+        """
+        Análisis de brecha, diseño del agente y registro del evento de propuesta.
+        
+        Args:
+            usage: Lista donde añadir los registros de tokens de las llamadas
+            deadline: Plazo de las llamadas (None en segundo plano)
+        
+        Returns:
+            (propuesta de agente, análisis de brecha)
+        """
+        gap_analysis = self._analyze_capability_gap(task, state, usage, deadline)
+        agent_proposal = self._design_new_agent(task, gap_analysis, usage, deadline)
+        self._register_proposal_event(agent_proposal, gap_analysis, usage)
+        return agent_proposal, gap_analysis
+
+    async def _arun_metaproduction(
+        self,
+        task: str,
+        state: OrchestratorState,
+        usage: Optional[list[dict]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[dict, str]:
+        """
+        Versión asíncrona de _run_metaproduction.
+        """
+        gap_analysis = await self._aanalyze_capability_gap(task, state, usage, deadline)
+        agent_proposal = await self._adesign_new_agent(task, gap_analysis, usage, deadline)
+        self._register_proposal_event(agent_proposal, gap_analysis, usage)
+        return agent_proposal, gap_analysis
+
+    def _run_background_metaproduction(self, task: str, state: OrchestratorState, thread_id: Optional[str]) -> None:
+        """
+        Metaproducción fuera de la petición: sus tokens se cargan al hilo al terminar.
+        """
+        usage = []
+        try:
+            self._run_metaproduction(task, state, usage)
+        finally:
+            self._charge_background_usage(thread_id, usage)
+
+    async def _arun_background_metaproduction(
+        self, task: str, state: OrchestratorState, thread_id: Optional[str]
+    ) -> None:
+        """
+        Versión asíncrona de _run_background_metaproduction.
+        """
+        usage = []
+        try:
+            await self._arun_metaproduction(task, state, usage)
+        finally:
+            self._charge_background_usage(thread_id, usage)
+
+    def _charge_background_usage(self, thread_id: Optional[str], usage: list[dict]) -> None:
+        if not usage or self.on_background_usage is None:
+            return
+        try:
+            self.on_background_usage(thread_id, usage)
+        except Exception as e:
+            print(f"⚠️  No se pudo cargar el coste de la metaproducción: {e}")
+
+    def _submit_metaproduction(self, task: str, state: OrchestratorState, thread_id: Optional[str] = None) -> None:
+        """
+        Lanza la metaproducción en el pool de hilos del nodo.
+        """
+        # Copia superficial: el grafo puede seguir modificando el estado
+        snapshot = {"agent_catalog": state.get("agent_catalog", [])}
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_background_workers,
+                    thread_name_prefix="metaproduction",
+                )
+            # Con el contexto de la petición, como la tarea de la ruta
+            # asíncrona: sus llamadas heredan los callbacks (métricas)
+            future = self._executor.submit(
+                contextvars.copy_context().run,
+                self._run_background_metaproduction, task, snapshot, thread_id,
+            )
+            self._futures.add(future)
+        future.add_done_callback(self._metaproduction_done)
+
+    def _metaproduction_done(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+        error = future.exception()
+        if error is not None:
+            print(f"⚠️  Error en metaproducción en segundo plano: {error}")
+
+    @property
+    def pending_metaproduction(self) -> int:
+        """Propuestas de agente todavía en curso."""
+        with self._lock:
+            return len(self._futures) + len(self._tasks)
+
+    def wait_for_metaproduction(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que terminen las propuestas lanzadas desde la ruta síncrona.
+        
+        Returns:
+            True si no queda ninguna pendiente
+        """
+        with self._lock:
+            futures = list(self._futures)
+        if futures:
+            wait(futures, timeout=timeout)
+        with self._lock:
+            return not self._futures
+
+    async def adrain_metaproduction(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que terminen las propuestas lanzadas desde la ruta asíncrona
+        (y, sin bloquear el loop, las de la ruta síncrona).
+        
+        Returns:
+            True si no queda ninguna pendiente
+        """
+        tasks = list(self._tasks)
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        await asyncio.to_thread(self.wait_for_metaproduction, timeout)
+        return self.pending_metaproduction == 0
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Libera el pool de hilos de metaproducción.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _register_proposal_event(
+        self,
+        agent_proposal: dict,
+        gap_analysis: str,
+        usage: Optional[list[dict]] = None,
+    ) -> None:
+        """
+        Registra la propuesta de nuevo agente como evento pendiente de confirmación.
+        
+        El payload conserva lo que la respuesta provisional no muestra en
+        segundo plano: el análisis de brecha, la especificación propuesta
+        (para asimilarla al confirmar) y los tokens de la metaproducción.
+        """
         Event(
             event_type="new_agent_proposal",
             event_name=f"New agent proposal: {agent_proposal.get('agent_id', 'N/A')}",
             event_description=f"A new agent with role '{agent_proposal.get('role', 'N/A')}' has been proposed.",
-            requires_confirmation=True
+            requires_confirmation=True,
+            event_manager=self.event_manager,
+            payload={
+                "agent_proposal": agent_proposal,
+                "gap_analysis": gap_analysis,
+                "token_usage": list(usage or []),
+            },
         )
 
+    def _diagnosis_update(
+        self,
+        gap_analysis: str,
+        agent_proposal: dict,
+        provisional_response: str,
+        usage: Optional[list[dict]] = None,
+    ) -> OrchestratorState:
+        """
+        Construye la actualización de estado con el diagnóstico y la respuesta provisional.
+        """
         # En una implementación completa, aquí iríamos a:
         # - Ensayo en sandbox
         # - Evaluación A/B
@@ -234,56 +807,190 @@ Para implementar este agente, se requiere:
 
 Por ahora, proporciono una respuesta provisional con el asistente general."""
         
-        # Respuesta provisional usando agente general
-        general_agent = self.agent_repository.get_agent("general_assistant")
-        provisional_response = self._execute_provisional(user_task, general_agent)
-        
-        # Actualizar estado
-        return {
-            **state,
+        update = {
             "route": "END",
-            "messages": state["messages"] + [
+            "messages": [
                 {
                     "role": "assistant",
                     "content": f"{proposal_text}\n\n---\n\n**Respuesta Provisional:**\n{provisional_response}"
                 }
             ]
         }
+        if usage:
+            update["token_usage"] = usage
+        return update
+    
+    def _provisional_update(
+        self,
+        provisional_response: str,
+        usage: Optional[list[dict]] = None,
+    ) -> OrchestratorState:
+        """
+        Actualización de estado cuando la propuesta sigue en segundo plano.
+        """
+        notice = """## Diagnóstico Estructural
+
+La tarea requiere capacidades que el catálogo actual no cubre. El análisis de brecha y la propuesta de nuevo agente se están generando en segundo plano y se registrarán como evento pendiente de confirmación.
+
+Por ahora, proporciono una respuesta provisional con el asistente general."""
+        
+        update = {
+            "route": "END",
+            "messages": [
+                {
+                    "role": "assistant",
+                    "content": f"{notice}\n\n---\n\n**Respuesta Provisional:**\n{provisional_response}"
+                }
+            ]
+        }
+        if usage:
+            update["token_usage"] = usage
+        return update
     
     def _analyze_capability_gap(
         self, 
         task: str, 
-        state: OrchestratorState
+        state: OrchestratorState,
+        usage: Optional[list[dict]] = None,
+        deadline: Optional[Deadline] = None,
     ) -> str:
         """
         Analiza la brecha entre capacidades requeridas y disponibles.
         """
+        prompt, prompt_tokens, trimmed = self._gap_prompt(task, state)
+        
+        try:
+            with track_usage() as tracker:
+                response = call_with_deadline(deadline, self.llm.invoke, [{"role": "user", "content": prompt}])
+            content = _response_text(response)
+        except Exception as e:
+            return f"No se pudo analizar brecha de capacidades: {str(e)}"
+        self._record_usage(usage, "capability_gap", prompt_tokens, content, trimmed, tracker)
+        return content
+
+    async def _aanalyze_capability_gap(
+        self, 
+        task: str, 
+        state: OrchestratorState,
+        usage: Optional[list[dict]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        """
+        Versión asíncrona de _analyze_capability_gap.
+        """
+        prompt, prompt_tokens, trimmed = self._gap_prompt(task, state)
+        
+        try:
+            with track_usage() as tracker:
+                response = await acall_with_deadline(deadline, self.llm.ainvoke([{"role": "user", "content": prompt}]))
+            content = _response_text(response)
+        except Exception as e:
+            return f"No se pudo analizar brecha de capacidades: {str(e)}"
+        self._record_usage(usage, "capability_gap", prompt_tokens, content, trimmed, tracker)
+        return content
+
+    def _record_usage(
+        self,
+        usage: Optional[list[dict]],
+        node: str,
+        prompt_tokens: int,
+        completion: str,
+        trimmed: list[str],
+        tracker: UsageTracker,
+    ) -> None:
+        if usage is not None:
+            usage.append(tracker.apply(self.token_budget.usage(node, prompt_tokens, completion, trimmed)))
+
+    def _fit_prompt(self, template: str, sections: dict, trim_order: list[str]) -> tuple[str, int, list[str]]:
+        """
+        Formatea `template` con las secciones recortadas al presupuesto.
+        
+        Returns:
+            (prompt, tokens del prompt, secciones recortadas)
+        """
+        texts, trimmed, prompt_tokens = self.token_budget.fit(
+            [("template", template), *sections.items()],
+            trim_order=trim_order,
+            reserved=MESSAGE_OVERHEAD_TOKENS,
+        )
+        texts.pop("template")
+        return template.format(**texts), prompt_tokens, trimmed
+
+    def _gap_prompt(self, task: str, state: OrchestratorState) -> tuple[str, int, list[str]]:
+        """
+        Prompt para el análisis de brecha de capacidades (el catálogo es lo
+        primero que se recorta si no cabe en el presupuesto).
+        """
         catalog = state.get("agent_catalog", [])
         
-        prompt = f"""Analiza la siguiente tarea e identifica las capacidades requeridas que NO están disponibles en el catálogo actual.
+        template = """Analiza la siguiente tarea e identifica las capacidades requeridas que NO están disponibles en el catálogo actual.
 
 **Tarea del Usuario:**
 {task}
 
 **Catálogo Actual:**
-{self._format_catalog(catalog)}
+{catalog}
 
 Identifica:
 1. Capacidades requeridas por la tarea
 2. Capacidades faltantes en el catálogo
 3. Justificación de por qué se necesita un nuevo agente"""
+        return self._fit_prompt(
+            template,
+            {"task": task, "catalog": self._format_catalog(catalog)},
+            trim_order=["catalog", "task"],
+        )
+    
+    def _design_new_agent(
+        self,
+        task: str,
+        gap_analysis: str,
+        usage: Optional[list[dict]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> dict:
+        """
+        Diseña la especificación de un nuevo agente basado en la brecha identificada.
+        """
+        prompt, prompt_tokens, trimmed = self._design_prompt(task, gap_analysis)
         
         try:
-            response = self.llm.invoke([{"role": "user", "content": prompt}])
-            return response.content if hasattr(response, 'content') else str(response)
+            # Intentar obtener salida estructurada
+            # Nota: Dependiendo del modelo, esto puede requerir ajustes
+            with track_usage() as tracker:
+                response = call_with_deadline(deadline, self.llm.invoke, [{"role": "user", "content": prompt}])
+            content = _response_text(response)
         except Exception as e:
-            return f"No se pudo analizar brecha de capacidades: {str(e)}"
-    
-    def _design_new_agent(self, task: str, gap_analysis: str) -> dict:
+            return self._error_proposal(e)
+        self._record_usage(usage, "agent_design", prompt_tokens, content, trimmed, tracker)
+        return self._proposal_from_design(task, content)
+
+    async def _adesign_new_agent(
+        self,
+        task: str,
+        gap_analysis: str,
+        usage: Optional[list[dict]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> dict:
         """
-        Diseña la especificación de un nuevo agente basado en la brecha identificada.
+        Versión asíncrona de _design_new_agent.
+        """
+        prompt, prompt_tokens, trimmed = self._design_prompt(task, gap_analysis)
+        
+        try:
+            with track_usage() as tracker:
+                response = await acall_with_deadline(deadline, self.llm.ainvoke([{"role": "user", "content": prompt}]))
+            content = _response_text(response)
+        except Exception as e:
+            return self._error_proposal(e)
+        self._record_usage(usage, "agent_design", prompt_tokens, content, trimmed, tracker)
+        return self._proposal_from_design(task, content)
+
+    def _design_prompt(self, task: str, gap_analysis: str) -> tuple[str, int, list[str]]:
+        """
+        Prompt para el diseño de la especificación del nuevo agente (el
+        análisis de brecha es lo primero que se recorta).
         """
-        prompt = f"""Diseña un nuevo agente especializado basado en el análisis de brecha.
+        template = """Diseña un nuevo agente especializado basado en el análisis de brecha.
 
 **Análisis de Brecha:**
 {gap_analysis}
@@ -297,29 +1004,36 @@ Proporciona una especificación de agente con:
 - capabilities: Lista de capacidades específicas
 - tools: Lista de herramientas necesarias
 - system_prompt: Prompt de sistema detallado para el agente"""
-        
-        try:
-            # Intentar obtener salida estructurada
-            # Nota: Dependiendo del modelo, esto puede requerir ajustes
-            response = self.llm.invoke([{"role": "user", "content": prompt}])
-            content = response.content if hasattr(response, 'content') else str(response)
-            
-            # Parseo básico (en producción, usar structured output)
-            return {
-                "agent_id": "specialized_agent_" + str(hash(task))[:8],
-                "role": "Agente especializado",
-                "capabilities": ["capability_1", "capability_2"],
-                "tools": ["tool_1", "tool_2"],
-                "system_prompt": content[:500]  # Truncar para ejemplo
-            }
-        except Exception as e:
-            return {
-                "agent_id": "error_agent",
-                "role": "Error en diseño",
-                "capabilities": [],
-                "tools": [],
-                "system_prompt": f"Error: {str(e)}"
-            }
+        return self._fit_prompt(
+            template,
+            {"gap_analysis": gap_analysis, "task": task},
+            trim_order=["gap_analysis", "task"],
+        )
+
+    def _proposal_from_design(self, task: str, content: str) -> dict:
+        """
+        Convierte la respuesta de diseño del LLM en una propuesta de agente.
+        """
+        # Parseo básico (en producción, usar structured output)
+        return {
+            "agent_id": "specialized_agent_" + str(hash(task))[:8],
+            "role": "Agente especializado",
+            "capabilities": ["capability_1", "capability_2"],
+            "tools": ["tool_1", "tool_2"],
+            "system_prompt": content[:500]  # Truncar para ejemplo
+        }
+
+    def _error_proposal(self, error: Exception) -> dict:
+        """
+        Propuesta de reemplazo cuando el diseño del agente falla.
+        """
+        return {
+            "agent_id": "error_agent",
+            "role": "Error en diseño",
+            "capabilities": [],
+            "tools": [],
+            "system_prompt": f"Error: {str(error)}"
+        }
     
     def _format_catalog(self, catalog: list[dict]) -> str:
         """Formatea el catálogo para el prompt."""
@@ -333,20 +1047,84 @@ Proporciona una especificación de agente con:
             )
         return "\n".join(lines)
     
-    def _execute_provisional(self, task: str, agent: Optional[AgentSpec]) -> str:
+    def _execute_provisional(
+        self,
+        task: str,
+        agent: Optional[AgentSpec],
+        state: Optional[OrchestratorState] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[str, Optional[dict]]:
         """
         Ejecuta una respuesta provisional mientras se diseña el agente especializado.
+        
+        Returns:
+            (respuesta, registro de tokens o None si no hubo llamada)
         """
         if not agent:
-            return "No hay agente disponible para respuesta provisional."
+            return "No hay agente disponible para respuesta provisional.", None
+        
+        inputs, prompt_tokens, trimmed = _prompt_inputs(
+            task, state, self.memory, self._provisional_system_prompt(agent), self.token_budget
+        )
+        
+        def record(completion: Any, error: bool = False) -> dict:
+            return tracker.apply(self.token_budget.usage(
+                "provisional", prompt_tokens, completion, trimmed, error=error, agent_id=agent.agent_id
+            ))
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", agent.system_prompt + "\n\nNOTA: Esta es una respuesta provisional mientras se diseña un agente especializado."),
+        with track_usage() as tracker:
+            try:
+                response = _response_text(
+                    call_with_deadline(deadline, (self._provisional_prompt(agent) | self.llm).invoke, inputs)
+                )
+            except DeadlineExceeded:
+                return _deadline_response(), record(0, error=True)
+            except Exception as e:
+                return f"Error en respuesta provisional: {str(e)}", record(0, error=True)
+            return response, record(response)
+
+    async def _aexecute_provisional(
+        self,
+        task: str,
+        agent: Optional[AgentSpec],
+        state: Optional[OrchestratorState] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[str, Optional[dict]]:
+        """
+        Versión asíncrona de _execute_provisional.
+        """
+        if not agent:
+            return "No hay agente disponible para respuesta provisional.", None
+        
+        inputs, prompt_tokens, trimmed = _prompt_inputs(
+            task, state, self.memory, self._provisional_system_prompt(agent), self.token_budget
+        )
+        
+        def record(completion: Any, error: bool = False) -> dict:
+            return tracker.apply(self.token_budget.usage(
+                "provisional", prompt_tokens, completion, trimmed, error=error, agent_id=agent.agent_id
+            ))
+        
+        with track_usage() as tracker:
+            try:
+                response = _response_text(
+                    await acall_with_deadline(deadline, (self._provisional_prompt(agent) | self.llm).ainvoke(inputs))
+                )
+            except DeadlineExceeded:
+                return _deadline_response(), record(0, error=True)
+            except Exception as e:
+                return f"Error en respuesta provisional: {str(e)}", record(0, error=True)
+            return response, record(response)
+
+    def _provisional_system_prompt(self, agent: AgentSpec) -> str:
+        return agent.system_prompt + "\n\nNOTA: Esta es una respuesta provisional mientras se diseña un agente especializado."
+
+    def _provisional_prompt(self, agent: AgentSpec) -> ChatPromptTemplate:
+        """
+        Prompt del agente general marcado como respuesta provisional.
+        """
+        return ChatPromptTemplate.from_messages([
+            ("system", self._provisional_system_prompt(agent)),
+            MessagesPlaceholder("history", optional=True),
             ("human", "{task}")
         ])
-        
-        try:
-            response = (prompt | self.llm).invoke({"task": task})
-            return response.content if hasattr(response, 'content') else str(response)
-        except Exception as e:
-            return f"Error en respuesta provisional: {str(e)}"
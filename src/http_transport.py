@@ -0,0 +1,343 @@
+"""
+Transporte HTTP compartido para los clientes de Cloudflare Workers AI.
+
+Mantiene un pool de conexiones keep-alive (opcionalmente HTTP/2) para que
+las llamadas sucesivas del router, la ejecución y el diagnóstico reutilicen
+la misma conexión TLS en lugar de abrir una nueva por petición. Incluye
+reintentos con backoff exponencial con jitter ante respuestas 429/5xx.
+
+Expone variantes síncronas y asíncronas (sobre `httpx.AsyncClient`) para
+que los nodos asíncronos del grafo nunca bloqueen el event loop, así como
+lectores de Server-Sent Events para el modo streaming de Workers AI.
+
+Con un plazo de petición activo (ver deadline.py) el timeout de cada
+intento se acota al tiempo restante y no se reintenta si la espera del
+backoff no cabe en el plazo.
+"""
+
+import asyncio
+import json
+import random
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+from deadline import current_deadline, request_timeout
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Política de reintentos con backoff exponencial y jitter completo.
+    """
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    retry_statuses: frozenset = field(
+        default_factory=lambda: frozenset({429, 500, 502, 503, 504})
+    )
+
+    def compute_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Calcula la espera antes del reintento `attempt` (empezando en 0).
+
+        Respeta la cabecera Retry-After cuando el proveedor la envía.
+        """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+
+def parse_sse_line(line: str) -> Optional[Any]:
+    """
+    Decodifica una línea `data:` de un stream SSE.
+
+    Returns:
+        El JSON decodificado, la cadena "[DONE]" al final del stream,
+        o None para líneas que no transportan datos (event:, comentarios...)
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if not data:
+        return None
+    if data == "[DONE]":
+        return data
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        return None
+
+
+class HTTPTransport:
+    """
+    Cliente HTTP con pool de conexiones propiedad de un cliente LLM.
+
+    El cliente subyacente se crea de forma perezosa y se reutiliza en
+    todas las llamadas, de modo que el coste del handshake TCP+TLS se
+    paga una sola vez por conexión del pool.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        pool_maxsize: int = 10,
+        http2: bool = False,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        """
+        Args:
+            timeout: Timeout por petición en segundos
+            pool_maxsize: Conexiones máximas mantenidas en el pool
+            http2: Si se negocia HTTP/2 (requiere el paquete opcional `h2`)
+            retry_policy: Política de reintentos ante 429/5xx
+        """
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.http2 = http2
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._client: Optional[httpx.Client] = None
+        # Un cliente asíncrono por event loop (sus conexiones quedan ligadas
+        # al loop que las abrió); se libera al desaparecer el loop
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        """Argumentos comunes para construir clientes httpx."""
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️  HTTP/2 no disponible (instala 'h2'); usando HTTP/1.1")
+                http2 = False
+
+        return {
+            "timeout": self.timeout,
+            "http2": http2,
+            "limits": httpx.Limits(
+                max_connections=self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            ),
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        """Cliente síncrono compartido (creado bajo demanda)."""
+        if self._client is None:
+            self._client = httpx.Client(**self._client_kwargs())
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        """
+        Cliente asíncrono del event loop en curso (creado bajo demanda).
+
+        Las conexiones quedan ligadas al loop que las abrió, así que cada
+        loop (e.g. cada `asyncio.run`) obtiene su propio cliente.
+        """
+        loop = asyncio.get_running_loop()
+        aclient = self._aclients.get(loop)
+        if aclient is None:
+            aclient = httpx.AsyncClient(**self._client_kwargs())
+            self._aclients[loop] = aclient
+        return aclient
+
+    def _should_retry(self, response: httpx.Response) -> bool:
+        return response.status_code in self.retry_policy.retry_statuses
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Espera antes del reintento `attempt`, o None si no hay que reintentar
+        (reintentos agotados o la espera no cabe en el plazo de la petición).
+        """
+        if attempt >= self.retry_policy.max_retries:
+            return None
+        delay = self.retry_policy.compute_delay(attempt, retry_after)
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() <= delay:
+            return None
+        return delay
+
+    def post_json(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Envía un POST JSON y devuelve el cuerpo decodificado.
+
+        Reintenta errores de red y respuestas 429/5xx según la política
+        configurada; cualquier otro error HTTP se propaga de inmediato.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.client.post(
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=request_timeout(timeout if timeout is not None else self.timeout),
+                )
+            except httpx.TransportError:
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if self._should_retry(response):
+                delay = self._retry_delay(attempt, response.headers.get("retry-after"))
+                if delay is not None:
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+            response.raise_for_status()
+            return response.json()
+
+    async def apost_json(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Versión asíncrona de post_json (mismos reintentos, sin bloquear el loop).
+        """
+        attempt = 0
+        while True:
+            try:
+                response = await self.aclient.post(
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=request_timeout(timeout if timeout is not None else self.timeout),
+                )
+            except httpx.TransportError:
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if self._should_retry(response):
+                delay = self._retry_delay(attempt, response.headers.get("retry-after"))
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+            response.raise_for_status()
+            return response.json()
+
+    def stream_sse(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+    ) -> Iterator[Any]:
+        """
+        Envía un POST y produce los eventos SSE decodificados según llegan.
+
+        Solo se reintenta antes de recibir el primer evento; una vez
+        emitidos tokens, un corte de conexión se propaga al llamador.
+        """
+        attempt = 0
+        emitted = False
+        while True:
+            try:
+                with self.client.stream(
+                    "POST",
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=request_timeout(timeout if timeout is not None else self.timeout),
+                ) as response:
+                    delay = None
+                    if self._should_retry(response):
+                        delay = self._retry_delay(attempt, response.headers.get("retry-after"))
+                    if delay is None:
+                        response.raise_for_status()
+                        for line in response.iter_lines():
+                            data = parse_sse_line(line)
+                            if data == "[DONE]":
+                                return
+                            if data is not None:
+                                emitted = True
+                                yield data
+                        return
+            except httpx.TransportError:
+                delay = None if emitted else self._retry_delay(attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream_sse(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Versión asíncrona de stream_sse.
+        """
+        attempt = 0
+        emitted = False
+        while True:
+            try:
+                async with self.aclient.stream(
+                    "POST",
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=request_timeout(timeout if timeout is not None else self.timeout),
+                ) as response:
+                    delay = None
+                    if self._should_retry(response):
+                        delay = self._retry_delay(attempt, response.headers.get("retry-after"))
+                    if delay is None:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            data = parse_sse_line(line)
+                            if data == "[DONE]":
+                                return
+                            if data is not None:
+                                emitted = True
+                                yield data
+                        return
+            except httpx.TransportError:
+                delay = None if emitted else self._retry_delay(attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        """Cierra las conexiones del pool síncrono."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        """Cierra el pool síncrono y el asíncrono del loop en curso."""
+        self.close()
+        aclient = self._aclients.pop(asyncio.get_running_loop(), None)
+        if aclient is not None:
+            await aclient.aclose()
@@ -8,10 +8,13 @@ manejada con agentes existentes (EJECUCION_DIRECTA).
 
 import os
 import json
+import random
+import numpy as np
 from typing import Optional, Any
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from dotenv import load_dotenv
 
 from orchestrator_state import (
@@ -21,6 +24,19 @@ from orchestrator_state import (
     SystemInvariants
 )
 from agent_repository import AgentRepository
+from semantic_cache import SemanticDecisionCache
+from routing_classifier import DecisionLog, RoutingClassifier
+from conversation_memory import ROUTER_MESSAGE_NAME
+from token_budget import MESSAGE_OVERHEAD_TOKENS, TokenBudget
+from viability_metrics import format_kpis
+from cost_accounting import track_usage
+from deadline import (
+    MIN_LLM_CALL_MS,
+    DeadlineExceeded,
+    acall_with_deadline,
+    call_with_deadline,
+    resolve_deadline,
+)
 
 
 # Cargar variables de entorno
@@ -44,6 +60,12 @@ class MetaAgentRouter:
         api_key: Optional[str] = None,
         temperature: float = 0.0,
         llm: Optional[Any] = None,
+        decision_cache: Optional[SemanticDecisionCache] = None,
+        classifier: Optional[RoutingClassifier] = None,
+        classifier_threshold: float = 0.9,
+        classifier_audit_rate: float = 0.0,
+        decision_log: Optional[DecisionLog] = None,
+        token_budget: Optional[TokenBudget] = None,
     ):
         """
         Inicializa el Meta-Agente Router.
@@ -54,8 +76,27 @@ class MetaAgentRouter:
             base_url: URL base para API compatible con OpenAI (e.g., LM Studio)
             api_key: Clave API (o "sk-no-key" para endpoints locales)
             temperature: Temperatura para generación (0.0 para determinismo)
+            decision_cache: Caché semántica de decisiones (opcional); si una
+                tarea parafraseada ya fue enrutada con el mismo catálogo,
+                se reutiliza su decisión sin llamar al LLM
+            classifier: Clasificador local de enrutamiento (opcional); si su
+                confianza alcanza `classifier_threshold` se omite el LLM
+            classifier_threshold: Confianza mínima para usar el clasificador
+            classifier_audit_rate: Fracción de decisiones seguras del
+                clasificador que se envían igualmente al LLM, para seguir
+                midiendo el acuerdo y obtener etiquetas nuevas
+            decision_log: Registro de decisiones (opcional) con el que se
+                entrena el clasificador (ver routing_classifier.py)
+            token_budget: Presupuesto de tokens del prompt; si se supera se
+                recorta primero el catálogo y después la tarea
         """
         self.agent_repository = agent_repository
+        self.decision_cache = decision_cache
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self.classifier_audit_rate = classifier_audit_rate
+        self.decision_log = decision_log
+        self.token_budget = token_budget or TokenBudget()
         
         # Configurar LLM (permitir inyección de instancia personalizada)
         if llm is not None:
@@ -70,6 +111,8 @@ class MetaAgentRouter:
             if api_key:
                 llm_kwargs["api_key"] = api_key
             self.llm = ChatOpenAI(**llm_kwargs)
+        # La respuesta se limita a la reserva del presupuesto (max_tokens)
+        self.llm = self.token_budget.limit_completion(self.llm)
 
         # Intentar structured output si el LLM lo soporta; si no, usaremos JSON manual
         self.structured_llm = None
@@ -79,8 +122,17 @@ class MetaAgentRouter:
             except Exception:
                 self.structured_llm = None
         
-        # Prompt de sistema para el router
+        # Prompt de sistema para el router, compilado una sola vez. La tarea
+        # va en un mensaje humano aparte: el prefijo de sistema (instrucciones
+        # + catálogo) es idéntico byte a byte entre peticiones mientras no
+        # cambie el catálogo, lo que permite el caché de prefijo del proveedor
         self.system_prompt = self._create_system_prompt()
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", self.system_prompt),
+            ("human", "{user_task}"),
+        ])
+        # Mensaje de sistema ya renderizado: (versión del catálogo, mensaje)
+        self._system_message: Optional[tuple[int, SystemMessage]] = None
     
     def _create_system_prompt(self) -> str:
         """
@@ -147,62 +199,283 @@ Devuelve una decisión estructurada con:
 
 ## TAREA DEL USUARIO
 
-{user_task}
-
-Evalúa la tarea y proporciona tu decisión de enrutamiento."""
+La tarea del usuario llega en el siguiente mensaje, seguida de los KPIs de viabilidad recientes del sistema cuando los hay. Evalúala y proporciona tu decisión de enrutamiento."""
     
-    def evaluate_task(self, state: OrchestratorState) -> OrchestratorState:
+    def evaluate_task(self, state: OrchestratorState, config: Optional[RunnableConfig] = None) -> OrchestratorState:
         """
         Nodo del grafo: Evalúa la tarea del usuario y determina el enrutamiento.
         
+        Si el plazo de la petición no deja tiempo para el LLM (o vence
+        durante la llamada) se enruta con la heurística de respaldo.
+        
         Args:
             state: Estado actual del grafo
+            config: Configuración del grafo (plazo de la petición)
             
         Returns:
-            Estado actualizado con la decisión de enrutamiento
+            Actualización parcial del estado (solo las claves que cambian y
+            los mensajes nuevos; add_messages los añade al historial)
         """
         # Obtener el último mensaje del usuario
         if not state.get("messages"):
             return {
-                **state,
                 "route": "END",
                 "task_complexity": 0.0,
             }
         
-        last_message = state["messages"][-1]
-        user_task = last_message.content if hasattr(last_message, 'content') else str(last_message)
-        
-        # Obtener catálogo de agentes
-        agent_catalog = self.agent_repository.get_catalog_summary()
-        state["agent_catalog"] = agent_catalog
+        user_task, agent_catalog, prompt_messages, (prompt_tokens, trimmed) = self._prepare_evaluation(state)
+
+        # Clasificador local: si está seguro, no se llama al LLM
+        classified = self._classify(user_task)
+        if classified is not None:
+            return self._decision_update(state, classified, label="Router Classifier")
+
+        deadline = resolve_deadline(config)
+        if deadline is not None and not deadline.allows(MIN_LLM_CALL_MS):
+            print("⏱️  Plazo insuficiente para el router LLM; usando heurística")
+            return self._fallback_update(state, user_task, agent_catalog)
+
+        # Si tenemos structured_llm, úsalo
+        if self.structured_llm is not None:
+            # Reutilizar la decisión de una tarea casi idéntica ya enrutada
+            task_vector = None
+            if self.decision_cache is not None:
+                try:
+                    task_vector = self.decision_cache.embed(user_task)
+                    cached = self.decision_cache.lookup(task_vector, self.agent_repository.version)
+                    if cached is not None:
+                        return self._decision_update(state, cached, label="Router Cache", task_vector=task_vector)
+                except Exception as e:
+                    print(f"Error en caché semántica del router: {e}")
+
+            try:
+                with track_usage() as tracker:
+                    decision: RouterDecision = call_with_deadline(
+                        deadline, self.structured_llm.invoke, prompt_messages
+                    )
+                self._log_decision(user_task, decision, source="llm")
+                if task_vector is not None:
+                    self.decision_cache.store(task_vector, decision, self.agent_repository.version)
+                usage = tracker.apply(
+                    self.token_budget.usage("router", prompt_tokens, decision.model_dump_json(), trimmed)
+                )
+                return self._decision_update(state, decision, usage=usage, task_vector=task_vector)
+            except DeadlineExceeded:
+                print("⏱️  Plazo agotado esperando al router LLM; usando heurística")
+            except Exception as e:
+                print(f"Error en router (structured): {e}")
+
+        return self._fallback_update(state, user_task, agent_catalog)
+
+    async def aevaluate_task(self, state: OrchestratorState, config: Optional[RunnableConfig] = None) -> OrchestratorState:
+        """
+        Versión asíncrona de evaluate_task para `AutopoieticOrchestrator.ainvoke`.
         
-        # Formatear información del catálogo
-        catalog_info = self._format_catalog_info(agent_catalog)
+        La llamada al LLM se hace con `ainvoke`, de modo que la evaluación
+        no bloquea el event loop mientras espera al proveedor.
+        """
+        if not state.get("messages"):
+            return {
+                "route": "END",
+                "task_complexity": 0.0,
+            }
         
-        # Crear el prompt con la tarea y el catálogo
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-        ])
+        user_task, agent_catalog, prompt_messages, (prompt_tokens, trimmed) = self._prepare_evaluation(state)
+
+        classified = self._classify(user_task)
+        if classified is not None:
+            return self._decision_update(state, classified, label="Router Classifier")
+
+        deadline = resolve_deadline(config)
+        if deadline is not None and not deadline.allows(MIN_LLM_CALL_MS):
+            print("⏱️  Plazo insuficiente para el router LLM; usando heurística")
+            return self._fallback_update(state, user_task, agent_catalog)
 
-        # Si tenemos structured_llm, úsalo
         if self.structured_llm is not None:
+            task_vector = None
+            if self.decision_cache is not None:
+                try:
+                    task_vector = await self.decision_cache.aembed(user_task)
+                    cached = self.decision_cache.lookup(task_vector, self.agent_repository.version)
+                    if cached is not None:
+                        return self._decision_update(state, cached, label="Router Cache", task_vector=task_vector)
+                except Exception as e:
+                    print(f"Error en caché semántica del router: {e}")
+
             try:
-                decision: RouterDecision = self.structured_llm.invoke(
-                    prompt.format_messages(agent_catalog=catalog_info, user_task=user_task)
+                with track_usage() as tracker:
+                    decision: RouterDecision = await acall_with_deadline(
+                        deadline, self.structured_llm.ainvoke(prompt_messages)
+                    )
+                self._log_decision(user_task, decision, source="llm")
+                if task_vector is not None:
+                    self.decision_cache.store(task_vector, decision, self.agent_repository.version)
+                usage = tracker.apply(
+                    self.token_budget.usage("router", prompt_tokens, decision.model_dump_json(), trimmed)
                 )
-                return {
-                    **state,
-                    "route": decision.route,
-                    "task_complexity": decision.task_complexity,
-                    "messages": state["messages"] + [
-                        {"role": "assistant", "content": f"[Router] {decision.reasoning}"}
-                    ],
-                }
+                return self._decision_update(state, decision, usage=usage, task_vector=task_vector)
+            except DeadlineExceeded:
+                print("⏱️  Plazo agotado esperando al router LLM; usando heurística")
             except Exception as e:
                 print(f"Error en router (structured): {e}")
 
-        # Fallback: análisis simple basado en keywords
-        print(f"⚠️  Router usando fallback (structured output no disponible)")
+        return self._fallback_update(state, user_task, agent_catalog)
+
+    def _classify(self, user_task: str) -> Optional[RouterDecision]:
+        """
+        Decisión del clasificador local si supera el umbral de confianza.
+        """
+        if self.classifier is None:
+            return None
+        try:
+            decision = self.classifier.decide(user_task, self.classifier_threshold)
+        except Exception as e:
+            print(f"⚠️  Error en clasificador de enrutamiento: {e}")
+            return None
+        if decision is None:
+            return None
+        if self.classifier_audit_rate and random.random() < self.classifier_audit_rate:
+            return None
+        self._log_decision(user_task, decision, source="classifier")
+        return decision
+
+    def _log_decision(self, user_task: str, decision: RouterDecision, source: str) -> None:
+        """
+        Registra la decisión para entrenar/auditar el clasificador.
+        """
+        if self.decision_log is None:
+            return
+        try:
+            self.decision_log.append(user_task, decision, source=source)
+        except OSError as e:
+            print(f"⚠️  No se pudo registrar la decisión del router: {e}")
+
+    def _prepare_evaluation(
+        self,
+        state: OrchestratorState,
+    ) -> tuple[str, list[dict], list[BaseMessage], tuple[int, list[str]]]:
+        """
+        Extrae la tarea del usuario y construye los mensajes del prompt del router.
+        
+        Solo el mensaje humano (tarea + KPIs de viabilidad del estado, por
+        bandas para que la caché de respuestas acierte) se formatea en cada
+        petición; el mensaje de sistema se reutiliza mientras no cambie la
+        versión del catálogo.
+        
+        Returns:
+            (tarea, catálogo, mensajes del prompt, (tokens del prompt,
+            secciones recortadas por presupuesto))
+        """
+        last_message = state["messages"][-1]
+        user_task = last_message.content if hasattr(last_message, 'content') else str(last_message)
+        
+        # Obtener catálogo de agentes
+        agent_catalog = self.agent_repository.get_catalog_summary()
+        
+        # Los KPIs van tras la tarea: si hay que recortarla se pierden antes
+        kpis = format_kpis(state.get("viability_kpis"))
+        task_block = f"{user_task}\n\n{kpis}" if kpis else user_task
+        
+        system_template, human_template = self.prompt.messages
+        prompt_messages = [
+            self._render_system_message(system_template),
+            human_template.format(user_task=task_block),
+        ]
+        
+        # El conteo del mensaje de sistema está memoizado: solo se tokeniza
+        # la tarea mientras el prompt quepa en el presupuesto
+        prompt_tokens = self.token_budget.counter.count_messages(prompt_messages)
+        if prompt_tokens <= self.token_budget.prompt_budget:
+            return user_task, agent_catalog, prompt_messages, (prompt_tokens, [])
+        
+        texts, trimmed, prompt_tokens = self.token_budget.fit(
+            [
+                ("instructions", self.system_prompt),
+                ("catalog", self._catalog_block()),
+                ("task", task_block),
+            ],
+            trim_order=["catalog", "task"],
+            reserved=MESSAGE_OVERHEAD_TOKENS * len(prompt_messages),
+        )
+        prompt_messages = [
+            system_template.format(agent_catalog=texts["catalog"]),
+            human_template.format(user_task=texts["task"]),
+        ]
+        return user_task, agent_catalog, prompt_messages, (prompt_tokens, trimmed)
+
+    def _catalog_block(self) -> str:
+        """
+        Bloque de catálogo del prompt, cacheado en el repositorio por versión.
+        """
+        return self.agent_repository.cached_view(
+            "router_catalog_block",
+            lambda repo: self._format_catalog_info(repo.get_catalog_summary()),
+        )
+
+    def _render_system_message(self, system_template: Any) -> SystemMessage:
+        """
+        Mensaje de sistema con el catálogo formateado, memoizado por versión.
+        
+        El bloque de catálogo se cachea en el propio repositorio (vista
+        derivada por versión), de modo que solo se recorre el catálogo
+        cuando este cambia.
+        """
+        version = self.agent_repository.version
+        if self._system_message is None or self._system_message[0] != version:
+            self._system_message = (version, system_template.format(agent_catalog=self._catalog_block()))
+        return self._system_message[1]
+
+    def _decision_update(
+        self,
+        state: OrchestratorState,
+        decision: RouterDecision,
+        label: str = "Router",
+        usage: Optional[dict] = None,
+        task_vector: Optional[np.ndarray] = None,
+    ) -> OrchestratorState:
+        """
+        Convierte una RouterDecision en la actualización de estado del nodo.
+        
+        Args:
+            usage: Registro de tokens de la llamada al LLM (si la hubo)
+            task_vector: Embedding de la tarea (caché semántica); se publica
+                como `task_embedding` para que la selección de agente no
+                vuelva a embeber la tarea
+        """
+        update = {
+            "route": decision.route,
+            "task_complexity": decision.task_complexity,
+            "messages": [
+                {"role": "assistant", "name": ROUTER_MESSAGE_NAME, "content": f"[{label}] {decision.reasoning}"}
+            ],
+            **self._catalog_update(state),
+        }
+        if usage is not None:
+            update["token_usage"] = [usage]
+        if task_vector is not None:
+            update["task_embedding"] = task_vector.tolist()
+        return update
+
+    def _catalog_update(self, state: OrchestratorState) -> dict:
+        """
+        Publica el catálogo en el estado solo si difiere del que ya tiene el
+        hilo, para no reescribir (ni volver a checkpointear) el canal en cada turno.
+        """
+        agent_catalog = self.agent_repository.get_catalog_summary()
+        if state.get("agent_catalog") == agent_catalog:
+            return {}
+        return {"agent_catalog": agent_catalog}
+
+    def _fallback_update(
+        self,
+        state: OrchestratorState,
+        user_task: str,
+        agent_catalog: list[dict],
+    ) -> OrchestratorState:
+        """
+        Enrutamiento de respaldo basado en keywords cuando no hay structured output.
+        """
+        print("⚠️  Router usando fallback por palabras clave")
         
         # Análisis simple de complejidad basado en la tarea
         task_lower = user_task.lower()
@@ -235,12 +508,12 @@ Evalúa la tarea y proporciona tu decisión de enrutamiento."""
             reasoning = f"Tarea manejable (complexity={complexity:.2f}) con agentes existentes"
         
         return {
-            **state,
             "route": route,
             "task_complexity": complexity,
-            "messages": state["messages"] + [
-                {"role": "assistant", "content": f"[Router Fallback] {reasoning}"}
+            "messages": [
+                {"role": "assistant", "name": ROUTER_MESSAGE_NAME, "content": f"[Router Fallback] {reasoning}"}
             ],
+            **self._catalog_update(state),
         }
     
     def _format_catalog_info(self, catalog: list[dict]) -> str:
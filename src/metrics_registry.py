@@ -0,0 +1,596 @@
+"""
+Métricas operativas del orquestador en formato Prometheus.
+
+Registro ligero de contadores, gauges e histogramas (sin dependencias
+externas) con dos salidas:
+
+- `MetricsRegistry.snapshot()`: diccionario en proceso
+- `MetricsRegistry.render()` / MetricsServer: texto de exposición de
+  Prometheus (0.0.4) servido en un puerto local (GET /metrics)
+
+El coste en el camino caliente es el de una actualización bajo lock
+(histograma: búsqueda binaria del bucket); los valores que ya cuentan
+otros componentes (aciertos de caché, tamaño del EventManager, KPIs de
+viabilidad) se leen con funciones solo al exportar (`set_function`).
+
+OrchestratorMetrics define las métricas del orquestador: duración y
+errores por nodo del grafo, llamadas al proveedor (callback de
+LangChain que el orquestador pasa en la configuración de cada
+ejecución), peticiones y cachés.
+"""
+
+import bisect
+import math
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from cost_accounting import parse_usage
+
+# Límites superiores (segundos) de los buckets por defecto
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in labels.items())
+    return "{" + inner + "}"
+
+
+class _Value:
+    """Valor de una serie (contador o gauge)."""
+
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """El valor se obtiene llamando a `function` al exportar."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class _HistogramValue:
+    """Serie de un histograma: cuenta por bucket, suma y total."""
+
+    __slots__ = ("upper_bounds", "bucket_counts", "sum", "count", "_lock")
+
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        # Un hueco más para las observaciones por encima del último límite
+        self.bucket_counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def get(self) -> dict:
+        with self._lock:
+            counts = list(self.bucket_counts)
+            total, count = self.sum, self.count
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.upper_bounds, counts):
+            running += bucket_count
+            cumulative[bound] = running
+        cumulative[math.inf] = count
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+
+class Metric:
+    """
+    Métrica con nombre, ayuda y etiquetas; cada combinación de valores de
+    etiqueta es una serie (`labels(...)`). Sin etiquetas, los métodos de
+    la serie única se llaman directamente sobre la métrica.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_series()
+            self._series[()] = self._default
+
+    def _new_series(self) -> Any:
+        return _Value()
+
+    def labels(self, *values: Any) -> Any:
+        """
+        Serie para los valores de etiqueta dados (se crea al primer uso).
+        Los valores se normalizan a str: `labels(200)` y `labels("200")`
+        son la misma serie.
+        """
+        key = tuple(map(str, values))
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} espera las etiquetas {self.labelnames}, recibió {values}"
+                )
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def series(self) -> list[tuple[dict, Any]]:
+        """(etiquetas, valor) de cada serie."""
+        with self._lock:
+            items = list(self._series.items())
+        return [(dict(zip(self.labelnames, key)), series.get()) for key, series in items]
+
+    def __getattr__(self, attribute: str) -> Any:
+        # inc/set/observe/... sobre la serie única de una métrica sin etiquetas
+        if attribute.startswith("_") or "_default" not in self.__dict__:
+            raise AttributeError(attribute)
+        return getattr(self._default, attribute)
+
+
+class Counter(Metric):
+    """Contador monotónico (sufijo _total por convención)."""
+
+    type_name = "counter"
+
+
+class Gauge(Metric):
+    """Valor que sube y baja (o se calcula al exportar con set_function)."""
+
+    type_name = "gauge"
+
+
+class Histogram(Metric):
+    """Distribución por buckets acumulativos (latencias en segundos)."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        self.upper_bounds = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_series(self) -> Any:
+        return _HistogramValue(self.upper_bounds)
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas exportadas juntas.
+
+    Registrar dos veces el mismo nombre con el mismo tipo devuelve la
+    métrica existente; con otro tipo es un error.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls: type, name: str, documentation: str, labelnames: Iterable[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is not None:
+                if not isinstance(metric, cls):
+                    raise ValueError(f"La métrica {name} ya está registrada como {metric.type_name}")
+                return metric
+            metric = cls(name, documentation, labelnames, **kwargs)
+            self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def metrics(self) -> list[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> dict:
+        """
+        Valores actuales: {nombre: {"type", "help", "series": [{"labels", "value"}]}};
+        en los histogramas `value` es {"count", "sum", "buckets"}.
+        """
+        return {
+            metric.name: {
+                "type": metric.type_name,
+                "help": metric.documentation,
+                "series": [{"labels": labels, "value": value} for labels, value in metric.series()],
+            }
+            for metric in self.metrics()
+        }
+
+    def render(self) -> str:
+        """Texto de exposición de Prometheus (versión 0.0.4)."""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for labels, value in metric.series():
+                if isinstance(metric, Histogram):
+                    for bound, count in value["buckets"].items():
+                        bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                        lines.append(f"{metric.name}_bucket{bucket_labels} {count}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Servidor HTTP local (hilo daemon) que expone un registro en /metrics.
+
+    Ejemplo de uso:
+        >>> server = MetricsServer(orchestrator.metrics.registry, port=9464).start()
+        >>> # curl http://127.0.0.1:9464/metrics
+        >>> server.stop()
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        """
+        Args:
+            registry: Registro a exponer
+            host: Interfaz de escucha (por defecto solo local)
+            port: Puerto (0 = uno libre, ver `port` tras start)
+        """
+        self.registry = registry
+        self.host = host
+        self._requested_port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        if self._server is None:
+            return self._requested_port
+        return self._server.server_address[1]
+
+    def _handler(self) -> type:
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Sin una línea en stderr por cada scrape
+                pass
+
+        return Handler
+
+    def start(self) -> "MetricsServer":
+        if self._server is None:
+            self._server = ThreadingHTTPServer((self.host, self._requested_port), self._handler())
+            self._server.daemon_threads = True
+            self._thread = threading.Thread(
+                target=self._server.serve_forever, name="metrics-server", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+
+class ProviderCallHandler(BaseCallbackHandler):
+    """
+    Callback de LangChain que mide cada llamada al proveedor (duración,
+    resultado y tokens por modelo).
+
+    Se pasa en `callbacks` de la configuración de cada ejecución del
+    grafo (ver OrchestratorMetrics.provider_handler), no en el LLM: así no
+    se modifica un LLM que puede compartirse con otros componentes.
+
+    Las respuestas de la caché de modelos de chat (usage_metadata con
+    `total_cost` 0) no cuentan como llamadas al proveedor; las de BaseLLM
+    no llegan a iniciar callbacks.
+
+    Cada prompt de la respuesta cuenta como una llamada correcta; las
+    fallidas llegan por on_llm_error. Los tokens se leen como en
+    cost_accounting.UsageTracker (usage_metadata del mensaje, `token_usage`
+    de generation_info o de llm_output).
+    """
+
+    # Se ejecuta en línea también en llamadas asíncronas (sin executor)
+    run_inline = True
+    # Solo interesan las llamadas al LLM: los eventos de cadenas, agentes
+    # y retrievers del grafo no se despachan a este callback
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+
+    def __init__(self, metrics: "OrchestratorMetrics", default_model: Optional[str] = None):
+        self.metrics = metrics
+        self.default_model = default_model or "unknown"
+        self._started: dict[UUID, float] = {}
+        # Series por modelo: (llamadas ok, llamadas con error, duración,
+        # tokens de entrada, de salida)
+        self._series: dict[str, tuple] = {}
+
+    def _model_series(self, model: str) -> tuple:
+        series = self._series.get(model)
+        if series is None:
+            metrics = self.metrics
+            series = (
+                metrics.provider_calls.labels(model, "ok"),
+                metrics.provider_calls.labels(model, "error"),
+                metrics.provider_seconds.labels(model),
+                metrics.provider_tokens.labels(model, "prompt"),
+                metrics.provider_tokens.labels(model, "completion"),
+            )
+            self._series[model] = series
+        return series
+
+    def on_llm_start(self, serialized: Any, prompts: list, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized: Any, messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._started.pop(run_id, None)
+        llm_output = response.llm_output or {}
+        model = llm_output.get("model_name")
+        prompt_tokens = completion_tokens = 0
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    if usage.get("total_cost") == 0:
+                        return
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                    model = model or (message.response_metadata or {}).get("model_name")
+                    found = True
+                elif info.get("token_usage"):
+                    # Streaming de Cloudflare: uso en el último fragmento
+                    parsed = parse_usage({"usage": info["token_usage"]})
+                    if parsed is not None:
+                        prompt_tokens += parsed[0]
+                        completion_tokens += parsed[1]
+                        model = model or info.get("model_name")
+                        found = True
+        if not found:
+            parsed = parse_usage({"usage": llm_output.get("token_usage")})
+            if parsed is not None:
+                prompt_tokens, completion_tokens = parsed
+        ok, _, seconds, prompt, completion = self._model_series(model or self.default_model)
+        if response.generations:
+            ok.inc(len(response.generations))
+        if start is not None:
+            seconds.observe(time.perf_counter() - start)
+        if prompt_tokens or completion_tokens:
+            prompt.inc(prompt_tokens)
+            completion.inc(completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._started.pop(run_id, None)
+        _, error, seconds, _, _ = self._model_series(self.default_model)
+        error.inc()
+        if start is not None:
+            seconds.observe(time.perf_counter() - start)
+
+
+class OrchestratorMetrics:
+    """
+    Métricas del orquestador sobre un MetricsRegistry.
+
+    - orchestrator_node_seconds / orchestrator_node_errors_total por nodo
+      (memory, router, direct_execution, structural_diagnosis)
+    - orchestrator_requests_total / orchestrator_request_seconds
+    - llm_provider_calls_total / llm_provider_seconds / llm_provider_tokens_total
+    - Gauges y contadores leídos al exportar (`watch_*`): cachés, eventos
+      y KPIs de viabilidad
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        registry = self.registry
+        self.node_seconds = registry.histogram(
+            "orchestrator_node_seconds", "Duración de cada nodo del grafo", ["node"]
+        )
+        self.node_errors = registry.counter(
+            "orchestrator_node_errors_total", "Excepciones lanzadas por cada nodo del grafo", ["node"]
+        )
+        self.requests = registry.counter(
+            "orchestrator_requests_total", "Peticiones terminadas por resultado", ["outcome"]
+        )
+        self.request_seconds = registry.histogram(
+            "orchestrator_request_seconds", "Latencia de extremo a extremo por petición"
+        )
+        self.provider_calls = registry.counter(
+            "llm_provider_calls_total", "Llamadas al proveedor del LLM", ["model", "outcome"]
+        )
+        self.provider_seconds = registry.histogram(
+            "llm_provider_seconds", "Duración de las llamadas al proveedor del LLM", ["model"]
+        )
+        self.provider_tokens = registry.counter(
+            "llm_provider_tokens_total", "Tokens reportados por el proveedor", ["model", "kind"]
+        )
+        self._request_ok = self.requests.labels("ok")
+        self._request_error = self.requests.labels("error")
+        self._server: Optional[MetricsServer] = None
+
+    def instrument(self, node: str, func: Callable, afunc: Optional[Callable] = None) -> tuple:
+        """
+        Envuelve las variantes síncrona y asíncrona de un nodo para medir
+        su duración y sus excepciones (conservan la firma, de modo que el
+        nodo sigue recibiendo `config`).
+        """
+        histogram = self.node_seconds.labels(node)
+        errors = self.node_errors.labels(node)
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        if afunc is None:
+            return timed, None
+
+        @wraps(afunc)
+        async def atimed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await afunc(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return timed, atimed
+
+    def record_request(self, seconds: float, failed: bool) -> None:
+        (self._request_error if failed else self._request_ok).inc()
+        self.request_seconds.observe(seconds)
+
+    def provider_handler(self, model: Optional[str] = None) -> ProviderCallHandler:
+        """
+        Callback de llamadas al proveedor, para pasarlo en `callbacks` de
+        la configuración de cada ejecución (lo heredan todas las llamadas
+        al LLM hechas dentro de ella).
+
+        Args:
+            model: Modelo de las llamadas cuya respuesta no lo reporta
+        """
+        return ProviderCallHandler(self, default_model=model)
+
+    def watch_response_cache(self, cache: Any) -> None:
+        """Aciertos y fallos de la caché de respuestas (ResponseCache)."""
+        self.registry.counter(
+            "llm_response_cache_hits_total", "Respuestas servidas desde la caché"
+        ).set_function(lambda: cache.hits)
+        self.registry.counter(
+            "llm_response_cache_misses_total", "Consultas a la caché sin acierto"
+        ).set_function(lambda: cache.misses)
+
+    def watch_decision_cache(self, cache: Any) -> None:
+        """Aciertos y fallos de la caché semántica del router."""
+        self.registry.counter(
+            "router_decision_cache_hits_total", "Decisiones del router reutilizadas"
+        ).set_function(lambda: cache.hits)
+        self.registry.counter(
+            "router_decision_cache_misses_total", "Consultas a la caché semántica sin acierto"
+        ).set_function(lambda: cache.misses)
+
+    def watch_event_manager(self, event_manager: Any) -> None:
+        """Eventos retenidos y confirmaciones pendientes del EventManager."""
+        self.registry.gauge(
+            "event_manager_events", "Eventos retenidos en el registro"
+        ).set_function(lambda: len(event_manager))
+        self.registry.gauge(
+            "event_manager_pending_confirmations", "Eventos pendientes de confirmación"
+        ).set_function(lambda: len(event_manager.pending))
+
+    def watch_viability(self, monitor: Any) -> None:
+        """KPIs de la ventana de viabilidad (ver viability_metrics)."""
+        gauge = self.registry.gauge(
+            "orchestrator_viability", "KPIs de viabilidad de la ventana actual", ["kpi"]
+        )
+        for kpi in ("latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "error_rate", "cost_per_request"):
+            gauge.labels(kpi).set_function(
+                lambda kpi=kpi: (monitor.snapshot() or {}).get(kpi, math.nan)
+            )
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> MetricsServer:
+        """Expone el registro en http://host:port/metrics (idempotente)."""
+        if self._server is None:
+            self._server = MetricsServer(self.registry, host=host, port=port).start()
+        return self._server
+
+    def stop_server(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
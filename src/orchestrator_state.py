@@ -28,6 +28,32 @@ RouteLabel = Literal[
 # ESQUEMA DE ESTADO DEL GRAFO
 # ============================================================================
 
+def merge_token_usage(left: Optional[list[dict]], right: Optional[list[dict]]) -> list[dict]:
+    """
+    Reductor de `token_usage`: acumula los registros de cada nodo; un
+    valor None (estado inicial de cada petición) reinicia la lista.
+    """
+    if right is None:
+        return []
+    return (left or []) + right
+
+
+def merge_usage_summary(left: Optional[dict], right: Optional[dict]) -> Optional[dict]:
+    """
+    Reductor de `thread_cost`: suma la agregación de coste de cada
+    petición (totales, por nodo y por agente) a la acumulada del hilo.
+    """
+    if left is None or right is None:
+        return right if left is None else left
+    merged = dict(left)
+    for key, value in right.items():
+        if isinstance(value, dict):
+            merged[key] = merge_usage_summary(left.get(key), value)
+        else:
+            merged[key] = left.get(key, 0) + value
+    return merged
+
+
 class OrchestratorState(TypedDict):
     """
     Estado principal del grafo de orquestación.
@@ -39,6 +65,20 @@ class OrchestratorState(TypedDict):
     - viability_kpis: Métricas de viabilidad del sistema
     - context: Contexto adicional (RAG, catálogo de agentes, etc.)
     - agent_catalog: Catálogo de especificaciones de agentes disponibles
+    - conversation_summary: Resumen incremental de los turnos antiguos del hilo
+    - summarized_until: Índice en `messages` hasta el que llega el resumen
+    - token_usage: Tokens de prompt/respuesta de cada llamada al LLM de la
+      petición en curso (ver token_budget.TokenBudget.usage)
+    - request_cost: Tokens y coste de la petición, por nodo y por agente
+      (ver cost_accounting.CostAccountingNode)
+    - thread_cost: La misma agregación acumulada en el hilo
+    - task_embedding: Embedding normalizado de la tarea que calcula el
+      router (caché semántica) y reutiliza la selección de agente, de modo
+      que cada petición embebe la tarea una sola vez
+    
+    Contrato de los nodos: devuelven solo las claves que cambian y, en
+    `messages`, únicamente los mensajes nuevos del turno; el reductor
+    add_messages los añade al historial del hilo.
     """
     messages: Annotated[list[AnyMessage], add_messages]
     route: Optional[RouteLabel]
@@ -46,6 +86,12 @@ class OrchestratorState(TypedDict):
     viability_kpis: Optional[dict]
     context: Optional[str]
     agent_catalog: Optional[list[dict]]
+    conversation_summary: Optional[str]
+    summarized_until: Optional[int]
+    token_usage: Annotated[list[dict], merge_token_usage]
+    request_cost: Optional[dict]
+    thread_cost: Annotated[Optional[dict], merge_usage_summary]
+    task_embedding: Optional[list[float]]
 
 
 # ============================================================================
@@ -123,7 +169,7 @@ class SystemInvariants:
     
     # Presupuestos
     BUDGETS = {
-        "max_tokens_per_request": 8000,
+        "max_tokens_per_request": 8000,  # prompt + respuesta, por llamada al LLM
         "max_latency_ms": 5000,
         "max_cost_per_request": 0.10,
     }
@@ -6,23 +6,26 @@ modelos de Cloudflare Workers AI en el sistema autopoiético.
 """
 
 import os
-import requests
-from typing import Any, List, Optional, Dict
+import httpx
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 from dotenv import load_dotenv
-from langchain_core.language_models.llms import BaseLLM
+from langchain_core.embeddings import Embeddings
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage
-from langchain_core.outputs import Generation, LLMResult
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+
+from cloudflare_client import CloudflareBaseLLM
+from http_transport import HTTPTransport, RetryPolicy
 
 load_dotenv()
 
 
-class CloudflareLLM(BaseLLM):
+class CloudflareLLM(CloudflareBaseLLM):
     """
     LLM compatible con LangChain que usa Cloudflare Workers AI.
     
     Permite usar modelos de Cloudflare como alternativa a OpenAI
-    en el sistema autopoiético.
+    en el sistema autopoiético. Transporte, lotes, streaming y `batch`
+    con errores por elemento vienen de CloudflareBaseLLM
+    (cloudflare_client).
     
     Ejemplo de uso:
         >>> llm = CloudflareLLM(
@@ -33,9 +36,6 @@ class CloudflareLLM(BaseLLM):
         >>> response = llm.invoke("¿Qué es Python?")
     """
     
-    account_id: str
-    auth_token: str
-    model: str = "@cf/meta/llama-2-7b-chat-int8"
     temperature: float = 0.7
     max_tokens: int = 2048
     
@@ -57,6 +57,8 @@ class CloudflareLLM(BaseLLM):
             model: Modelo a usar (por defecto: llama-2-7b-chat)
             temperature: Temperatura para generación (0.0-1.0)
             max_tokens: Máximo de tokens a generar
+            **kwargs: timeout, max_retries, pool_maxsize y http2 configuran
+                el transporte HTTP compartido
         """
         account_id = account_id or os.getenv("CLOUDFLARE_ACCOUNT_ID")
         auth_token = auth_token or os.getenv("CLOUDFLARE_AUTH_TOKEN")
@@ -80,24 +82,24 @@ class CloudflareLLM(BaseLLM):
     def _llm_type(self) -> str:
         """Retorna el tipo de LLM."""
         return "cloudflare"
-    
-    def _call(
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        """Parámetros que distinguen las respuestas (usados como clave de caché)."""
+        return {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+
+    def _build_request(
         self,
         prompt: str,
         stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
-    ) -> str:
+    ) -> tuple[str, Dict[str, str], Dict[str, Any]]:
         """
-        Llamada principal al LLM de Cloudflare.
-        
-        Args:
-            prompt: Texto de entrada
-            stop: Secuencias de parada (opcional)
-            run_manager: Manager de callbacks
-            
-        Returns:
-            Respuesta del modelo
+        Construye URL, cabeceras y payload para el endpoint /ai/run.
         """
         url = f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/run/{self.model}"
         
@@ -117,47 +119,27 @@ class CloudflareLLM(BaseLLM):
         
         if stop:
             payload["stop"] = stop
-        
-        try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            # Cloudflare Workers AI puede retornar diferentes formatos
-            # Intentamos extraer la respuesta del formato más común
-            if result.get("success") and result.get("result"):
-                response_text = result["result"].get("response", "")
-                if not response_text:
-                    # Algunos modelos retornan en 'text'
-                    response_text = result["result"].get("text", "")
-                if not response_text:
-                    # O en 'generated_text'
-                    response_text = result["result"].get("generated_text", "")
-                return response_text
-            else:
-                error_msg = result.get("errors", ["Error desconocido"])
-                raise ValueError(f"Error en Cloudflare API: {error_msg}")
-                
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
-    
-    def _generate(
-        self,
-        prompts: List[str],
-        stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
-        **kwargs: Any,
-    ) -> LLMResult:
+
+        return url, headers, payload
+
+    def _parse_result(self, result: Dict[str, Any]) -> str:
         """
-        Genera respuestas para múltiples prompts.
+        Extrae el texto generado de la respuesta de Cloudflare.
         """
-        generations = []
-        for prompt in prompts:
-            text = self._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
-            generations.append([Generation(text=text)])
-        
-        return LLMResult(generations=generations)
+        # Cloudflare Workers AI puede retornar diferentes formatos
+        # Intentamos extraer la respuesta del formato más común
+        if result.get("success") and result.get("result"):
+            response_text = result["result"].get("response", "")
+            if not response_text:
+                # Algunos modelos retornan en 'text'
+                response_text = result["result"].get("text", "")
+            if not response_text:
+                # O en 'generated_text'
+                response_text = result["result"].get("generated_text", "")
+            return response_text
+        else:
+            error_msg = result.get("errors", ["Error desconocido"])
+            raise ValueError(f"Error en Cloudflare API: {error_msg}")
 
 
 class CloudflareChatLLM(CloudflareLLM):
@@ -204,12 +186,41 @@ class CloudflareChatLLM(CloudflareLLM):
         Returns:
             Respuesta del modelo
         """
-        if isinstance(input, list) and all(isinstance(m, BaseMessage) for m in input):
-            prompt = self._format_messages(input)
-        else:
-            prompt = str(input)
+        return super().invoke(self._input_to_prompt(input), **kwargs)
+
+    async def ainvoke(self, input: Any, **kwargs) -> str:
+        """
+        Versión asíncrona de invoke (no bloquea el event loop).
         
-        return self._call(prompt, **kwargs)
+        Args:
+            input: Puede ser string o lista de mensajes
+            
+        Returns:
+            Respuesta del modelo
+        """
+        return await super().ainvoke(self._input_to_prompt(input), **kwargs)
+
+    def stream(self, input: Any, config: Optional[Dict] = None, **kwargs) -> Iterator[str]:
+        """
+        Emite la respuesta token a token (acepta string o lista de mensajes).
+        """
+        yield from super().stream(self._input_to_prompt(input), config=config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Versión asíncrona de stream.
+        """
+        async for token in super().astream(self._input_to_prompt(input), config=config, **kwargs):
+            yield token
+
+    def _input_to_prompt(self, input: Any) -> str:
+        """Normaliza la entrada de invoke/ainvoke a un prompt de texto."""
+        if isinstance(input, list) and all(isinstance(m, BaseMessage) for m in input):
+            return self._format_messages(input)
+        if hasattr(input, "to_messages"):
+            # PromptValue producido por `prompt | llm`
+            return self._format_messages(input.to_messages())
+        return str(input)
 
 
 # ============================================================================
@@ -261,6 +272,98 @@ def create_cloudflare_llm(
     )
 
 
+# ============================================================================
+# EMBEDDINGS (bge) DE CLOUDFLARE WORKERS AI
+# ============================================================================
+
+class CloudflareEmbeddings(Embeddings):
+    """
+    Embeddings de Cloudflare Workers AI (modelos bge) compatibles con LangChain.
+    
+    Se usan para cachés semánticas y búsqueda de agentes; reutilizan el
+    mismo transporte HTTP con pool de conexiones que los clientes LLM.
+    
+    Ejemplo de uso:
+        >>> embeddings = CloudflareEmbeddings(model="bge-small")
+        >>> vector = embeddings.embed_query("¿Qué es Python?")
+    """
+    
+    def __init__(
+        self,
+        account_id: Optional[str] = None,
+        auth_token: Optional[str] = None,
+        model: str = "bge-small",
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        pool_maxsize: int = 10,
+    ):
+        """
+        Args:
+            account_id: ID de cuenta de Cloudflare (o usa env var CLOUDFLARE_ACCOUNT_ID)
+            auth_token: Token de autenticación (o usa env var CLOUDFLARE_AUTH_TOKEN)
+            model: Nombre corto ("bge-small", "bge-base") o ID completo del modelo
+        """
+        self.account_id = account_id or os.getenv("CLOUDFLARE_ACCOUNT_ID")
+        self.auth_token = auth_token or os.getenv("CLOUDFLARE_AUTH_TOKEN")
+        
+        if not self.account_id or not self.auth_token:
+            raise ValueError(
+                "Se requiere CLOUDFLARE_ACCOUNT_ID y CLOUDFLARE_AUTH_TOKEN. "
+                "Configúralos en .env o pásalos como argumentos."
+            )
+        
+        self.model = CLOUDFLARE_MODELS.get(model, model)
+        self.transport = HTTPTransport(
+            timeout=timeout,
+            pool_maxsize=pool_maxsize,
+            retry_policy=RetryPolicy(max_retries=max_retries),
+        )
+    
+    def _build_request(self, texts: List[str]) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+        url = f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/run/{self.model}"
+        headers = {
+            "Authorization": f"Bearer {self.auth_token}",
+            "Content-Type": "application/json"
+        }
+        return url, headers, {"text": texts}
+    
+    def _parse_result(self, result: Dict[str, Any]) -> List[List[float]]:
+        if result.get("success") and result.get("result"):
+            return result["result"].get("data", [])
+        error_msg = result.get("errors", ["Error desconocido"])
+        raise ValueError(f"Error en Cloudflare API: {error_msg}")
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Calcula los embeddings de varios textos en una sola llamada."""
+        if not texts:
+            return []
+        url, headers, payload = self._build_request(texts)
+        try:
+            result = self.transport.post_json(url, headers=headers, payload=payload)
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
+        return self._parse_result(result)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Calcula el embedding de un único texto."""
+        return self.embed_documents([text])[0]
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Versión asíncrona de embed_documents."""
+        if not texts:
+            return []
+        url, headers, payload = self._build_request(texts)
+        try:
+            result = await self.transport.apost_json(url, headers=headers, payload=payload)
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error al conectar con Cloudflare: {str(e)}")
+        return self._parse_result(result)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versión asíncrona de embed_query."""
+        return (await self.aembed_documents([text]))[0]
+
+
 # ============================================================================
 # EJEMPLO DE USO
 # ============================================================================
@@ -1,22 +1,113 @@
+from typing import Iterator, Optional
+
 from event_manager import EventManager
 
+
 class EventRegister:
-    """Es el registro de eventos 
-    aqui el event manager va a almacenar los eventos"""
-    def __init__(self):
-        self.event_manager = EventManager()
+    """Es el registro de eventos
+    aqui el event manager va a almacenar los eventos
+
+    Las consultas son perezosas (generadores que leen el EventManager por
+    bloques) y usan sus índices: búsqueda binaria por rango de tiempo y
+    por cursor de id (sobre el índice del tipo si se filtra por tipo),
+    índice de confirmaciones pendientes. Ninguna ordena
+    ni copia el registro completo."""
+
+    # Eventos leídos del EventManager por bloque
+    CHUNK_SIZE = 256
+
+    def __init__(self, event_manager: Optional[EventManager] = None):
+        self.event_manager = event_manager if event_manager is not None else EventManager()
         self.events = self.event_manager.events
-        
-    def display_events(self):
-        print("--- REGISTRO DE EVENTOS ---")
-        if not self.events:
-            print("No hay eventos registrados.")
+
+    def query(
+        self,
+        event_type: Optional[str] = None,
+        since=None,
+        until=None,
+        pending: Optional[bool] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator:
+        """
+        Itera los eventos que cumplen los filtros, en orden de registro.
+
+        Args:
+            event_type: Solo eventos de este tipo
+            since / until: Rango de event_time (datetime, inclusivo)
+            pending: True = solo pendientes de confirmación, False = solo
+                los no pendientes
+            after_id: Cursor: solo eventos con id mayor
+            limit: Máximo de eventos a devolver
+        """
+        if limit is not None and limit <= 0:
             return
-        
-        for event_time, event in sorted(self.events.items()):
-            print(f"[{event_time}] - {event.event_type}: {event.event_name}")
-            print(f"  Descripción: {event.event_description}")
-            print("-" * 30)
+        if pending:
+            source = self._iter_pending(after_id)
+        else:
+            source = self._iter_retained(after_id, since, until, event_type)
+
+        returned = 0
+        for event in source:
+            if pending:
+                if event_type is not None and event.event_type != event_type:
+                    continue
+                if since is not None and event.event_time < since:
+                    continue
+                if until is not None and event.event_time > until:
+                    continue
+            elif pending is False and event.event_id in self.event_manager.pending:
+                continue
+            yield event
+            returned += 1
+            if limit is not None and returned >= limit:
+                return
+
+    def _iter_retained(self, after_id, since, until, event_type) -> Iterator:
+        cursor = after_id
+        while True:
+            chunk = self.event_manager.events_after(
+                after_id=cursor, since=since, until=until, limit=self.CHUNK_SIZE,
+                event_type=event_type,
+            )
+            yield from chunk
+            if len(chunk) < self.CHUNK_SIZE:
+                return
+            cursor = chunk[-1].event_id
 
+    def _iter_pending(self, after_id) -> Iterator:
+        for event in self.event_manager.pending_confirmations():
+            if after_id is None or event.event_id > after_id:
+                yield event
 
+    def page(self, page_size: int = 50, after_id: Optional[int] = None, **filters) -> tuple[list, Optional[int]]:
+        """
+        Una página de resultados de query.
 
+        Returns:
+            (eventos, cursor) — pasar el cursor como after_id para la
+            página siguiente; None si no hay más
+        """
+        events = list(self.query(after_id=after_id, limit=page_size + 1, **filters))
+        if len(events) > page_size:
+            events = events[:page_size]
+            return events, events[-1].event_id
+        return events, None
+
+    def display_events(self, limit: Optional[int] = 50, **filters):
+        """
+        Imprime los eventos que cumplen los filtros (ver query), como
+        máximo `limit` (None = todos).
+        """
+        print("--- REGISTRO DE EVENTOS ---")
+        shown = 0
+        for event in self.query(limit=limit, **filters):
+            print(f"#{event.event_id} [{event.event_time}] - {event.event_type}: {event.event_name}")
+            print(f"  Descripción: {event.event_description}")
+            print("-" * 30)
+            shown += 1
+
+        if not shown:
+            print("No hay eventos registrados.")
+        elif limit is not None and shown == limit:
+            print(f"(mostrando {shown} eventos; usar page()/query() para ver más)")
@@ -0,0 +1,194 @@
+"""
+Caché de respuestas del LLM direccionada por contenido.
+
+Implementa la interfaz `BaseCache` de LangChain, de modo que basta con
+asignarla a `llm.cache` para que todas las llamadas que pasan por el LLM
+compartido del orquestador (router, ejecución directa y diagnóstico)
+reutilicen respuestas idénticas en lugar de volver a pagar al proveedor.
+
+Niveles:
+- Memoria: LRU acotado (OrderedDict) con TTL
+- Disco (opcional): SQLite en modo WAL que sobrevive a reinicios
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+
+class ResponseCache(BaseCache):
+    """
+    Caché LRU en memoria con nivel SQLite opcional y expiración por TTL.
+
+    La clave es un hash SHA-256 sobre el `llm_string` (modelo y parámetros
+    como la temperatura) y el prompt completo (mensajes serializados).
+
+    Ejemplo de uso:
+        >>> cache = ResponseCache(max_entries=2048, ttl_seconds=3600,
+        ...                       sqlite_path="llm_cache.db")
+        >>> orchestrator = AutopoieticOrchestrator(response_cache=cache)
+        >>> cache.stats()
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        sqlite_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_entries: Entradas máximas del nivel en memoria
+            ttl_seconds: Vida de cada entrada (None = sin expiración)
+            sqlite_path: Ruta del fichero SQLite para el nivel persistente
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+
+        # clave -> (instante de escritura, generaciones)
+        self._memory: OrderedDict[str, tuple[float, RETURN_VAL_TYPE]] = OrderedDict()
+        # El lock del LRU nunca se retiene durante la E/S de SQLite, que
+        # tiene el suyo (la conexión se comparte entre hilos)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " created_at REAL NOT NULL,"
+                " value TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Hash estable sobre modelo+parámetros y prompt."""
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Busca primero en memoria y después en disco."""
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        row = None
+        with self._db_lock:
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created_at, value FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+        if row is not None:
+            created_at, raw = row
+            if not self._expired(created_at):
+                value = loads(raw)
+                with self._lock:
+                    self._remember(key, created_at, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+            with self._db_lock:
+                if self._conn is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _cacheable(return_val: RETURN_VAL_TYPE) -> bool:
+        """
+        Solo se guardan respuestas con contenido: una generación vacía (sin
+        texto ni tool_calls) se serviría para siempre en lugar de reintentar.
+        Los fallos del proveedor no llegan aquí: se propagan como excepción.
+        """
+        if not return_val:
+            return False
+        for generation in return_val:
+            if not generation.text and not getattr(getattr(generation, "message", None), "tool_calls", None):
+                return False
+        return True
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Guarda la respuesta en ambos niveles (si es cacheable)."""
+        if not self._cacheable(return_val):
+            return
+        key = self.make_key(prompt, llm_string)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, return_val)
+        if self._conn is None:
+            return
+        raw = dumps(list(return_val))
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, created_at, value) VALUES (?, ?, ?)",
+                    (key, created_at, raw),
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, created_at: float, value: RETURN_VAL_TYPE) -> None:
+        """Inserta en el LRU en memoria, expulsando la entrada más antigua."""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Vacía ambos niveles (los contadores se conservan)."""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos y ocupación actual."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self) -> None:
+        """Cierra la conexión SQLite."""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,372 @@
+"""
+Clasificador local de enrutamiento.
+
+La mayor parte del tráfico es EJECUCION_DIRECTA rutinaria, así que pagar
+una llamada al LLM del router por cada mensaje es caro. Este módulo
+entrena, a partir del registro de decisiones del router (DecisionLog), un
+modelo lineal pequeño sobre n-gramas con hashing que predice `route` y
+`task_complexity`; cuando su confianza supera un umbral, MetaAgentRouter
+usa su predicción y omite el LLM.
+
+Componentes:
+- hash_features: n-gramas de palabras y de caracteres -> vector disperso
+- DecisionLog: registro JSONL de decisiones (etiquetas de entrenamiento)
+- RoutingClassifier: regresión logística (ruta) + regresión lineal
+  (complejidad) en NumPy, con guardado/carga en .npz
+
+Uso (entrenamiento e informe):
+    python src/routing_classifier.py train --log router_decisions.jsonl --out router_classifier.npz
+    python src/routing_classifier.py report --log router_decisions.jsonl
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+
+from orchestrator_state import RouterDecision
+
+
+ROUTES = ("EJECUCION_DIRECTA", "DIAGNOSTICO_ESTRUCTURAL")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Decisiones mínimas en el lado de entrenamiento para validar con holdout
+MIN_TRAINING_RECORDS = 10
+
+
+def hash_features(text: str, n_features: int = 2 ** 18) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extrae n-gramas (palabras 1-2 y caracteres 3) con el truco del hashing.
+
+    Se usa crc32 en lugar de hash() para que los índices sean estables
+    entre procesos (el modelo se entrena y se usa en ejecuciones distintas).
+
+    Returns:
+        (índices, valores) del vector disperso, normalizado L2
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    grams = [f"w:{token}" for token in tokens]
+    grams += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f" {token} "
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    hashed = np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) % n_features for gram in grams),
+        dtype=np.int64,
+        count=len(grams),
+    )
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = counts.astype(np.float32)
+    values /= np.linalg.norm(values)
+    return indices, values
+
+
+class DecisionLog:
+    """
+    Registro append-only (JSONL) de decisiones del router.
+
+    Cada línea: {"ts", "task", "route", "task_complexity", "source"}, donde
+    `source` es "llm" o "classifier". Solo las decisiones del LLM se usan
+    como etiquetas de entrenamiento.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def append(self, task: str, decision: RouterDecision, source: str = "llm") -> None:
+        """Añade una decisión al registro."""
+        record = {
+            "ts": time.time(),
+            "task": task,
+            "route": decision.route,
+            "task_complexity": decision.task_complexity,
+            "source": source,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+
+    def read(self, source: Optional[str] = "llm") -> Iterator[dict]:
+        """
+        Recorre las decisiones registradas (filtradas por `source`).
+        """
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if source is None or record.get("source") == source:
+                    yield record
+
+
+class RoutingClassifier:
+    """
+    Modelo lineal sobre características con hashing.
+
+    - Ruta: regresión logística binaria, P(DIAGNOSTICO_ESTRUCTURAL)
+    - Complejidad: regresión lineal (ridge) recortada a [0, 1]
+
+    El entrenamiento es descenso de gradiente por lotes completos,
+    vectorizado con np.bincount sobre la representación dispersa, de modo
+    que decenas de miles de decisiones se entrenan en segundos.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18):
+        self.n_features = n_features
+        self.route_weights = np.zeros(n_features, dtype=np.float32)
+        self.route_bias = 0.0
+        self.complexity_weights = np.zeros(n_features, dtype=np.float32)
+        self.complexity_bias = 0.0
+        self.trained_samples = 0
+
+    def _featurize(self, tasks: Sequence[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Concatena los vectores dispersos: (fila, índice, valor)."""
+        rows, indices, values = [], [], []
+        for row, task in enumerate(tasks):
+            idx, val = hash_features(task, self.n_features)
+            rows.append(np.full(idx.shape[0], row, dtype=np.int64))
+            indices.append(idx)
+            values.append(val)
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(indices), np.concatenate(values)
+
+    def fit(
+        self,
+        tasks: Sequence[str],
+        routes: Sequence[str],
+        complexities: Sequence[float],
+        epochs: int = 300,
+        learning_rate: float = 2.0,
+        regression_learning_rate: float = 0.5,
+        l2: float = 1e-4,
+    ) -> "RoutingClassifier":
+        """
+        Entrena ambos modelos sobre decisiones etiquetadas por el LLM.
+        
+        La pérdida cuadrática de la complejidad tiene más curvatura que la
+        logística, de ahí su tasa de aprendizaje menor.
+        """
+        n = len(tasks)
+        if n == 0:
+            raise ValueError("No hay decisiones para entrenar el clasificador")
+
+        rows, indices, values = self._featurize(tasks)
+        y_route = np.array([route == ROUTES[1] for route in routes], dtype=np.float32)
+        y_complexity = np.asarray(complexities, dtype=np.float32)
+
+        w_route = np.zeros(self.n_features, dtype=np.float32)
+        w_complexity = np.zeros(self.n_features, dtype=np.float32)
+        # Sesgos iniciales en la media: converge antes con clases desbalanceadas
+        positive_rate = float(np.clip(y_route.mean(), 1e-3, 1 - 1e-3))
+        b_route = float(np.log(positive_rate / (1 - positive_rate)))
+        b_complexity = float(y_complexity.mean())
+
+        for _ in range(epochs):
+            logits = np.bincount(rows, weights=w_route[indices] * values, minlength=n) + b_route
+            error = 1.0 / (1.0 + np.exp(-logits)) - y_route
+            grad = np.bincount(indices, weights=error[rows] * values, minlength=self.n_features) / n
+            w_route -= learning_rate * (grad + l2 * w_route)
+            b_route -= learning_rate * float(error.mean())
+
+            predicted = np.bincount(rows, weights=w_complexity[indices] * values, minlength=n) + b_complexity
+            residual = predicted - y_complexity
+            grad = np.bincount(indices, weights=residual[rows] * values, minlength=self.n_features) / n
+            w_complexity -= regression_learning_rate * (grad + l2 * w_complexity)
+            b_complexity -= regression_learning_rate * float(residual.mean())
+
+        self.route_weights = w_route.astype(np.float32)
+        self.route_bias = b_route
+        self.complexity_weights = w_complexity.astype(np.float32)
+        self.complexity_bias = b_complexity
+        self.trained_samples = n
+        return self
+
+    def predict(self, task: str) -> tuple[str, float, float]:
+        """
+        Predice la ruta de una tarea.
+
+        Returns:
+            (ruta, confianza en [0.5, 1], complejidad en [0, 1])
+        """
+        indices, values = hash_features(task, self.n_features)
+        logit = float(self.route_weights[indices] @ values) + self.route_bias
+        p_structural = 1.0 / (1.0 + np.exp(-logit))
+        complexity = float(self.complexity_weights[indices] @ values) + self.complexity_bias
+
+        route = ROUTES[1] if p_structural >= 0.5 else ROUTES[0]
+        confidence = max(p_structural, 1.0 - p_structural)
+        return route, float(confidence), float(np.clip(complexity, 0.0, 1.0))
+
+    def decide(self, task: str, threshold: float) -> Optional[RouterDecision]:
+        """
+        RouterDecision si la confianza alcanza el umbral; None si no.
+        """
+        route, confidence, complexity = self.predict(task)
+        if confidence < threshold:
+            return None
+        return RouterDecision(
+            route=route,
+            reasoning=f"Clasificador local (confianza {confidence:.2f})",
+            task_complexity=complexity,
+            requires_new_agent=route == ROUTES[1],
+        )
+
+    def save(self, path: str) -> None:
+        """Guarda el modelo en un .npz comprimido."""
+        np.savez_compressed(
+            path,
+            route_weights=self.route_weights,
+            complexity_weights=self.complexity_weights,
+            meta=np.array(json.dumps({
+                "n_features": self.n_features,
+                "route_bias": self.route_bias,
+                "complexity_bias": self.complexity_bias,
+                "trained_samples": self.trained_samples,
+            })),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoutingClassifier":
+        """Carga un modelo guardado con save."""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            model = cls(n_features=meta["n_features"])
+            model.route_weights = data["route_weights"]
+            model.complexity_weights = data["complexity_weights"]
+        model.route_bias = meta["route_bias"]
+        model.complexity_bias = meta["complexity_bias"]
+        model.trained_samples = meta["trained_samples"]
+        return model
+
+
+def evaluate(
+    model: RoutingClassifier,
+    records: Sequence[dict],
+    thresholds: Sequence[float] = (0.6, 0.7, 0.8, 0.9, 0.95, 0.99),
+) -> list[dict]:
+    """
+    Tasa de omisión del LLM frente a acuerdo con él, por umbral.
+
+    Returns:
+        Una fila por umbral: skip_rate (fracción de tareas que el
+        clasificador resolvería), agreement (acierto de ruta en esas
+        tareas) y complexity_mae (error absoluto medio en esas tareas)
+    """
+    predictions = [model.predict(record["task"]) for record in records]
+    rows = []
+    for threshold in thresholds:
+        skipped = [
+            (prediction, record)
+            for prediction, record in zip(predictions, records)
+            if prediction[1] >= threshold
+        ]
+        agree = sum(1 for (route, _, _), record in skipped if route == record["route"])
+        mae = (
+            sum(abs(complexity - record["task_complexity"]) for (_, _, complexity), record in skipped)
+            / len(skipped) if skipped else 0.0
+        )
+        rows.append({
+            "threshold": threshold,
+            "skip_rate": len(skipped) / len(records) if records else 0.0,
+            "agreement": agree / len(skipped) if skipped else 1.0,
+            "complexity_mae": mae,
+        })
+    return rows
+
+
+def _split(records: list[dict], holdout: float) -> tuple[list[dict], list[dict]]:
+    """
+    Separación temporal: las decisiones más recientes quedan para validar.
+
+    Si el lado de entrenamiento quedaría por debajo de
+    MIN_TRAINING_RECORDS (o el de validación vacío), no se separa: todas
+    las decisiones van a entrenamiento y la validación queda vacía.
+    """
+    cut = int(len(records) * (1 - holdout))
+    if cut < MIN_TRAINING_RECORDS or cut >= len(records):
+        return records, []
+    return records[:cut], records[cut:]
+
+
+def _train(records: list[dict], n_features: int) -> RoutingClassifier:
+    return RoutingClassifier(n_features=n_features).fit(
+        [record["task"] for record in records],
+        [record["route"] for record in records],
+        [record["task_complexity"] for record in records],
+    )
+
+
+def _print_report(rows: list[dict], samples: int) -> None:
+    print(f"\n📊 Validación sobre {samples} decisiones del LLM")
+    print("-" * 80)
+    print(f"{'umbral':>8} {'omisión LLM':>12} {'acuerdo':>10} {'MAE complejidad':>16}")
+    for row in rows:
+        print(
+            f"{row['threshold']:>8.2f} {row['skip_rate']:>12.1%} "
+            f"{row['agreement']:>10.1%} {row['complexity_mae']:>16.3f}"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Clasificador local de enrutamiento")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--log", required=True, help="Registro JSONL de decisiones del router")
+    parser.add_argument("--out", default="router_classifier.npz", help="Ruta del modelo exportado (train)")
+    parser.add_argument("--model", help="Modelo ya entrenado a evaluar (report)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fracción reservada para validación")
+    parser.add_argument("--n-features", type=int, default=2 ** 18)
+    args = parser.parse_args(argv)
+
+    records = list(DecisionLog(args.log).read(source="llm"))
+    if not records:
+        raise SystemExit(f"❌ No hay decisiones del LLM en {args.log}")
+
+    if args.command == "train":
+        train, holdout = _split(records, args.holdout)
+        if holdout:
+            _print_report(evaluate(_train(train, args.n_features), holdout), len(holdout))
+        else:
+            print(
+                f"⚠️  Solo {len(records)} decisiones: se omite la validación "
+                f"(hacen falta {MIN_TRAINING_RECORDS} para entrenar y al menos una para validar)"
+            )
+        # El modelo exportado se entrena con todas las decisiones
+        model = _train(records, args.n_features)
+        model.save(args.out)
+        print(f"\n✅ Modelo entrenado con {len(records)} decisiones -> {args.out}")
+    else:
+        if args.model:
+            model, holdout = RoutingClassifier.load(args.model), records
+        else:
+            train, holdout = _split(records, args.holdout)
+            if not holdout:
+                raise SystemExit(
+                    f"❌ Solo {len(records)} decisiones: hacen falta {MIN_TRAINING_RECORDS} para "
+                    f"entrenar y al menos una para validar (o usar --model)"
+                )
+            model = _train(train, args.n_features)
+        _print_report(evaluate(model, holdout), len(holdout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Caché semántica de decisiones del router.
+
+Evita una ronda completa al LLM del router cuando llega una tarea casi
+idéntica (parafraseada) a otra enrutada recientemente: se calcula el
+embedding de la tarea, se busca el vecino más cercano en un índice
+vectorial en memoria y, si la similitud supera el umbral y el catálogo
+no ha cambiado, se reutiliza su RouterDecision.
+"""
+
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from orchestrator_state import RouterDecision
+
+
+class SemanticDecisionCache:
+    """
+    Índice vectorial acotado (matriz NumPy normalizada) de decisiones del router.
+
+    Las entradas se guardan en un buffer circular de `max_entries` filas;
+    la búsqueda es un único producto matriz-vector sobre las filas ocupadas.
+    Cuando cambia la versión del catálogo de agentes, la caché se vacía:
+    una decisión tomada con otro catálogo puede dejar de ser válida.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.92,
+        max_entries: int = 1024,
+    ):
+        """
+        Args:
+            embeddings: Modelo de embeddings (e.g. CloudflareEmbeddings bge-small)
+            threshold: Similitud coseno mínima para reutilizar una decisión
+            max_entries: Decisiones máximas retenidas
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self._vectors: Optional[np.ndarray] = None
+        self._decisions: list[Optional[RouterDecision]] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._catalog_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def embed(self, task: str) -> np.ndarray:
+        """Embedding normalizado de la tarea."""
+        return self._normalize(self.embeddings.embed_query(task))
+
+    async def aembed(self, task: str) -> np.ndarray:
+        """Versión asíncrona de embed."""
+        return self._normalize(await self.embeddings.aembed_query(task))
+
+    def _sync_version(self, catalog_version: int) -> None:
+        """Invalida todas las entradas si el catálogo ha cambiado."""
+        if self._catalog_version != catalog_version:
+            self._catalog_version = catalog_version
+            self._size = 0
+            self._next = 0
+            self._decisions = [None] * self.max_entries
+
+    def lookup(self, vector: np.ndarray, catalog_version: int) -> Optional[RouterDecision]:
+        """
+        Devuelve la decisión del vecino más cercano si supera el umbral.
+        """
+        with self._lock:
+            self._sync_version(catalog_version)
+            if self._size == 0 or self._vectors is None:
+                self.misses += 1
+                return None
+
+            scores = self._vectors[: self._size] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                self.hits += 1
+                return self._decisions[best]
+
+            self.misses += 1
+            return None
+
+    def store(self, vector: np.ndarray, decision: RouterDecision, catalog_version: int) -> None:
+        """
+        Registra una decisión del router para la tarea cuyo embedding es `vector`.
+        """
+        with self._lock:
+            self._sync_version(catalog_version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            self._vectors[self._next] = vector
+            self._decisions[self._next] = decision
+            self._next = (self._next + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos y ocupación."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+            "catalog_version": self._catalog_version,
+        }
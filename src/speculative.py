@@ -0,0 +1,306 @@
+"""
+Ejecución directa especulativa.
+
+Sin especulación cada petición paga la latencia del router y después la de
+la ejecución, una detrás de otra. En modo especulativo, mientras el router
+decide, ya se ejecuta la tarea con el agente que DirectExecutionNode
+elegiría; si el router confirma EJECUCION_DIRECTA (y el catálogo no ha
+cambiado) se usa esa respuesta, y si no se cancela y sus tokens se cobran
+como desperdicio (nodo "speculation" de `request_cost`, o de `thread_cost`
+si la especulación sigue en vuelo cuando la petición termina).
+
+La mayor parte del tráfico es ejecución directa, así que la latencia
+percibida pasa de router + ejecución a max(router, ejecución).
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from orchestrator_state import OrchestratorState, AgentSpec
+from meta_agent_router import MetaAgentRouter
+from execution_nodes import DirectExecutionNode, _latest_user_task, _thread_id, _wants_tokens
+from deadline import resolve_deadline
+
+
+class SpeculationStats:
+    """
+    Contadores de la especulación, para decidir si compensa activarla.
+
+    - hits: respuestas especulativas aprovechadas
+    - misses: especulaciones descartadas (el router eligió otra ruta o
+      cambió el catálogo)
+    - wasted_tokens: tokens (prompt + respuesta) de las especulaciones
+      descartadas, los del proveedor si los reporta
+    - uncancelled: especulaciones descartadas en la ruta síncrona cuyo
+      hilo ya había empezado; un hilo no se puede interrumpir, así que la
+      llamada al proveedor termina igualmente (y se paga entera)
+    - skipped: peticiones sin especulación (e.g. streaming de tokens)
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+        self.uncancelled = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self, wasted_tokens: int) -> None:
+        with self._lock:
+            self.misses += 1
+            self.wasted_tokens += wasted_tokens
+
+    def record_uncancelled(self) -> None:
+        with self._lock:
+            self.uncancelled += 1
+
+    def record_skip(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / attempts if attempts else 0.0,
+                "wasted_tokens": self.wasted_tokens,
+                "wasted_tokens_per_miss": self.wasted_tokens / self.misses if self.misses else 0.0,
+                "uncancelled": self.uncancelled,
+                "skipped": self.skipped,
+            }
+
+
+class SpeculativeRouterNode:
+    """
+    Nodo de routing que solapa la decisión del router con la ejecución directa.
+
+    Sustituye al nodo "router" del grafo. Si la especulación acierta, su
+    actualización ya incluye la respuesta del agente y la ruta "END"; si
+    no, devuelve la decisión del router tal cual y el grafo sigue su curso
+    normal (diagnóstico estructural o ejecución directa).
+
+    Una especulación descartada se cobra: su registro de tokens se añade a
+    `token_usage` con el nodo "speculation" (entra en `request_cost`). En
+    la ruta síncrona, si el hilo ya había empezado no se puede cancelar:
+    la petición no lo espera y sus tokens se cargan al hilo con
+    `on_background_usage` cuando termina (ver SpeculationStats.uncancelled).
+    """
+
+    def __init__(
+        self,
+        router: MetaAgentRouter,
+        direct_executor: DirectExecutionNode,
+        max_workers: int = 4,
+        on_background_usage: Optional[Callable[[Optional[str], list[dict]], None]] = None,
+    ):
+        """
+        Args:
+            router: Meta-Agente Router
+            direct_executor: Nodo de ejecución directa
+            max_workers: Hilos para las ejecuciones especulativas (ruta síncrona)
+            on_background_usage: Se llama con (thread_id, registros de
+                tokens) cuando una especulación descartada que no se pudo
+                cancelar termina después de su petición
+        """
+        self.router = router
+        self.direct_executor = direct_executor
+        self.max_workers = max_workers
+        self.on_background_usage = on_background_usage
+        self.stats = SpeculationStats()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="speculative",
+                )
+            return self._executor
+
+    def _select_agent(self, task: str, state: OrchestratorState) -> AgentSpec:
+        agent = self.direct_executor._select_agent(task, state)
+        return agent or self.direct_executor.agent_repository.get_agent("general_assistant")
+
+    async def _aselect_agent(self, task: str, state: OrchestratorState) -> AgentSpec:
+        agent = await self.direct_executor._aselect_agent(task, state)
+        return agent or self.direct_executor.agent_repository.get_agent("general_assistant")
+
+    def _is_hit(self, decision: OrchestratorState, agent: AgentSpec, catalog_version: int) -> bool:
+        """
+        La especulación vale si el router eligió ejecución directa y el
+        agente sigue siendo el que se elegiría (mismo catálogo, activo).
+        """
+        return (
+            decision.get("route") == "EJECUCION_DIRECTA"
+            and self.direct_executor.agent_repository.version == catalog_version
+            and agent.active
+        )
+
+    @staticmethod
+    def _merge(decision: OrchestratorState, execution: OrchestratorState) -> OrchestratorState:
+        """
+        Une las actualizaciones parciales del router y de la ejecución.
+        """
+        return {
+            **decision,
+            **execution,
+            "messages": decision.get("messages", []) + execution["messages"],
+            "token_usage": decision.get("token_usage", []) + execution.get("token_usage", []),
+        }
+
+    @staticmethod
+    def _wasted_record(usage: dict) -> dict:
+        """
+        Registro de tokens de una especulación descartada: se cobra, pero
+        su error (si lo tuvo) no es el de la petición.
+        """
+        record = {**usage, "node": "speculation"}
+        record.pop("error", None)
+        return record
+
+    def _count_waste(self, record: Optional[dict]) -> None:
+        self.stats.record_miss(record["prompt_tokens"] + record["completion_tokens"] if record else 0)
+
+    def _record_waste(self, decision: OrchestratorState, record: Optional[dict]) -> OrchestratorState:
+        """Cuenta el desperdicio y lo añade a `token_usage` de la decisión."""
+        self._count_waste(record)
+        if record is None:
+            return decision
+        return {**decision, "token_usage": decision.get("token_usage", []) + [record]}
+
+    def _finished_waste(self, future: Future) -> Optional[dict]:
+        """Registro de una especulación ya terminada (None si falló)."""
+        if future.exception() is not None:
+            return None
+        return self._wasted_record(future.result()[1])
+
+    def _charge_late_waste(self, future: Future, thread_id: Optional[str]) -> None:
+        """
+        Una especulación no cancelable terminó después de su petición: se
+        cuenta y sus tokens se cargan al hilo.
+        """
+        record = self._finished_waste(future)
+        self._count_waste(record)
+        if record is None or self.on_background_usage is None:
+            return
+        try:
+            self.on_background_usage(thread_id, [record])
+        except Exception as e:
+            print(f"⚠️  No se pudo cargar el coste de la especulación: {e}")
+
+    def _prompt_tokens(self, task: str, agent: AgentSpec) -> int:
+        """Tokens del prompt de una especulación cancelada en vuelo."""
+        counter = self.direct_executor.token_budget.counter
+        return counter.count(agent.system_prompt) + counter.count(task)
+
+    def evaluate(
+        self,
+        state: OrchestratorState,
+        config: Optional[RunnableConfig] = None,
+    ) -> OrchestratorState:
+        """
+        Nodo del grafo: router y ejecución directa especulativa en paralelo.
+        
+        Si el router descarta la especulación y su hilo ya empezó, no se
+        puede interrumpir: sigue hasta terminar la llamada al proveedor,
+        la petición no la espera y su coste se carga al hilo al acabar.
+        """
+        if not state.get("messages") or _wants_tokens(config):
+            # Con streaming de tokens no se especula: se emitirían tokens
+            # de una respuesta que aún podría descartarse
+            self.stats.record_skip()
+            return self.router.evaluate_task(state, config)
+
+        task = _latest_user_task(state)
+        agent = self._select_agent(task, state)
+        catalog_version = self.direct_executor.agent_repository.version
+        # Con el contexto de la petición: la llamada hereda sus callbacks
+        # (métricas del proveedor), como la tarea de la ruta asíncrona
+        future: Future = self._get_executor().submit(
+            contextvars.copy_context().run,
+            self.direct_executor._execute_with_agent, task, agent, state,
+            deadline=resolve_deadline(config),
+        )
+
+        decision = self.router.evaluate_task(state, config)
+
+        if self._is_hit(decision, agent, catalog_version):
+            response, usage = future.result()
+            self.stats.record_hit()
+            return self._merge(decision, self.direct_executor._execution_update(agent, response, usage))
+
+        if future.cancel():
+            return self._record_waste(decision, None)
+        if future.done():
+            return self._record_waste(decision, self._finished_waste(future))
+        # Un hilo no se puede interrumpir: la llamada sigue hasta el final
+        # y se cobra al hilo cuando termine
+        self.stats.record_uncancelled()
+        thread_id = _thread_id(config)
+        future.add_done_callback(lambda done: self._charge_late_waste(done, thread_id))
+        return decision
+
+    async def aevaluate(
+        self,
+        state: OrchestratorState,
+        config: Optional[RunnableConfig] = None,
+    ) -> OrchestratorState:
+        """
+        Versión asíncrona de evaluate; una especulación fallida se cancela
+        de verdad (se aborta la petición HTTP en curso).
+        """
+        if not state.get("messages") or _wants_tokens(config):
+            self.stats.record_skip()
+            return await self.router.aevaluate_task(state, config)
+
+        task = _latest_user_task(state)
+        agent = await self._aselect_agent(task, state)
+        catalog_version = self.direct_executor.agent_repository.version
+        speculation = asyncio.create_task(
+            self.direct_executor._aexecute_with_agent(
+                task, agent, state, deadline=resolve_deadline(config)
+            )
+        )
+
+        try:
+            decision = await self.router.aevaluate_task(state, config)
+        except BaseException:
+            speculation.cancel()
+            raise
+
+        if self._is_hit(decision, agent, catalog_version):
+            response, usage = await speculation
+            self.stats.record_hit()
+            return self._merge(decision, self.direct_executor._execution_update(agent, response, usage))
+
+        if speculation.done() and not speculation.cancelled():
+            if speculation.exception() is not None:
+                return self._record_waste(decision, None)
+            return self._record_waste(decision, self._wasted_record(speculation.result()[1]))
+        speculation.cancel()
+        # Cancelada en vuelo: el prompt ya se envió al proveedor (estimación)
+        estimate = self.direct_executor.token_budget.usage(
+            "speculation", self._prompt_tokens(task, agent), agent_id=agent.agent_id
+        )
+        estimate["usage_source"] = "estimate"
+        return self._record_waste(decision, estimate)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Libera el pool de hilos de especulación."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
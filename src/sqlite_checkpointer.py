@@ -0,0 +1,585 @@
+"""
+Checkpointer persistente sobre SQLite con retención acotada.
+
+MemorySaver guarda el estado de todos los hilos en memoria para siempre y
+lo pierde al reiniciar. SqliteCheckpointSaver implementa la misma interfaz
+(BaseCheckpointSaver de LangGraph) sobre un fichero SQLite en modo WAL:
+
+- Serialización compacta: el serde de LangGraph (msgpack) por canal; cada
+  checkpoint solo guarda los canales cuya versión cambió (blobs), no el
+  estado completo. Las referencias checkpoint → (canal, versión) se
+  guardan aparte (checkpoint_blobs) para borrar los blobs huérfanos con
+  una sola consulta, sin deserializar checkpoints
+- Compresión opcional (zlib) de los valores que superan un umbral
+- Retención: máximo de checkpoints por hilo, caducidad de hilos inactivos
+  y tope de tamaño total con expulsión de los hilos menos recientes
+
+Ejemplo de uso:
+    >>> saver = SqliteCheckpointSaver("checkpoints.db", max_checkpoints_per_thread=20,
+    ...                               max_age_seconds=7 * 24 * 3600,
+    ...                               max_total_bytes=512 * 1024 * 1024)
+    >>> orchestrator = AutopoieticOrchestrator(checkpointer=saver)
+"""
+
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, channel)
+);
+CREATE INDEX IF NOT EXISTS checkpoint_blobs_blob
+    ON checkpoint_blobs (thread_id, checkpoint_ns, channel, version);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# Sufijo del tipo serializado para los valores comprimidos
+_ZLIB = "+zlib"
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    BaseCheckpointSaver persistente en SQLite (WAL) con políticas de retención.
+
+    Una sola conexión compartida protegida por un lock: SQLite serializa
+    las escrituras igualmente y así el saver es seguro entre hilos (lotes
+    de invoke_many). Las variantes asíncronas delegan en las síncronas,
+    como hace MemorySaver; las operaciones son locales y cortas.
+    """
+
+    def __init__(
+        self,
+        path: str = "checkpoints.db",
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        compress: bool = True,
+        compress_min_bytes: int = 1024,
+        max_checkpoints_per_thread: Optional[int] = 50,
+        max_age_seconds: Optional[float] = None,
+        max_total_bytes: Optional[int] = None,
+        prune_every: int = 100,
+    ):
+        """
+        Args:
+            path: Fichero SQLite (":memory:" para pruebas)
+            serde: Serializador (por defecto el de LangGraph)
+            compress: Comprimir con zlib los valores grandes
+            compress_min_bytes: Tamaño mínimo para intentar comprimir
+            max_checkpoints_per_thread: Checkpoints conservados por hilo y
+                namespace (el más reciente siempre se conserva)
+            max_age_seconds: Hilos sin actividad durante más tiempo se borran
+            max_total_bytes: Tope de tamaño total; se expulsan primero los
+                hilos con actividad más antigua
+            prune_every: Cada cuántos `put` se aplican la caducidad y el
+                tope de tamaño (el límite por hilo se aplica en cada `put`)
+        """
+        super().__init__(serde=serde)
+        self.path = path
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.max_age_seconds = max_age_seconds
+        self.max_total_bytes = max_total_bytes
+        self.prune_every = prune_every
+
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._backfill_blob_refs()
+
+    ###
+    # Serialización
+    ###
+
+    def _dump(self, value: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if self.compress and len(data) >= self.compress_min_bytes:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                return type_ + _ZLIB, packed
+        return type_, data
+
+    def _load(self, type_: str, data: Optional[bytes]) -> Any:
+        if type_.endswith(_ZLIB):
+            type_, data = type_[: -len(_ZLIB)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    ###
+    # Lectura
+    ###
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = self._conn.execute(
+                "SELECT type, value FROM blobs"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            values[channel] = self._load(row[0], row[1])
+        return values
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list[tuple[str, str, Any]]:
+        rows = self._conn.execute(
+            "SELECT task_id, idx, channel, type, value, task_path FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        rows.sort(key=lambda row: writes_sort_key(row[5], row[0], row[1]))
+        return [(task_id, channel, self._load(type_, value)) for task_id, _, channel, type_, value, _ in rows]
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint_b, metadata_type, metadata_b = row
+        checkpoint = self._load(type_, checkpoint_b)
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self._load(metadata_type, metadata_b),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    _COLUMNS = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Checkpoint indicado en `config` o, si no hay checkpoint_id, el último del hilo.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """
+        Checkpoints que cumplen los criterios, del más reciente al más antiguo.
+        """
+        query = f"SELECT thread_id, checkpoint_ns, {self._COLUMNS} FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self._load(row[4], row[5])
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                item = self._to_tuple(thread_id, checkpoint_ns, tuple(row))
+            yield item
+
+    ###
+    # Escritura
+    ###
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Guarda un checkpoint; solo se escriben los canales con versión nueva.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        copy = checkpoint.copy()
+        values: dict[str, Any] = copy.pop("channel_values")
+
+        blob_rows = []
+        for channel, version in new_versions.items():
+            if channel in values:
+                type_, data = self._dump(values[channel])
+            else:
+                type_, data = "empty", None
+            blob_rows.append((
+                thread_id, checkpoint_ns, channel, str(version),
+                type_, data, len(data) if data else 0,
+            ))
+        type_, checkpoint_b = self._dump(copy)
+        metadata_type, metadata_b = self._dump(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?)", blob_rows
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id, checkpoint_ns, checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_, checkpoint_b, metadata_type, metadata_b,
+                        len(checkpoint_b) + len(metadata_b),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (thread_id, checkpoint_ns, checkpoint["id"], channel, str(version))
+                        for channel, version in checkpoint["channel_versions"].items()
+                    ],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time())
+                )
+                self._trim_thread(thread_id, checkpoint_ns)
+            self._puts += 1
+            if self.prune_every and self._puts % self.prune_every == 0:
+                self._prune()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """
+        Guarda las escrituras pendientes de una tarea.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        inserts, replaces = [], []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            # Las escrituras especiales (índice negativo) se sobrescriben; las
+            # normales no se duplican si la tarea se reintenta
+            (replaces if write_idx < 0 else inserts).append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                write_idx, channel, type_, data, task_path, len(data),
+            ))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", inserts
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", replaces
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Borra todos los checkpoints, blobs y escrituras de un hilo.
+        """
+        with self._lock:
+            with self._conn:
+                self._delete_threads([thread_id])
+
+    ###
+    # Retención
+    ###
+
+    def _delete_threads(self, thread_ids: Sequence[str]) -> None:
+        for table in ("checkpoints", "checkpoint_blobs", "blobs", "writes", "threads"):
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,) for thread_id in thread_ids]
+            )
+
+    def _trim_thread(self, thread_id: str, checkpoint_ns: str) -> None:
+        """
+        Conserva los últimos `max_checkpoints_per_thread` checkpoints del hilo
+        y borra los blobs que ya no referencia ninguno de ellos.
+        """
+        keep = self.max_checkpoints_per_thread
+        if not keep:
+            return
+        stale = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, max(1, keep)),
+        ).fetchall()
+        if not stale:
+            return
+        params = [(thread_id, checkpoint_ns, checkpoint_id) for (checkpoint_id,) in stale]
+        self._conn.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params
+        )
+        self._conn.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params
+        )
+        self._conn.executemany(
+            "DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params
+        )
+        self._conn.execute(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND NOT EXISTS ("
+            " SELECT 1 FROM checkpoint_blobs AS ref"
+            " WHERE ref.thread_id = blobs.thread_id AND ref.checkpoint_ns = blobs.checkpoint_ns"
+            " AND ref.channel = blobs.channel AND ref.version = blobs.version)",
+            (thread_id, checkpoint_ns),
+        )
+
+    def _backfill_blob_refs(self) -> None:
+        """
+        Completa checkpoint_blobs para ficheros creados antes de existir la
+        tabla (se deserializa cada checkpoint una única vez).
+        """
+        if self._conn.execute("SELECT 1 FROM checkpoint_blobs LIMIT 1").fetchone():
+            return
+        rows = self._conn.execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, type, checkpoint FROM checkpoints"
+        ).fetchall()
+        if not rows:
+            return
+        with self._conn:
+            for thread_id, checkpoint_ns, checkpoint_id, type_, checkpoint_b in rows:
+                versions = self._load(type_, checkpoint_b)["channel_versions"]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (thread_id, checkpoint_ns, checkpoint_id, channel, str(version))
+                        for channel, version in versions.items()
+                    ],
+                )
+
+    def _prune(self) -> None:
+        """
+        Aplica la caducidad de hilos inactivos y el tope de tamaño total.
+        """
+        with self._conn:
+            if self.max_age_seconds is not None:
+                cutoff = time.time() - self.max_age_seconds
+                expired = [
+                    thread_id for (thread_id,) in self._conn.execute(
+                        "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,)
+                    )
+                ]
+                if expired:
+                    self._delete_threads(expired)
+
+            if self.max_total_bytes is not None:
+                total = self._total_bytes()
+                if total > self.max_total_bytes:
+                    sizes = dict(self._conn.execute(
+                        "SELECT thread_id, SUM(size) FROM ("
+                        " SELECT thread_id, size FROM checkpoints"
+                        " UNION ALL SELECT thread_id, size FROM blobs"
+                        " UNION ALL SELECT thread_id, size FROM writes)"
+                        " GROUP BY thread_id"
+                    ))
+                    evicted = []
+                    for (thread_id,) in self._conn.execute(
+                        "SELECT thread_id FROM threads ORDER BY updated_at"
+                    ).fetchall():
+                        if total <= self.max_total_bytes:
+                            break
+                        evicted.append(thread_id)
+                        total -= sizes.get(thread_id, 0)
+                    if evicted:
+                        self._delete_threads(evicted)
+
+    def _total_bytes(self) -> int:
+        return sum(
+            self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+            for table in ("checkpoints", "blobs", "writes")
+        )
+
+    def prune(self) -> None:
+        """Fuerza la aplicación de todas las políticas de retención."""
+        with self._lock:
+            self._prune()
+
+    def stats(self) -> dict:
+        """Hilos, checkpoints y bytes almacenados (sin contar índices de SQLite)."""
+        with self._lock:
+            return {
+                "threads": self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0],
+                "checkpoints": self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0],
+                "stored_bytes": self._total_bytes(),
+            }
+
+    def close(self) -> None:
+        """Cierra la conexión SQLite."""
+        with self._lock:
+            self._conn.close()
+
+    ###
+    # Variantes asíncronas (delegan en las síncronas, como MemorySaver)
+    ###
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Versiones ordenables como texto (mismo formato que MemorySaver)."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
@@ -0,0 +1,236 @@
+"""
+Conteo de tokens y presupuesto por petición.
+
+SystemInvariants.BUDGETS["max_tokens_per_request"] limita los tokens de
+cada llamada al LLM (prompt + respuesta). Este módulo:
+
+- Cuenta tokens con tiktoken si está instalado (codificación cacheada) y,
+  si no, con una estimación de ~4 caracteres por token. Los conteos se
+  memoizan: los prompts de sistema estáticos solo se tokenizan una vez
+- TokenBudget recorta las secciones de menor prioridad de un prompt
+  (catálogo, historial, análisis de brecha...) hasta que cabe en el
+  presupuesto, reservando espacio para la respuesta
+- Genera los registros de uso por llamada que los nodos acumulan en
+  `token_usage` del estado
+"""
+
+import math
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Sequence
+
+from orchestrator_state import SystemInvariants
+
+# Sobrecarga aproximada por mensaje de chat (rol, delimitadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Tokens reservados para la respuesta dentro del presupuesto por petición
+DEFAULT_COMPLETION_RESERVE = 1024
+
+# Marca añadida al texto recortado
+TRUNCATION_MARKER = "\n[...recortado por presupuesto de tokens...]"
+
+
+def message_text(message: Any) -> str:
+    """Contenido textual de un mensaje (BaseMessage, dict o str)."""
+    if isinstance(message, dict):
+        content = message.get("content", "")
+    else:
+        content = getattr(message, "content", message)
+    return content if isinstance(content, str) else str(content)
+
+
+class TokenCounter:
+    """
+    Contador de tokens con tokenizador opcional.
+
+    Usa tiktoken (codificación del modelo o cl100k_base) si está
+    disponible; si no, ~4 caracteres por token. `count` está memoizado
+    con un LRU por texto.
+    """
+
+    def __init__(self, model_name: str = "gpt-4", cache_size: int = 4096):
+        self.model_name = model_name
+        self.encoding = self._load_encoding(model_name)
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @staticmethod
+    def _load_encoding(model_name: str) -> Optional[Any]:
+        try:
+            import tiktoken
+        except ImportError:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Sin red no se pueden descargar las tablas del tokenizador
+            return None
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 4)
+
+    def count_message(self, message: Any) -> int:
+        """Tokens de un mensaje de chat, sobrecarga incluida."""
+        return self.count(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+    def count_messages(self, messages: Iterable[Any]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Recorta `text` a como máximo `max_tokens` (marca incluida).
+        """
+        if self.count(text) <= max_tokens:
+            return text
+        keep = max_tokens - self.count(TRUNCATION_MARKER)
+        if keep <= 0:
+            return ""
+        if self.encoding is not None:
+            prefix = self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:keep])
+        else:
+            prefix = text[:keep * 4]
+        return prefix + TRUNCATION_MARKER
+
+
+_default_counter: Optional[TokenCounter] = None
+
+
+def default_token_counter() -> TokenCounter:
+    """Contador compartido del proceso (la codificación se carga una vez)."""
+    global _default_counter
+    if _default_counter is None:
+        _default_counter = TokenCounter()
+    return _default_counter
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens de un texto con el contador por defecto."""
+    return default_token_counter().count(text) if text else 0
+
+
+def message_tokens(message: Any) -> int:
+    """Tokens de un mensaje de chat con el contador por defecto."""
+    return default_token_counter().count_message(message)
+
+
+class TokenBudget:
+    """
+    Presupuesto de tokens por llamada al LLM.
+
+    `prompt_budget` = max_tokens - completion_reserve. `fit` recorta las
+    secciones recortables de un prompt, de menor a mayor prioridad, hasta
+    que el total cabe.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        completion_reserve: int = DEFAULT_COMPLETION_RESERVE,
+        counter: Optional[TokenCounter] = None,
+    ):
+        """
+        Args:
+            max_tokens: Tokens por petición (por defecto
+                SystemInvariants.BUDGETS["max_tokens_per_request"])
+            completion_reserve: Tokens reservados para la respuesta
+            counter: Contador (por defecto el compartido del proceso)
+        """
+        self.max_tokens = max_tokens or SystemInvariants.BUDGETS["max_tokens_per_request"]
+        self.completion_reserve = min(completion_reserve, self.max_tokens // 2)
+        self.prompt_budget = self.max_tokens - self.completion_reserve
+        self.counter = counter or default_token_counter()
+
+    def limit_completion(self, llm: Any) -> Any:
+        """
+        El LLM con la respuesta limitada a `completion_reserve`, para que el
+        proveedor respete la misma reserva que el presupuesto del prompt.
+
+        Si el modelo tiene campo `max_tokens` (ChatOpenAI, CloudflareLLM)
+        se usa una copia con ese límite, que conserva with_structured_output;
+        si no, se enlaza `max_tokens` a cada llamada con `bind`. Un límite
+        menor ya configurado se respeta.
+        """
+        if "max_tokens" in getattr(type(llm), "model_fields", {}):
+            current = getattr(llm, "max_tokens", None)
+            if current is not None and current <= self.completion_reserve:
+                return llm
+            return llm.model_copy(update={"max_tokens": self.completion_reserve})
+        if hasattr(llm, "bind"):
+            return llm.bind(max_tokens=self.completion_reserve)
+        return llm
+
+    def fit(
+        self,
+        sections: Sequence[tuple[str, str]],
+        trim_order: Sequence[str],
+        reserved: int = 0,
+    ) -> tuple[dict[str, str], list[str], int]:
+        """
+        Ajusta las secciones de un prompt al presupuesto.
+
+        Args:
+            sections: (nombre, texto) de cada sección del prompt
+            trim_order: Secciones recortables, de menor a mayor prioridad;
+                las demás se envían siempre completas
+            reserved: Tokens ya ocupados fuera de las secciones (e.g.
+                historial ya ajustado, sobrecarga de mensajes)
+
+        Returns:
+            (textos por sección, secciones recortadas, tokens totales)
+        """
+        texts = dict(sections)
+        counts = {name: self.counter.count(text) for name, text in sections}
+        total = reserved + sum(counts.values())
+        trimmed = []
+        for name in trim_order:
+            overflow = total - self.prompt_budget
+            if overflow <= 0:
+                break
+            if not counts.get(name):
+                continue
+            texts[name] = self.counter.truncate(texts[name], max(0, counts[name] - overflow))
+            new_count = self.counter.count(texts[name])
+            total -= counts[name] - new_count
+            counts[name] = new_count
+            trimmed.append(name)
+        return texts, trimmed, total
+
+    def usage(
+        self,
+        node: str,
+        prompt_tokens: int,
+        completion: Any = None,
+        trimmed: Sequence[str] = (),
+        error: bool = False,
+        agent_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Registro de uso de una llamada para `token_usage` del estado.
+
+        Args:
+            completion: Respuesta (texto o mensaje) o tokens ya contados
+            error: Si la llamada falló o venció el plazo (la petición cuenta
+                como error en las métricas de viabilidad)
+            agent_id: Agente que respondió (para agregar el coste por agente)
+        """
+        if isinstance(completion, int):
+            completion_tokens = completion
+        else:
+            completion_tokens = self.counter.count(message_text(completion)) if completion is not None else 0
+        record = {
+            "node": node,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        if agent_id:
+            record["agent_id"] = agent_id
+        if trimmed:
+            record["trimmed"] = list(trimmed)
+        if error:
+            record["error"] = True
+        return record
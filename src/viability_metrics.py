@@ -0,0 +1,194 @@
+"""
+Métricas de viabilidad en vivo (núcleo K).
+
+ViabilityMonitor registra cada petición del orquestador (latencia, error,
+coste, tokens y ruta) en buffers circulares NumPy de tamaño fijo:
+
+- `record` es O(1) y no reserva memoria: escribe una posición de cada
+  buffer y avanza el cursor
+- `snapshot` calcula sobre la ventana (las últimas `window_size`
+  peticiones) los percentiles p50/p95/p99 de latencia, la tasa de error
+  y el coste medio, construye un ViabilityMetrics y lo valida con
+  SystemInvariants. El resultado se cachea hasta el siguiente registro
+
+El orquestador inyecta la instantánea en `viability_kpis` del estado y el
+router incluye en su prompt una versión por bandas (format_kpis): así el
+prompt solo cambia cuando un KPI cambia de banda y la caché de respuestas
+sigue acertando.
+"""
+
+import threading
+from typing import Optional
+
+import numpy as np
+
+from orchestrator_state import SystemInvariants, ViabilityMetrics
+
+# Fracción de max_latency_ms por debajo de la cual la latencia es "holgada"
+LATENCY_SLACK_FRACTION = 0.5
+# Tasas de diagnóstico que separan las bandas baja / moderada / alta
+DIAGNOSIS_RATE_BANDS = (0.1, 0.5)
+
+# Códigos de ruta en el buffer de rutas
+ROUTE_CODES = {
+    "EJECUCION_DIRECTA": 1,
+    "DIAGNOSTICO_ESTRUCTURAL": 2,
+}
+
+
+class ViabilityMonitor:
+    """
+    Ventana deslizante de métricas por petición sobre buffers circulares.
+    """
+
+    def __init__(self, window_size: int = 1024):
+        """
+        Args:
+            window_size: Peticiones que cubre la ventana
+        """
+        if window_size < 1:
+            raise ValueError("window_size debe ser >= 1")
+        self.window_size = window_size
+        self._latency_ms = np.zeros(window_size, dtype=np.float64)
+        self._cost = np.zeros(window_size, dtype=np.float64)
+        self._tokens = np.zeros(window_size, dtype=np.int64)
+        self._error = np.zeros(window_size, dtype=np.bool_)
+        self._route = np.zeros(window_size, dtype=np.int8)
+        self._cursor = 0
+        self._total = 0
+        self._snapshot: Optional[dict] = None
+        self._snapshot_total = -1
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        latency_ms: float,
+        error: bool = False,
+        cost: float = 0.0,
+        tokens: int = 0,
+        route: Optional[str] = None,
+    ) -> None:
+        """Registra una petición terminada (O(1), sin reservar memoria)."""
+        with self._lock:
+            i = self._cursor
+            self._latency_ms[i] = latency_ms
+            self._error[i] = error
+            self._cost[i] = cost
+            self._tokens[i] = tokens
+            self._route[i] = ROUTE_CODES.get(route, 0)
+            self._cursor = i + 1 if i + 1 < self.window_size else 0
+            self._total += 1
+
+    @property
+    def total_requests(self) -> int:
+        """Peticiones registradas desde el inicio (no solo la ventana)."""
+        return self._total
+
+    def metrics(self) -> Optional[ViabilityMetrics]:
+        """
+        ViabilityMetrics de la ventana, o None si aún no hay peticiones.
+
+        Sin etiquetas de calidad, `accuracy` se aproxima como 1 - tasa de
+        error; `latency_ms` es el p95 de la ventana.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        return ViabilityMetrics(**{key: snapshot[key] for key in ViabilityMetrics.model_fields})
+
+    def snapshot(self) -> Optional[dict]:
+        """
+        KPIs de la ventana para `viability_kpis` del estado (None si aún no
+        hay peticiones). Se recalcula solo si hubo registros nuevos.
+        """
+        with self._lock:
+            if self._snapshot_total == self._total:
+                return self._snapshot
+            count = min(self._total, self.window_size)
+            total = self._total
+            if count == 0:
+                return None
+            latency = self._latency_ms[:count].copy()
+            error_rate = float(self._error[:count].mean())
+            cost = float(self._cost[:count].mean())
+            tokens = float(self._tokens[:count].mean())
+            routes = np.bincount(self._route[:count], minlength=3)
+
+        p50, p95, p99 = (float(value) for value in np.percentile(latency, (50, 95, 99)))
+        metrics = ViabilityMetrics(
+            accuracy=1.0 - error_rate,
+            latency_ms=p95,
+            cost_per_request=cost,
+            error_rate=error_rate,
+            within_viability=True,
+        )
+        metrics.within_viability = SystemInvariants.validate_invariants(metrics)
+        snapshot = {
+            **metrics.model_dump(),
+            "window": count,
+            "latency_p50_ms": p50,
+            "latency_p95_ms": p95,
+            "latency_p99_ms": p99,
+            "tokens_per_request": tokens,
+            "diagnosis_rate": float(routes[ROUTE_CODES["DIAGNOSTICO_ESTRUCTURAL"]]) / count,
+        }
+        with self._lock:
+            # Otro hilo pudo calcular una instantánea más reciente
+            if total > self._snapshot_total:
+                self._snapshot = snapshot
+                self._snapshot_total = total
+        return snapshot
+
+    def reset(self) -> None:
+        """Vacía la ventana."""
+        with self._lock:
+            self._cursor = 0
+            self._total = 0
+            self._snapshot = None
+            self._snapshot_total = -1
+
+
+def format_kpis(kpis: Optional[dict]) -> str:
+    """
+    Bloque de texto con los KPIs para el prompt del router ("" si no hay).
+
+    Solo incluye bandas (dentro/fuera del núcleo, latencia holgada /
+    ajustada / excedida...), no los valores en vivo ni el tamaño de la
+    ventana: un prompt distinto en cada petición anularía la caché de
+    respuestas del router.
+    """
+    if not kpis:
+        return ""
+    max_latency_ms = SystemInvariants.BUDGETS["max_latency_ms"]
+    if kpis["latency_p95_ms"] <= max_latency_ms * LATENCY_SLACK_FRACTION:
+        latency = "holgada"
+    elif kpis["latency_p95_ms"] <= max_latency_ms:
+        latency = "ajustada"
+    else:
+        latency = "excedida"
+    error_rate = (
+        "dentro del umbral"
+        if kpis["error_rate"] <= SystemInvariants.QUALITY_THRESHOLDS["max_hallucination_rate"]
+        else "por encima del umbral"
+    )
+    cost = (
+        "dentro del presupuesto"
+        if kpis["cost_per_request"] <= SystemInvariants.BUDGETS["max_cost_per_request"]
+        else "por encima del presupuesto"
+    )
+    low, high = DIAGNOSIS_RATE_BANDS
+    if kpis["diagnosis_rate"] < low:
+        diagnosis = "baja"
+    elif kpis["diagnosis_rate"] < high:
+        diagnosis = "moderada"
+    else:
+        diagnosis = "alta"
+    status = "sí" if kpis["within_viability"] else "NO"
+    return (
+        "## KPIs DE VIABILIDAD (peticiones recientes)\n"
+        f"- Latencia p95: {latency} (máx. {max_latency_ms} ms)\n"
+        f"- Tasa de error: {error_rate}\n"
+        f"- Coste por petición: {cost}\n"
+        f"- Tasa de diagnósticos estructurales: {diagnosis}\n"
+        f"- Dentro del núcleo de viabilidad: {status}"
+    )
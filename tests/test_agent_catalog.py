@@ -0,0 +1,96 @@
+"""
+AgentRepository: índice invertido por capacidad y vistas del catálogo
+memoizadas por versión.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from agent_repository import AgentRepository  # noqa: E402
+from orchestrator_state import AgentSpec  # noqa: E402
+
+
+def _spec(agent_id: str, capabilities: list[str], active: bool = True) -> AgentSpec:
+    return AgentSpec(
+        agent_id=agent_id, role="rol", capabilities=capabilities, tools=[],
+        system_prompt="p", version="1", active=active,
+    )
+
+
+def _ids(specs) -> list[str]:
+    return [spec.agent_id for spec in specs]
+
+
+def test_capability_index_follows_updates_and_deactivation():
+    repo = AgentRepository()
+    repo.add_agent(_spec("lector", ["leer", "resumir"]))
+    assert _ids(repo.find_agent_by_capability("leer")) == ["lector"]
+
+    repo.update_agent("lector", {"capabilities": ["traducir"]})
+    assert repo.find_agent_by_capability("leer") == []
+    assert _ids(repo.find_agent_by_capability("traducir")) == ["lector"]
+
+    repo.deactivate_agent("lector")
+    assert repo.find_agent_by_capability("traducir") == []
+    assert "lector" not in _ids(repo.get_all_agents())
+
+
+def test_readding_an_agent_replaces_its_index_entries():
+    repo = AgentRepository()
+    repo.add_agent(_spec("lector", ["leer"]))
+    repo.add_agent(_spec("lector", ["escribir"]))
+    assert repo.find_agent_by_capability("leer") == []
+    assert _ids(repo.find_agent_by_capability("escribir")) == ["lector"]
+
+    repo.add_agent(_spec("lector", ["escribir"], active=False))
+    assert repo.find_agent_by_capability("escribir") == []
+
+
+def test_version_changes_only_on_effective_changes():
+    repo = AgentRepository()
+    version = repo.version
+    assert repo.update_agent("general_assistant", {"role": repo.get_agent("general_assistant").role})
+    assert repo.version == version
+    assert not repo.update_agent("no_existe", {"role": "x"})
+    assert repo.version == version
+
+    repo.update_agent("general_assistant", {"role": "otro"})
+    assert repo.version == version + 1
+    repo.deactivate_agent("general_assistant")
+    repo.deactivate_agent("general_assistant")
+    assert repo.version == version + 2
+
+
+def test_catalog_summary_is_rebuilt_only_after_a_change():
+    repo = AgentRepository()
+    summary = repo.get_catalog_summary()
+    assert repo.get_catalog_summary() is summary
+
+    repo.add_agent(_spec("nuevo", ["x"]))
+    rebuilt = repo.get_catalog_summary()
+    assert rebuilt is not summary
+    assert "nuevo" in [entry["agent_id"] for entry in rebuilt]
+
+
+def test_cached_view_runs_the_builder_once_per_version():
+    repo = AgentRepository()
+    builds = []
+
+    def builder(r: AgentRepository) -> int:
+        builds.append(r.version)
+        return len(r.get_all_agents())
+
+    assert repo.cached_view("activos", builder) == repo.cached_view("activos", builder)
+    assert len(builds) == 1
+    repo.deactivate_agent("code_analyst")
+    assert repo.cached_view("activos", builder) == len(repo.get_all_agents())
+    assert len(builds) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
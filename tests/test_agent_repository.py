@@ -0,0 +1,111 @@
+"""
+AgentRepository con índice vectorial: embeddings en lote y diferidos a la
+primera búsqueda, y un solo embedding de la tarea por petición.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from agent_index import AgentVectorIndex  # noqa: E402
+from agent_repository import AgentRepository  # noqa: E402
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from orchestrator_state import AgentSpec, RouterDecision  # noqa: E402
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeddings deterministas que registran cada llamada al 'proveedor'."""
+
+    def __init__(self):
+        self.calls: list = []
+
+    def _vector(self, text: str) -> list[float]:
+        lower = text.lower()
+        return [1.0 if "windsurf" in lower else 0.1, 1.0 if "código" in lower else 0.1, 0.5]
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append("q")
+        return self._vector(text)
+
+
+def _spec(agent_id: str, role: str = "rol") -> AgentSpec:
+    return AgentSpec(
+        agent_id=agent_id, role=role, capabilities=["x"], tools=[], system_prompt="p", version="1", active=True
+    )
+
+
+def test_constructor_does_not_call_the_provider():
+    embeddings = CountingEmbeddings()
+    repo = AgentRepository(embeddings=embeddings)
+    repo.add_agent(_spec("extra"))
+    assert embeddings.calls == []
+
+
+def test_first_search_embeds_the_catalog_in_one_batch():
+    embeddings = CountingEmbeddings()
+    repo = AgentRepository(embeddings=embeddings)
+    repo.add_agent(_spec("extra"))
+    matches = repo.search_agents("plan de windsurf", k=1)
+    assert matches[0][0].agent_id == "windsurf_planner"
+    assert embeddings.calls == [len(repo.get_all_agents()), "q"]
+
+    # Solo se recalcula lo que cambia
+    repo.update_agent("extra", {"role": "windsurf pro"})
+    repo.search_agents("windsurf", k=1)
+    assert embeddings.calls[2:] == [1, "q"]
+
+
+def test_precomputed_vector_skips_the_query_embedding():
+    embeddings = CountingEmbeddings()
+    repo = AgentRepository(embeddings=embeddings)
+    vector = AgentVectorIndex(embeddings).embed_query("windsurf")
+    embeddings.calls.clear()
+
+    matches = repo.search_agents("windsurf", k=1, vector=vector.tolist())
+    assert matches[0][0].agent_id == "windsurf_planner"
+    assert "q" not in embeddings.calls
+
+    asyncio.run(repo.asearch_agents("windsurf", k=1, vector=vector))
+    assert "q" not in embeddings.calls
+
+
+def test_deactivated_agents_leave_the_index():
+    repo = AgentRepository(embeddings=CountingEmbeddings())
+    repo.deactivate_agent("windsurf_planner")
+    ids = [spec.agent_id for spec, _ in repo.search_agents("windsurf", k=10)]
+    assert "windsurf_planner" not in ids
+
+
+def test_each_request_embeds_the_task_once():
+    embeddings = CountingEmbeddings()
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta"] * 10), embeddings=embeddings
+    )
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(
+            route="EJECUCION_DIRECTA", reasoning="ok", task_complexity=0.2, requires_new_agent=False
+        )
+    )
+
+    orchestrator.invoke("plan de windsurf", thread_id="t1")
+    assert embeddings.calls.count("q") == 1
+
+    # Acierto de la caché semántica: tampoco se vuelve a embeber al elegir agente
+    orchestrator.invoke("plan de windsurf", thread_id="t2")
+    assert embeddings.calls.count("q") == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
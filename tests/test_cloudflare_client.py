@@ -0,0 +1,117 @@
+"""
+Clientes de Cloudflare Workers AI sobre CloudflareBaseLLM: lotes con
+errores por elemento, uso de tokens y propagación del contexto (plazo y
+registro de uso) a los hilos del lote.
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import CloudflareWorkersAI  # noqa: E402
+from concurrency import run_bounded  # noqa: E402
+from cost_accounting import track_usage  # noqa: E402
+from deadline import Deadline, current_deadline, deadline_scope  # noqa: E402
+from query_llm import CloudflareLLM  # noqa: E402
+
+
+def _responses_api(request: httpx.Request) -> httpx.Response:
+    prompt = json.loads(request.content)["input"]
+    if "falla" in prompt:
+        return httpx.Response(400, json={"errors": ["prompt rechazado"]})
+    return httpx.Response(200, json={
+        "output": [{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": f"eco: {prompt}"}]}],
+        "usage": {"input_tokens": 3, "output_tokens": 2},
+    })
+
+
+def _run_api(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    if body.get("stream"):
+        stream = (
+            'data: {"response": "ho"}\n\n'
+            'data: {"response": "la"}\n\n'
+            'data: {"response": "", "usage": {"prompt_tokens": 4, "completion_tokens": 2}}\n\n'
+            "data: [DONE]\n\n"
+        )
+        return httpx.Response(200, content=stream.encode(), headers={"content-type": "text/event-stream"})
+    return httpx.Response(200, json={
+        "success": True,
+        "result": {"response": f"eco: {body['prompt']}", "usage": {"prompt_tokens": 4, "completion_tokens": 1}},
+    })
+
+
+def _mock(llm, handler):
+    transport = llm.transport
+    mock = httpx.MockTransport(handler)
+    base_kwargs = transport._client_kwargs
+    transport._client_kwargs = lambda: {**base_kwargs(), "transport": mock}
+    transport.retry_policy.max_retries = 0
+    return llm
+
+
+def _workers_ai() -> CloudflareWorkersAI:
+    return _mock(CloudflareWorkersAI(account_id="cuenta", auth_token="token"), _responses_api)
+
+
+def test_batch_returns_each_error_in_its_position():
+    llm = _workers_ai()
+    results = llm.batch(["uno", "falla", "tres"], return_exceptions=True)
+    assert results[0] == "eco: uno" and results[2] == "eco: tres"
+    assert isinstance(results[1], ValueError)
+
+
+def test_abatch_returns_each_error_in_its_position():
+    llm = _workers_ai()
+    results = asyncio.run(llm.abatch(["uno", "falla"], return_exceptions=True))
+    assert results[0] == "eco: uno"
+    assert isinstance(results[1], ValueError)
+
+
+def test_generate_raises_instead_of_returning_an_empty_generation():
+    llm = _workers_ai()
+    with pytest.raises(ValueError):
+        llm.generate(["uno", "falla"])
+
+
+def test_generate_reports_total_usage():
+    result = _workers_ai().generate(["uno", "dos"])
+    assert [g[0].text for g in result.generations] == ["eco: uno", "eco: dos"]
+    assert result.llm_output["token_usage"]["prompt_tokens"] == 6
+    assert result.llm_output["token_usage"]["completion_tokens"] == 4
+
+
+def test_run_ai_client_shares_usage_and_streaming():
+    llm = _mock(CloudflareLLM(account_id="cuenta", auth_token="token"), _run_api)
+    result = llm.generate(["hola"])
+    assert result.generations[0][0].text == "eco: hola"
+    assert result.llm_output["token_usage"]["prompt_tokens"] == 4
+
+    chunks = list(llm._stream("hola"))
+    assert "".join(chunk.text for chunk in chunks) == "hola"
+    assert chunks[-1].generation_info["token_usage"] == {"prompt_tokens": 4, "completion_tokens": 2}
+
+
+def test_batched_calls_are_tracked_for_usage():
+    llm = _workers_ai()
+    with track_usage() as tracker:
+        llm.batch(["uno", "dos", "tres"], return_exceptions=True)
+    assert tracker.prompt_tokens == 9 and tracker.completion_tokens == 6
+
+
+def test_run_bounded_propagates_the_deadline_to_worker_threads():
+    deadline = Deadline.after_ms(10_000)
+    with deadline_scope(deadline):
+        outcomes = run_bounded(lambda _: current_deadline(), range(8), max_concurrency=4)
+    assert all(outcome.value is deadline for outcome in outcomes)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,141 @@
+"""
+ConversationMemory: ventana de turnos recientes dentro del presupuesto y
+resumen incremental de los turnos antiguos.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from conversation_memory import ROUTER_MESSAGE_NAME, ConversationMemory  # noqa: E402
+from deadline import Deadline  # noqa: E402
+from token_budget import TokenBudget, TokenCounter  # noqa: E402
+
+
+@pytest.fixture
+def budget() -> TokenBudget:
+    # Sin tokenizador: ~4 caracteres por token, determinista
+    counter = TokenCounter()
+    counter.encoding = None
+    return TokenBudget(max_tokens=400, completion_reserve=100, counter=counter)
+
+
+def _memory(budget: TokenBudget, responses=("resumen nuevo",)) -> ConversationMemory:
+    return ConversationMemory(
+        FakeListChatModel(responses=list(responses)),
+        max_tokens=budget.max_tokens,
+        token_budget=budget,
+    )
+
+
+def _history(turns: int, size: int = 80, first: int = 0) -> list:
+    """`turns` pares usuario/asistente de ~size/4 tokens y el turno actual."""
+    messages = []
+    for index in range(first, first + turns):
+        messages.append(HumanMessage(content=f"pregunta {index} " + "u" * size))
+        messages.append(AIMessage(content=f"respuesta {index} " + "a" * size))
+    messages.append(HumanMessage(content="tarea actual"))
+    return messages
+
+
+def test_short_history_is_not_summarized(budget):
+    memory = _memory(budget)
+    assert memory.update({"messages": _history(1)}) == {}
+
+
+def test_overflow_folds_the_oldest_turns(budget):
+    memory = _memory(budget)
+    messages = _history(8)
+    update = memory.update({"messages": messages})
+
+    assert update["conversation_summary"] == "resumen nuevo"
+    until = update["summarized_until"]
+    assert 0 < until < len(messages) - 1
+    assert update["token_usage"][0]["node"] == "memory"
+    # Lo que queda sin resumir cabe en la mitad del presupuesto de historial
+    pending = sum(budget.counter.count_message(m) for m in messages[until:-1])
+    assert pending <= memory.history_budget // 2
+
+
+def test_summary_is_incremental(budget):
+    memory = _memory(budget, responses=["primer resumen", "segundo resumen"])
+    messages = _history(8)
+    first = memory.update({"messages": messages})
+
+    messages = messages[:-1] + _history(8, first=8)
+    state = {"messages": messages, **first}
+    prompt = memory._summary_prompt(state, *memory._fold_range(state))[0]["content"]
+    # Solo se envían el resumen previo y los mensajes nuevos
+    assert "primer resumen" in prompt
+    assert "pregunta 0 " not in prompt
+
+    second = memory.update(state)
+    assert second["conversation_summary"] == "segundo resumen"
+    assert second["summarized_until"] > first["summarized_until"]
+
+
+def test_context_messages_skip_router_notes_and_current_turn(budget):
+    memory = _memory(budget)
+    messages = [
+        HumanMessage(content="hola"),
+        AIMessage(content="decisión interna", name=ROUTER_MESSAGE_NAME),
+        AIMessage(content="¡hola!"),
+        HumanMessage(content="tarea actual"),
+    ]
+    context = memory.context_messages({"messages": messages, "conversation_summary": "antes"})
+
+    assert isinstance(context[0], SystemMessage) and "antes" in context[0].content
+    assert [m.content for m in context[1:]] == ["hola", "¡hola!"]
+
+
+def test_context_messages_respect_an_extra_limit(budget):
+    memory = _memory(budget)
+    context = memory.context_messages({"messages": _history(3)}, max_tokens=30)
+    assert budget.counter.count_messages(context) <= 30
+    # Se conservan los turnos más recientes
+    assert context and context[-1].content.startswith("respuesta 2")
+
+
+def test_summary_is_postponed_without_time(budget):
+    memory = _memory(budget)
+    config = {"configurable": {"deadline": Deadline.after_ms(100).expires_at}}
+    assert memory.update({"messages": _history(8)}, config) == {}
+
+
+def test_failed_summary_leaves_the_state_untouched(budget):
+    memory = _memory(budget)
+    memory.llm = None
+    assert memory.update({"messages": _history(8)}) == {}
+
+
+def test_async_update(budget):
+    memory = _memory(budget)
+    update = asyncio.run(memory.aupdate({"messages": _history(8)}))
+    assert update["conversation_summary"] == "resumen nuevo"
+
+
+def test_orchestrator_keeps_the_summary_in_the_thread():
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta " + "r" * 400]),
+        memory_max_tokens=600,
+        background_metaproduction=False,
+        enforce_deadline=False,
+    )
+    for index in range(6):
+        result = orchestrator.invoke(f"pregunta {index} " + "p" * 400, thread_id="hilo")
+
+    assert result["conversation_summary"]
+    assert result["summarized_until"] > 0
+    assert "memory" in result["thread_cost"]["by_node"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,119 @@
+"""
+Contabilidad de coste: tabla de precios, uso reportado por el proveedor y
+agregación por petición, nodo, agente e hilo.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from cost_accounting import CostAccountingNode, PriceTable, parse_usage, track_usage  # noqa: E402
+from orchestrator_state import RouterDecision, merge_usage_summary  # noqa: E402
+
+
+def test_price_lookup_uses_the_longest_prefix():
+    table = PriceTable(default_price=(1.0, 1.0))
+    assert table.price("gpt-4o-2024-08-06") == (2.50, 10.00)
+    assert table.price("gpt-4-0613") == (30.00, 60.00)
+    assert table.price("modelo-local") == (1.0, 1.0)
+    assert table.price(None) == (1.0, 1.0)
+    assert table.cost("gpt-4o", 1_000_000, 100_000) == pytest.approx(3.5)
+
+
+def test_price_table_from_json(tmp_path):
+    path = tmp_path / "precios.json"
+    path.write_text(json.dumps({"mi-modelo": [1, 2]}), encoding="utf-8")
+    table = PriceTable.from_json(str(path))
+    assert table.price("mi-modelo-v2") == (1, 2)
+    assert table.price("gpt-4o") == (0.0, 0.0)
+
+
+def test_parse_usage_formats():
+    assert parse_usage({"usage": {"prompt_tokens": 10, "completion_tokens": 5}}) == (10, 5)
+    assert parse_usage({"usage": {"input_tokens": 7, "output_tokens": 3}}) == (7, 3)
+    assert parse_usage({"result": {"usage": {"prompt_tokens": 4}}}) == (4, 0)
+    assert parse_usage({"result": {"response": "sin uso"}}) is None
+    assert parse_usage("texto") is None
+
+
+def test_tracker_replaces_estimates_with_provider_usage():
+    message = AIMessage(
+        content="respuesta",
+        usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150},
+        response_metadata={"model_name": "gpt-4o-mini"},
+    )
+    llm = GenericFakeChatModel(messages=iter([message]))
+    with track_usage() as tracker:
+        llm.invoke("hola")
+    record = tracker.apply({"node": "direct_execution", "prompt_tokens": 5, "completion_tokens": 2})
+    assert record["prompt_tokens"] == 120 and record["completion_tokens"] == 30
+    assert record["usage_source"] == "provider"
+    assert record["model"] == "gpt-4o-mini"
+
+
+def test_tracker_without_provider_usage_keeps_the_estimate():
+    with track_usage() as tracker:
+        FakeListChatModel(responses=["respuesta"]).invoke("hola")
+    record = tracker.apply({"node": "router", "prompt_tokens": 5, "completion_tokens": 2})
+    assert record == {"node": "router", "prompt_tokens": 5, "completion_tokens": 2, "usage_source": "estimate"}
+
+    # Sin ninguna llamada (respuesta de caché): coste 0
+    with track_usage() as tracker:
+        pass
+    assert tracker.apply({"node": "router", "prompt_tokens": 5, "completion_tokens": 2})["cost"] == 0.0
+
+
+def test_summary_by_node_and_agent():
+    node = CostAccountingNode(PriceTable({"m": (1_000_000, 2_000_000)}), default_model="m")
+    summary = node.summarize([
+        {"node": "router", "prompt_tokens": 10, "completion_tokens": 1},
+        {"node": "direct_execution", "prompt_tokens": 20, "completion_tokens": 5, "agent_id": "coder"},
+        {"node": "direct_execution", "prompt_tokens": 1, "completion_tokens": 1, "agent_id": "coder", "cost": 0.0},
+    ])
+    assert summary["calls"] == 3
+    assert summary["cost"] == pytest.approx(12 + 30)
+    assert summary["by_node"]["router"]["cost"] == pytest.approx(12)
+    assert summary["by_node"]["direct_execution"]["calls"] == 2
+    assert summary["by_agent"]["coder"] == {"calls": 2, "prompt_tokens": 21, "completion_tokens": 6, "cost": pytest.approx(30)}
+
+
+def test_thread_cost_reducer_sums_requests():
+    first = {"calls": 1, "cost": 0.5, "by_node": {"router": {"calls": 1, "cost": 0.5}}}
+    second = {"calls": 2, "cost": 1.0, "by_node": {"router": {"calls": 1, "cost": 0.25}, "memory": {"calls": 1, "cost": 0.75}}}
+    merged = merge_usage_summary(first, second)
+    assert merged["calls"] == 3 and merged["cost"] == 1.5
+    assert merged["by_node"]["router"] == {"calls": 2, "cost": 0.75}
+    assert merged["by_node"]["memory"] == {"calls": 1, "cost": 0.75}
+    assert merge_usage_summary(None, first) is first
+
+
+def test_orchestrator_publishes_request_and_thread_cost(capsys):
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta"]),
+        background_metaproduction=False,
+        price_table=PriceTable(default_price=(100_000.0, 100_000.0)),
+    )
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(route="EJECUCION_DIRECTA", reasoning="stub", task_complexity=0.5, requires_new_agent=False)
+    )
+    first = orchestrator.invoke("hola", thread_id="hilo")
+    second = orchestrator.invoke("hola otra vez", thread_id="hilo")
+
+    assert first["request_cost"]["by_node"]["direct_execution"]["calls"] == 1
+    assert second["thread_cost"]["calls"] == first["request_cost"]["calls"] + second["request_cost"]["calls"]
+    assert second["thread_cost"]["cost"] == pytest.approx(first["request_cost"]["cost"] + second["request_cost"]["cost"])
+    # Por encima de max_cost_per_request
+    assert "supera max_cost_per_request" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,121 @@
+"""
+Plazos por petición: activación opcional en el orquestador, recorte de
+los timeouts HTTP y respuesta degradada al vencer.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from deadline import (  # noqa: E402
+    Deadline,
+    DeadlineExceeded,
+    acall_with_deadline,
+    call_with_deadline,
+    current_deadline,
+    deadline_scope,
+    request_timeout,
+)
+from orchestrator_state import RouterDecision, SystemInvariants  # noqa: E402
+
+
+class SlowChat(FakeListChatModel):
+    """Modelo falso que respeta el timeout HTTP recortado al plazo."""
+
+    delay: float = 0.0
+
+    def _call(self, *args, **kwargs):
+        limit = request_timeout(30)
+        if self.delay > limit:
+            time.sleep(limit)
+            raise TimeoutError("timeout")
+        time.sleep(self.delay)
+        return "respuesta lenta"
+
+
+def _orchestrator(delay: float, **kwargs) -> AutopoieticOrchestrator:
+    orchestrator = AutopoieticOrchestrator(
+        llm=SlowChat(responses=["-"], delay=delay), background_metaproduction=False, **kwargs
+    )
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(route="EJECUCION_DIRECTA", reasoning="stub", task_complexity=0.5, requires_new_agent=False)
+    )
+    return orchestrator
+
+
+def test_deadline_is_opt_in():
+    orchestrator = _orchestrator(0.0)
+    assert orchestrator.max_latency_ms is None
+    assert "deadline" not in orchestrator._run_config("hilo")["configurable"]
+
+    enforced = _orchestrator(0.0, enforce_deadline=True)
+    assert enforced.max_latency_ms == SystemInvariants.BUDGETS["max_latency_ms"]
+    assert _orchestrator(0.0, max_latency_ms=800).max_latency_ms == 800
+
+
+def test_per_request_deadline_without_default():
+    config = _orchestrator(0.0)._run_config("hilo", deadline_ms=1000)
+    remaining = Deadline.from_config(config).remaining_ms()
+    assert 0 < remaining <= 1000
+
+
+def test_slow_call_without_deadline_waits():
+    result = _orchestrator(0.3).invoke("hola", thread_id="hilo")
+    assert result["messages"][-1].content.endswith("respuesta lenta")
+
+
+def test_expired_deadline_returns_a_degraded_answer():
+    orchestrator = _orchestrator(2.0, max_latency_ms=300)
+    start = time.perf_counter()
+    result = orchestrator.invoke("hola", thread_id="hilo")
+    assert time.perf_counter() - start < 1.5
+    assert "⏱️" in result["messages"][-1].content
+
+
+def test_request_timeout_is_clipped_to_the_deadline():
+    assert request_timeout(30) == 30
+    with deadline_scope(Deadline.after_ms(100)):
+        assert request_timeout(30) <= 0.1
+    with deadline_scope(Deadline.after_ms(-1)):
+        with pytest.raises(DeadlineExceeded):
+            request_timeout(30)
+    assert current_deadline() is None
+
+
+def test_call_with_deadline():
+    assert call_with_deadline(None, lambda: "ok") == "ok"
+    with pytest.raises(DeadlineExceeded):
+        call_with_deadline(Deadline.after_ms(-1), lambda: "nunca")
+
+    def fails_at_the_deadline():
+        time.sleep(request_timeout(30))
+        raise TimeoutError("timeout")
+
+    with pytest.raises(DeadlineExceeded):
+        call_with_deadline(Deadline.after_ms(50), fails_at_the_deadline)
+    with pytest.raises(ValueError):
+        call_with_deadline(Deadline.after_ms(1000), int, "no es un número")
+
+
+def test_acall_with_deadline_cancels():
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(acall_with_deadline(Deadline.after_ms(50), asyncio.sleep(1)))
+    assert asyncio.run(acall_with_deadline(Deadline.after_ms(1000), asyncio.sleep(0, "ok"))) == "ok"
+
+
+def test_share_splits_the_remaining_time():
+    sub = Deadline.after_ms(1000).share(0.5)
+    assert 0 < sub.remaining_ms() <= 500
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
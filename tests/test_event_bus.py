@@ -0,0 +1,128 @@
+"""
+EventBus: entrega por tipo a suscriptores síncronos y asíncronos, colas
+acotadas que nunca bloquean al publicador y aislamiento por orquestador.
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from event import Event  # noqa: E402
+from event_bus import EventBus, Subscription  # noqa: E402
+from event_manager import EventManager  # noqa: E402
+
+
+@pytest.fixture
+def manager() -> EventManager:
+    return EventManager.isolated()
+
+
+@pytest.fixture
+def bus(manager):
+    bus = EventBus()
+    manager.add_sink(bus)
+    yield bus
+    bus.close()
+
+
+def test_subscribers_receive_only_their_types(manager, bus):
+    proposals, everything = [], []
+    bus.subscribe(proposals.append, event_types=["proposal"])
+    bus.subscribe(everything.append)
+    Event("proposal", "propuesta", "-", event_manager=manager)
+    Event("execution", "ejecución", "-", event_manager=manager)
+    bus.drain()
+
+    assert [event.event_name for event in proposals] == ["propuesta"]
+    assert [event.event_name for event in everything] == ["propuesta", "ejecución"]
+
+
+def test_unsubscribe_stops_delivery(manager, bus):
+    received = []
+    subscription = bus.subscribe(received.append)
+    subscription.unsubscribe()
+    Event("a", "tarde", "-", event_manager=manager)
+    bus.drain()
+    assert received == [] and bus.stats() == []
+
+
+def test_slow_subscriber_drops_its_oldest_events(manager, bus):
+    release = threading.Event()
+    received = []
+
+    def slow(event):
+        release.wait(5)
+        received.append(event.event_id)
+
+    subscription = bus.subscribe(slow, max_queue=2)
+    for index in range(6):
+        # Publicar no espera al suscriptor bloqueado
+        Event("a", f"evento {index}", "-", event_manager=manager)
+    release.set()
+    bus.drain()
+
+    assert subscription.dropped >= 3
+    assert received[-2:] == [5, 6]
+    assert subscription.delivered == len(received)
+
+
+def test_callback_errors_are_counted(manager, bus):
+    def broken(event):
+        raise RuntimeError("fallo")
+
+    subscription = bus.subscribe(broken)
+    Event("a", "evento", "-", event_manager=manager)
+    bus.drain()
+    assert subscription.errors == 1 and subscription.delivered == 0
+
+
+def test_async_subscriber(manager, bus):
+    received = []
+
+    async def on_event(event):
+        received.append(event.event_name)
+
+    async def run():
+        bus.subscribe(on_event, event_types=["a"])
+        await asyncio.sleep(0)
+        Event("a", "asíncrono", "-", event_manager=manager)
+        Event("b", "otro", "-", event_manager=manager)
+        await bus.adrain()
+
+    asyncio.run(run())
+    assert received == ["asíncrono"]
+
+
+def test_async_subscriber_requires_a_loop(bus):
+    async def on_event(event):
+        pass
+
+    with pytest.raises(ValueError):
+        bus.subscribe(on_event)
+
+
+def test_orchestrators_do_not_share_events():
+    first = AutopoieticOrchestrator(llm=FakeListChatModel(responses=["-"]), enforce_deadline=False)
+    second = AutopoieticOrchestrator(llm=FakeListChatModel(responses=["-"]), enforce_deadline=False)
+    received = []
+    second.event_bus.subscribe(received.append)
+    Event("a", "del primero", "-", event_manager=first.event_manager)
+    second.event_bus.drain()
+    assert received == []
+
+
+def test_subscription_is_abstract():
+    with pytest.raises(TypeError):
+        Subscription(EventBus(), print, None, 10)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,106 @@
+"""
+EventJournal: persistencia de eventos, rotación de segmentos, reanudación
+tras una caída y reproducción con iter_journal.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from event import Event  # noqa: E402
+from event_journal import EventJournal, iter_journal, list_segments  # noqa: E402
+from event_manager import EventManager  # noqa: E402
+
+
+@pytest.fixture
+def manager() -> EventManager:
+    return EventManager.isolated()
+
+
+def _journal(manager: EventManager, directory: Path, **kwargs) -> EventJournal:
+    journal = EventJournal(directory, fsync=False, **kwargs)
+    manager.add_sink(journal)
+    return journal
+
+
+def test_events_are_replayed_in_order(manager, tmp_path):
+    journal = _journal(manager, tmp_path)
+    for index in range(20):
+        Event("a" if index % 2 else "b", f"evento {index}", "descripción", event_manager=manager, payload={"n": index})
+    journal.close()
+
+    records = list(iter_journal(tmp_path))
+    assert [record["event_id"] for record in records] == list(range(1, 21))
+    assert records[0]["payload"] == {"n": 0}
+    assert len(list(iter_journal(tmp_path, event_type="a"))) == 10
+    assert [record["event_id"] for record in iter_journal(tmp_path, since_id=18)] == [19, 20]
+    assert journal.stats()["written"] == 20
+
+
+def test_segments_rotate(manager, tmp_path):
+    journal = _journal(manager, tmp_path, segment_max_bytes=500, max_batch=1)
+    for index in range(20):
+        Event("a", f"evento {index}", "x" * 50, event_manager=manager)
+    journal.close()
+    assert len(list_segments(tmp_path)) > 1
+    assert len(list(iter_journal(tmp_path))) == 20
+
+
+def test_ids_continue_after_a_restart(manager, tmp_path):
+    journal = _journal(manager, tmp_path)
+    Event("a", "primero", "-", event_manager=manager)
+    journal.close()
+
+    restarted = EventManager.isolated()
+    journal = _journal(restarted, tmp_path)
+    event = Event("a", "segundo", "-", event_manager=restarted)
+    journal.close()
+    assert event.event_id == 2
+    assert [record["event_name"] for record in iter_journal(tmp_path)] == ["primero", "segundo"]
+
+
+def test_torn_last_line_is_truncated_on_open(manager, tmp_path):
+    journal = _journal(manager, tmp_path)
+    Event("a", "completo", "-", event_manager=manager)
+    journal.close()
+    # Caída a mitad de una escritura
+    with open(list_segments(tmp_path)[-1], "ab") as file:
+        file.write(b'{"event_id": 2, "event_na')
+
+    restarted = EventManager.isolated()
+    journal = _journal(restarted, tmp_path)
+    Event("a", "tras la caída", "-", event_manager=restarted)
+    journal.close()
+    assert [record["event_name"] for record in iter_journal(tmp_path)] == ["completo", "tras la caída"]
+
+
+def test_events_after_close_are_dropped_not_raised(manager, tmp_path):
+    journal = _journal(manager, tmp_path)
+    journal.close()
+    event = Event("a", "tarde", "-", event_manager=manager)
+    assert manager.get_event(event.event_id) is event
+    assert journal.stats()["dropped"] == 1
+    assert list(iter_journal(tmp_path)) == []
+
+
+def test_confirmation_results_are_replayed(manager, tmp_path):
+    journal = _journal(manager, tmp_path)
+    accepted = Event("agent_proposal", "propuesta", "-", requires_confirmation=True, event_manager=manager)
+    rejected = Event("agent_proposal", "otra", "-", requires_confirmation=True, event_manager=manager)
+    Event("a", "posterior", "-", event_manager=manager)
+    manager.resolve_confirmation(accepted.event_id, True)
+    manager.resolve_confirmation(rejected.event_id, False)
+    journal.close()
+
+    records = list(iter_journal(tmp_path))
+    assert [record["confirmed"] for record in records] == [True, False, None]
+    assert [record["event_id"] for record in iter_journal(tmp_path, event_type="agent_proposal")] == [1, 2]
+    assert journal.last_event_id() == 3
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
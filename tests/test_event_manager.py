@@ -0,0 +1,110 @@
+"""
+EventManager: ids de secuencia, retención acotada, índices por tipo y por
+tiempo, y confirmaciones pendientes.
+"""
+
+import datetime
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import event  # noqa: E402
+from event import Event  # noqa: E402
+from event_manager import EventManager  # noqa: E402
+
+
+@pytest.fixture
+def manager() -> EventManager:
+    return EventManager.isolated(max_events=5)
+
+
+def test_ids_follow_registration_order(manager):
+    events = [Event("a", f"evento {index}", "-", event_manager=manager) for index in range(3)]
+    assert [event.event_id for event in events] == [1, 2, 3]
+    assert manager.get_event(2) is events[1]
+
+
+def test_isolated_managers_do_not_share_events(manager):
+    Event("a", "aislado", "-", event_manager=manager)
+    assert EventManager() is EventManager()
+    assert EventManager() is not manager
+    assert len(manager) == 1
+
+
+def test_retention_evicts_the_oldest(manager):
+    for index in range(8):
+        Event("a" if index < 4 else "b", f"evento {index}", "-", event_manager=manager)
+    assert len(manager) == 5
+    assert manager.get_event(3) is None
+    assert [event.event_id for event in manager.events_by_type("a")] == [4]
+    assert [event.event_id for event in manager.events_by_type("b")] == [5, 6, 7, 8]
+
+    manager.set_max_events(2)
+    assert [event.event_id for event in manager.events_after()] == [7, 8]
+    assert manager.events_by_type("a") == []
+    with pytest.raises(ValueError):
+        manager.set_max_events(0)
+
+
+def test_evicted_events_leave_pending(manager):
+    proposal = Event("proposal", "propuesta", "-", requires_confirmation=True, event_manager=manager)
+    assert manager.pending_confirmations() == [proposal]
+    for index in range(5):
+        Event("a", f"evento {index}", "-", event_manager=manager)
+    assert manager.pending_confirmations() == []
+    assert manager.resolve_confirmation(proposal.event_id, True) is None
+
+
+def test_resolve_confirmation(manager):
+    proposal = Event("proposal", "propuesta", "-", requires_confirmation=True, event_manager=manager)
+    assert manager.resolve_confirmation(proposal.event_id, False) is proposal
+    assert proposal.confirmed is False
+    assert manager.pending_confirmations() == []
+    assert manager.resolve_confirmation(proposal.event_id, True) is None
+
+
+def test_events_after_uses_cursor_time_range_and_type(manager, monkeypatch):
+    base = datetime.datetime(2024, 1, 1)
+    times = iter(base + datetime.timedelta(minutes=minutes) for minutes in range(5))
+
+    class Clock(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return next(times)
+
+    monkeypatch.setattr(event, "datetime", SimpleNamespace(datetime=Clock))
+    for index in range(5):
+        Event("a" if index % 2 else "b", f"evento {index}", "-", event_manager=manager)
+
+    assert [e.event_id for e in manager.events_after(after_id=3)] == [4, 5]
+    assert [e.event_id for e in manager.events_after(limit=2)] == [1, 2]
+    since, until = base + datetime.timedelta(minutes=1), base + datetime.timedelta(minutes=3)
+    assert [e.event_id for e in manager.events_after(since=since, until=until)] == [2, 3, 4]
+    assert [e.event_id for e in manager.events_after(event_type="a")] == [2, 4]
+    assert manager.events_after(event_type="ninguno") == []
+
+
+def test_concurrent_registration_keeps_unique_ids():
+    manager = EventManager.isolated(max_events=10_000)
+
+    def register():
+        for index in range(200):
+            Event("a", f"evento {index}", "-", event_manager=manager)
+
+    threads = [threading.Thread(target=register) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [event.event_id for event in manager.events_after(limit=10_000)]
+    assert ids == list(range(1, 801))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
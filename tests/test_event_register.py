@@ -0,0 +1,84 @@
+"""
+EventRegister: consultas perezosas con filtros, paginación por cursor y
+listado acotado.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from event import Event  # noqa: E402
+from event_manager import EventManager  # noqa: E402
+from registro_de_eventos import EventRegister  # noqa: E402
+
+
+@pytest.fixture
+def register() -> EventRegister:
+    manager = EventManager.isolated()
+    for index in range(10):
+        Event(
+            "proposal" if index % 3 == 0 else "execution",
+            f"evento {index}",
+            "-",
+            requires_confirmation=index % 3 == 0,
+            event_manager=manager,
+        )
+    return EventRegister(manager)
+
+
+def _ids(events) -> list:
+    return [event.event_id for event in events]
+
+
+def test_query_filters_by_type_and_pending(register):
+    assert _ids(register.query(event_type="proposal")) == [1, 4, 7, 10]
+    assert _ids(register.query(pending=True)) == [1, 4, 7, 10]
+    register.event_manager.resolve_confirmation(4, True)
+    assert _ids(register.query(pending=True, after_id=1)) == [7, 10]
+    assert _ids(register.query(event_type="proposal", pending=False)) == [4]
+
+
+def test_query_is_lazy_and_limited(register, monkeypatch):
+    monkeypatch.setattr(EventRegister, "CHUNK_SIZE", 3)
+    calls = []
+    events_after = register.event_manager.events_after
+
+    def counting(**kwargs):
+        calls.append(kwargs["after_id"])
+        return events_after(**kwargs)
+
+    monkeypatch.setattr(register.event_manager, "events_after", counting)
+    assert _ids(register.query(limit=4)) == [1, 2, 3, 4]
+    # Dos bloques de 3: no se lee el registro completo
+    assert calls == [None, 3]
+    assert list(register.query(limit=0)) == []
+
+
+def test_pages_follow_the_cursor(register):
+    first, cursor = register.page(page_size=4)
+    assert _ids(first) == [1, 2, 3, 4] and cursor == 4
+    second, cursor = register.page(page_size=4, after_id=cursor)
+    assert _ids(second) == [5, 6, 7, 8] and cursor == 8
+    last, cursor = register.page(page_size=4, after_id=cursor)
+    assert _ids(last) == [9, 10] and cursor is None
+
+    typed, cursor = register.page(page_size=2, event_type="execution")
+    assert _ids(typed) == [2, 3] and cursor == 3
+
+
+def test_display_events_is_bounded(register, capsys):
+    register.display_events(limit=3)
+    output = capsys.readouterr().out
+    assert "#3 " in output and "#4 " not in output
+    assert "mostrando 3 eventos" in output
+
+    EventRegister(EventManager.isolated()).display_events()
+    assert "No hay eventos registrados." in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,78 @@
+"""
+Metaproducción en segundo plano: la propuesta completa queda en el Event
+y sus tokens se cargan al coste del hilo.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+
+
+def _orchestrator(**kwargs) -> AutopoieticOrchestrator:
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta"]), enforce_deadline=False, **kwargs
+    )
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(
+            route="DIAGNOSTICO_ESTRUCTURAL", reasoning="stub", task_complexity=0.9, requires_new_agent=True
+        )
+    )
+    return orchestrator
+
+
+def _proposal(orchestrator: AutopoieticOrchestrator):
+    return orchestrator.event_manager.events_by_type("new_agent_proposal")[-1]
+
+
+def test_proposal_event_keeps_the_gap_analysis_and_spec():
+    orchestrator = _orchestrator()
+    orchestrator.invoke("diseña un sistema iot", thread_id="hilo")
+    assert orchestrator.wait_for_metaproduction(timeout=10)
+
+    payload = _proposal(orchestrator).payload
+    assert payload["gap_analysis"] == "respuesta"
+    assert "agent_id" in payload["agent_proposal"]
+    assert [record["node"] for record in payload["token_usage"]] == ["capability_gap", "agent_design"]
+
+
+def test_background_usage_is_charged_to_the_thread():
+    orchestrator = _orchestrator()
+    first = orchestrator.invoke("diseña un sistema iot", thread_id="hilo")
+    assert orchestrator.wait_for_metaproduction(timeout=10)
+    background = len(_proposal(orchestrator).payload["token_usage"])
+
+    second = orchestrator.invoke("diseña otro sistema iot", thread_id="hilo")
+    assert orchestrator.wait_for_metaproduction(timeout=10)
+
+    # La segunda petición solo cuenta lo suyo; el hilo suma además la
+    # metaproducción en segundo plano de la primera
+    assert second["request_cost"]["calls"] == first["request_cost"]["calls"]
+    assert second["thread_cost"]["calls"] == 2 * first["request_cost"]["calls"] + background
+    assert second["thread_cost"]["by_node"]["capability_gap"]["calls"] == 1
+
+
+def test_async_background_usage_is_charged_to_the_thread():
+    orchestrator = _orchestrator()
+
+    async def run() -> tuple[dict, dict]:
+        first = await orchestrator.ainvoke("diseña un sistema iot", thread_id="hilo")
+        assert await orchestrator.structural_diagnosis.adrain_metaproduction(timeout=10)
+        second = await orchestrator.ainvoke("hola", thread_id="hilo")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert second["thread_cost"]["by_node"]["agent_design"]["calls"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,165 @@
+"""
+Métricas operativas: registro Prometheus, callback de llamadas al
+proveedor y métricas del orquestador.
+"""
+
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation, LLMResult
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from metrics_registry import MetricsRegistry, MetricsServer, OrchestratorMetrics  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+
+
+class SlowChat(FakeListChatModel):
+    """Modelo falso con latencia fija por llamada."""
+
+    delay: float = 0.0
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return "respuesta"
+
+
+def _value(registry: MetricsRegistry, name: str, **labels) -> float:
+    for series in registry.snapshot()[name]["series"]:
+        if series["labels"] == labels:
+            return series["value"]
+    return 0
+
+
+def test_labels_are_normalized_to_strings():
+    registry = MetricsRegistry()
+    counter = registry.counter("http_responses_total", "Respuestas", ["status"])
+    counter.labels(200).inc()
+    counter.labels("200").inc()
+    assert counter.labels(200) is counter.labels("200")
+    assert registry.snapshot()["http_responses_total"]["series"] == [{"labels": {"status": "200"}, "value": 2}]
+    with pytest.raises(ValueError):
+        counter.labels("200", "extra")
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Trabajos").inc(3)
+    registry.gauge("queue_size", "Cola").set_function(lambda: 7)
+    histogram = registry.histogram("job_seconds", "Duración", ["kind"], buckets=(0.1, 1.0))
+    histogram.labels("a").observe(0.05)
+    histogram.labels("a").observe(5)
+    registry.counter("quoted_total", "Etiquetas escapadas", ["name"]).labels('con "comillas"').inc()
+
+    text = registry.render()
+    assert "# TYPE jobs_total counter\njobs_total 3\n" in text
+    assert "queue_size 7\n" in text
+    assert 'job_seconds_bucket{kind="a",le="0.1"} 1\n' in text
+    assert 'job_seconds_bucket{kind="a",le="1"} 1\n' in text
+    assert 'job_seconds_bucket{kind="a",le="+Inf"} 2\n' in text
+    assert 'job_seconds_sum{kind="a"} 5.05\n' in text
+    assert 'quoted_total{name="con \\"comillas\\""} 1' in text
+
+
+def test_registering_twice():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Trabajos")
+    assert registry.counter("jobs_total", "Trabajos") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("jobs_total", "Trabajos")
+
+
+def test_provider_handler_counts_calls_and_tokens():
+    metrics = OrchestratorMetrics()
+    handler = metrics.provider_handler(model="por-defecto")
+
+    def call(response: LLMResult) -> None:
+        run_id = uuid4()
+        handler.on_llm_start({}, [], run_id=run_id)
+        handler.on_llm_end(response, run_id=run_id)
+
+    call(LLMResult(generations=[[Generation(text="a")]], llm_output={"token_usage": {"prompt_tokens": 10, "completion_tokens": 4}, "model_name": "m1"}))
+    call(LLMResult(generations=[[ChatGeneration(message=AIMessage(content="b", usage_metadata={"input_tokens": 2, "output_tokens": 1, "total_tokens": 3}))]]))
+    # Respuesta de la caché: no es una llamada al proveedor
+    call(LLMResult(generations=[[ChatGeneration(message=AIMessage(content="c", usage_metadata={"input_tokens": 2, "output_tokens": 1, "total_tokens": 3, "total_cost": 0}))]]))
+    run_id = uuid4()
+    handler.on_chat_model_start({}, [], run_id=run_id)
+    handler.on_llm_error(RuntimeError("fallo"), run_id=run_id)
+
+    registry = metrics.registry
+    assert _value(registry, "llm_provider_calls_total", model="m1", outcome="ok") == 1
+    assert _value(registry, "llm_provider_tokens_total", model="m1", kind="prompt") == 10
+    assert _value(registry, "llm_provider_calls_total", model="por-defecto", outcome="ok") == 1
+    assert _value(registry, "llm_provider_calls_total", model="por-defecto", outcome="error") == 1
+    assert _value(registry, "llm_provider_seconds", model="por-defecto")["count"] == 2
+
+
+def test_instrumented_node_records_duration_and_errors():
+    metrics = OrchestratorMetrics()
+
+    def node(state, config=None):
+        if state.get("fail"):
+            raise RuntimeError("fallo")
+        return {}
+
+    timed, _ = metrics.instrument("router", node)
+    timed({})
+    with pytest.raises(RuntimeError):
+        timed({"fail": True})
+    assert _value(metrics.registry, "orchestrator_node_seconds", node="router")["count"] == 2
+    assert _value(metrics.registry, "orchestrator_node_errors_total", node="router") == 1
+
+
+def _orchestrator(**kwargs) -> AutopoieticOrchestrator:
+    orchestrator = AutopoieticOrchestrator(background_metaproduction=False, **kwargs)
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(route="EJECUCION_DIRECTA", reasoning="stub", task_complexity=0.5, requires_new_agent=False)
+    )
+    return orchestrator
+
+
+def test_orchestrator_measures_calls_without_touching_the_llm():
+    llm = FakeListChatModel(responses=["respuesta"])
+    orchestrator = _orchestrator(llm=llm)
+    orchestrator.invoke("hola", thread_id="hilo")
+
+    assert llm.callbacks is None
+    registry = orchestrator.metrics.registry
+    calls = sum(series["value"] for series in registry.snapshot()["llm_provider_calls_total"]["series"])
+    assert calls == 1
+    assert _value(registry, "orchestrator_requests_total", outcome="ok") == 1
+    assert _value(registry, "orchestrator_node_seconds", node="direct_execution")["count"] == 1
+
+
+def test_speculative_calls_are_measured():
+    orchestrator = _orchestrator(llm=SlowChat(responses=["-"], delay=0.05), speculative_execution=True)
+    orchestrator.invoke("hola", thread_id="hilo")
+    orchestrator.speculative_router.shutdown(wait=True)
+    calls = orchestrator.metrics.registry.snapshot()["llm_provider_calls_total"]["series"]
+    assert sum(series["value"] for series in calls) == 1
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Trabajos").inc()
+    server = MetricsServer(registry, port=0).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    finally:
+        server.stop()
+    assert "jobs_total 1" in body
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,110 @@
+"""
+ResponseCache: aciertos en memoria y en disco, LRU, TTL y qué respuestas
+se guardan.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from response_cache import ResponseCache  # noqa: E402
+
+LLM = "modelo-de-prueba"
+
+
+def test_update_then_lookup_hits_memory():
+    cache = ResponseCache()
+    assert cache.lookup("hola", LLM) is None
+    cache.update("hola", LLM, [Generation(text="respuesta")])
+    assert cache.lookup("hola", LLM)[0].text == "respuesta"
+    # Otro modelo o parámetros: otra clave
+    assert cache.lookup("hola", "otro-modelo") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResponseCache(max_entries=2)
+    cache.update("a", LLM, [Generation(text="A")])
+    cache.update("b", LLM, [Generation(text="B")])
+    assert cache.lookup("a", LLM) is not None
+    cache.update("c", LLM, [Generation(text="C")])
+    assert cache.lookup("b", LLM) is None
+    assert cache.lookup("a", LLM) is not None and cache.lookup("c", LLM) is not None
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    import response_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(ttl_seconds=60)
+    cache.update("hola", LLM, [Generation(text="respuesta")])
+    now[0] += 61
+    assert cache.lookup("hola", LLM) is None
+
+
+def test_sqlite_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(sqlite_path=path)
+    cache.update("hola", LLM, [Generation(text="persistida")])
+    cache.close()
+
+    reopened = ResponseCache(sqlite_path=path)
+    assert reopened.lookup("hola", LLM)[0].text == "persistida"
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+
+def test_empty_generations_are_not_cached(tmp_path):
+    cache = ResponseCache(sqlite_path=str(tmp_path / "cache.db"))
+    cache.update("vacía", LLM, [Generation(text="")])
+    cache.update("nada", LLM, [])
+    assert cache.lookup("vacía", LLM) is None and cache.lookup("nada", LLM) is None
+    assert cache.stats()["memory_entries"] == 0
+    cache.close()
+
+
+def test_tool_call_replies_are_cached_without_text():
+    cache = ResponseCache()
+    message = AIMessage(content="", tool_calls=[{"name": "RouterDecision", "args": {}, "id": "1"}])
+    cache.update("router", LLM, [ChatGeneration(message=message)])
+    assert cache.lookup("router", LLM) is not None
+
+
+def test_llm_reuses_cached_responses():
+    cache = ResponseCache()
+    llm = FakeListLLM(responses=["primera", "segunda"], cache=cache)
+    assert llm.invoke("hola") == "primera"
+    assert llm.invoke("hola") == "primera"
+    assert cache.hits == 1
+
+
+def test_concurrent_updates_and_lookups(tmp_path):
+    cache = ResponseCache(max_entries=64, sqlite_path=str(tmp_path / "cache.db"))
+
+    def worker(offset: int) -> None:
+        for i in range(50):
+            key = f"prompt-{(offset + i) % 80}"
+            cache.update(key, LLM, [Generation(text=key)])
+            value = cache.lookup(key, LLM)
+            assert value is None or value[0].text == key
+
+    threads = [threading.Thread(target=worker, args=(n * 10,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["memory_entries"] <= 64
+    cache.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
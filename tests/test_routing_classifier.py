@@ -0,0 +1,142 @@
+"""
+RoutingClassifier: entrenamiento sobre el registro de decisiones del
+router, decisión por umbral, guardado/carga y la CLI de entrenamiento.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import routing_classifier  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+from routing_classifier import (  # noqa: E402
+    MIN_TRAINING_RECORDS,
+    DecisionLog,
+    RoutingClassifier,
+    evaluate,
+    hash_features,
+)
+
+DIRECT = ["resume este texto", "traduce esta frase", "explica este código python", "corrige la ortografía"]
+STRUCTURAL = ["diseña un sistema iot nuevo", "crea una arquitectura de agentes", "diseña un sistema especializado"]
+
+
+def _decision(route: str) -> RouterDecision:
+    return RouterDecision(
+        route=route,
+        reasoning="stub",
+        task_complexity=0.2 if route == "EJECUCION_DIRECTA" else 0.9,
+        requires_new_agent=route != "EJECUCION_DIRECTA",
+    )
+
+
+def _write_log(path: Path, repeats: int) -> DecisionLog:
+    log = DecisionLog(str(path))
+    for _ in range(repeats):
+        for task in DIRECT:
+            log.append(task, _decision("EJECUCION_DIRECTA"))
+        for task in STRUCTURAL:
+            log.append(task, _decision("DIAGNOSTICO_ESTRUCTURAL"))
+    return log
+
+
+def _trained() -> RoutingClassifier:
+    tasks = DIRECT + STRUCTURAL
+    routes = ["EJECUCION_DIRECTA"] * len(DIRECT) + ["DIAGNOSTICO_ESTRUCTURAL"] * len(STRUCTURAL)
+    complexities = [0.2] * len(DIRECT) + [0.9] * len(STRUCTURAL)
+    return RoutingClassifier(n_features=2 ** 12).fit(tasks, routes, complexities)
+
+
+def test_hash_features_are_normalized_and_stable():
+    indices, values = hash_features("diseña un sistema", n_features=2 ** 12)
+    again, _ = hash_features("diseña un sistema", n_features=2 ** 12)
+    assert (indices == again).all()
+    assert abs(float((values ** 2).sum()) - 1.0) < 1e-5
+    assert hash_features("", n_features=2 ** 12)[0].size == 0
+
+
+def test_classifier_learns_both_routes():
+    model = _trained()
+    assert model.predict("diseña un sistema iot nuevo")[0] == "DIAGNOSTICO_ESTRUCTURAL"
+    route, confidence, complexity = model.predict("resume este texto")
+    assert route == "EJECUCION_DIRECTA" and confidence > 0.5 and complexity < 0.5
+
+
+def test_decide_respects_the_threshold():
+    model = _trained()
+    decision = model.decide("traduce esta frase", threshold=0.5)
+    assert decision is not None and decision.route == "EJECUCION_DIRECTA"
+    assert model.decide("traduce esta frase", threshold=1.01) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    model = _trained()
+    path = str(tmp_path / "modelo.npz")
+    model.save(path)
+    loaded = RoutingClassifier.load(path)
+    assert loaded.predict("crea una arquitectura de agentes") == pytest.approx(
+        model.predict("crea una arquitectura de agentes")
+    )
+    assert loaded.trained_samples == model.trained_samples
+
+
+def test_fit_without_records_fails():
+    with pytest.raises(ValueError):
+        RoutingClassifier(n_features=2 ** 12).fit([], [], [])
+
+
+def test_decision_log_reads_only_llm_labels(tmp_path):
+    log = DecisionLog(str(tmp_path / "decisiones.jsonl"))
+    log.append("tarea", _decision("EJECUCION_DIRECTA"), source="llm")
+    log.append("tarea", _decision("EJECUCION_DIRECTA"), source="classifier")
+    assert len(list(log.read())) == 1
+    assert len(list(log.read(source=None))) == 2
+
+
+def test_evaluate_reports_skip_rate_per_threshold():
+    model = _trained()
+    records = [
+        {"task": task, "route": "EJECUCION_DIRECTA", "task_complexity": 0.2} for task in DIRECT
+    ]
+    rows = evaluate(model, records, thresholds=(0.0, 1.01))
+    assert rows[0]["skip_rate"] == 1.0 and rows[0]["agreement"] == 1.0
+    assert rows[1]["skip_rate"] == 0.0
+
+
+def test_split_keeps_every_record_for_training_when_there_are_few():
+    few = [{"n": i} for i in range(3)]
+    assert routing_classifier._split(few, 0.2) == (few, [])
+
+    many = [{"n": i} for i in range(2 * MIN_TRAINING_RECORDS)]
+    train, holdout = routing_classifier._split(many, 0.2)
+    assert len(train) >= MIN_TRAINING_RECORDS and holdout == many[len(train):]
+
+
+def test_cli_trains_with_a_tiny_log(tmp_path, capsys):
+    log_path = tmp_path / "decisiones.jsonl"
+    DecisionLog(str(log_path)).append("resume este texto", _decision("EJECUCION_DIRECTA"))
+    out = tmp_path / "modelo.npz"
+
+    routing_classifier.main(["train", "--log", str(log_path), "--out", str(out), "--n-features", "4096"])
+    assert out.exists()
+    assert "se omite la validación" in capsys.readouterr().out
+
+    with pytest.raises(SystemExit):
+        routing_classifier.main(["report", "--log", str(log_path), "--n-features", "4096"])
+
+
+def test_cli_validates_on_the_most_recent_decisions(tmp_path, capsys):
+    log_path = tmp_path / "decisiones.jsonl"
+    _write_log(log_path, repeats=3)
+    routing_classifier.main(
+        ["train", "--log", str(log_path), "--out", str(tmp_path / "modelo.npz"), "--n-features", "4096"]
+    )
+    assert "Validación sobre" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
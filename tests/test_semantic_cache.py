@@ -0,0 +1,74 @@
+"""
+SemanticDecisionCache: reutiliza la decisión de una tarea parecida
+mientras no cambie el catálogo de agentes.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from orchestrator_state import RouterDecision  # noqa: E402
+from semantic_cache import SemanticDecisionCache  # noqa: E402
+
+VOCABULARY = ["python", "lista", "ordenar", "factura", "cliente", "sql", "una", "en"]
+
+
+class BagOfWords(Embeddings):
+    """Embeddings deterministas: recuento de palabras del vocabulario."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        words = text.lower().split()
+        return [float(words.count(word)) for word in VOCABULARY]
+
+
+def _decision(route: str = "EJECUCION_DIRECTA") -> RouterDecision:
+    return RouterDecision(route=route, reasoning="stub", task_complexity=0.2, requires_new_agent=False)
+
+
+def test_similar_task_reuses_the_decision():
+    cache = SemanticDecisionCache(BagOfWords(), threshold=0.85)
+    decision = _decision()
+    cache.store(cache.embed("ordenar una lista en python"), decision, catalog_version=1)
+
+    assert cache.lookup(cache.embed("ordenar lista en python"), catalog_version=1) is decision
+    assert cache.lookup(cache.embed("factura cliente sql"), catalog_version=1) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_catalog_change_invalidates_entries():
+    cache = SemanticDecisionCache(BagOfWords())
+    vector = cache.embed("ordenar una lista en python")
+    cache.store(vector, _decision(), catalog_version=1)
+    assert cache.lookup(vector, catalog_version=2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_ring_buffer_keeps_the_latest_entries():
+    cache = SemanticDecisionCache(BagOfWords(), threshold=0.99, max_entries=2)
+    first = cache.embed("python")
+    cache.store(first, _decision(), catalog_version=1)
+    cache.store(cache.embed("factura"), _decision(), catalog_version=1)
+    cache.store(cache.embed("sql"), _decision("DIAGNOSTICO_ESTRUCTURAL"), catalog_version=1)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(first, catalog_version=1) is None
+    assert cache.lookup(cache.embed("sql"), catalog_version=1).route == "DIAGNOSTICO_ESTRUCTURAL"
+
+
+def test_async_embedding_matches_sync():
+    cache = SemanticDecisionCache(BagOfWords())
+    text = "ordenar una lista en python"
+    assert (asyncio.run(cache.aembed(text)) == cache.embed(text)).all()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,99 @@
+"""
+SpeculativeRouterNode: una especulación descartada se cobra en el coste de
+la petición (o del hilo, si no se pudo cancelar a tiempo).
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+
+
+class SlowChat(FakeListChatModel):
+    """Modelo falso con latencia fija por llamada."""
+
+    delay: float = 0.0
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return "respuesta del agente"
+
+    async def _acall(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return "respuesta del agente"
+
+
+def _orchestrator(llm_delay: float, router_delay: float, route: str) -> AutopoieticOrchestrator:
+    orchestrator = AutopoieticOrchestrator(
+        llm=SlowChat(responses=["-"], delay=llm_delay),
+        speculative_execution=True,
+        enforce_deadline=False,
+    )
+
+    def decide(_):
+        time.sleep(router_delay)
+        return RouterDecision(route=route, reasoning="stub", task_complexity=0.5, requires_new_agent=False)
+
+    orchestrator.router.structured_llm = RunnableLambda(decide)
+    return orchestrator
+
+
+def test_hit_does_not_charge_speculation():
+    orchestrator = _orchestrator(0.0, 0.05, "EJECUCION_DIRECTA")
+    result = orchestrator.invoke("hola", thread_id="hilo")
+    assert "speculation" not in result["request_cost"]["by_node"]
+    assert orchestrator.speculation_stats()["hits"] == 1
+
+
+def test_finished_miss_is_charged_to_the_request():
+    orchestrator = _orchestrator(0.0, 0.1, "DIAGNOSTICO_ESTRUCTURAL")
+    result = orchestrator.invoke("hola", thread_id="hilo")
+    orchestrator.wait_for_metaproduction(timeout=10)
+
+    wasted = result["request_cost"]["by_node"]["speculation"]
+    stats = orchestrator.speculation_stats()
+    assert wasted["calls"] == 1
+    assert stats["misses"] == 1 and stats["uncancelled"] == 0
+    assert stats["wasted_tokens"] == wasted["prompt_tokens"] + wasted["completion_tokens"]
+
+
+def test_uncancellable_miss_is_charged_to_the_thread():
+    orchestrator = _orchestrator(0.3, 0.0, "DIAGNOSTICO_ESTRUCTURAL")
+    first = orchestrator.invoke("hola", thread_id="hilo")
+    assert "speculation" not in first["request_cost"]["by_node"]
+    assert orchestrator.speculation_stats()["uncancelled"] == 1
+
+    # El hilo de la especulación termina su llamada y se carga al hilo
+    orchestrator.speculative_router.shutdown(wait=True)
+    orchestrator.wait_for_metaproduction(timeout=10)
+    second = orchestrator.invoke("hola otra vez", thread_id="hilo")
+    assert second["thread_cost"]["by_node"]["speculation"]["calls"] >= 1
+    assert orchestrator.speculation_stats()["misses"] >= 1
+
+
+def test_async_miss_cancelled_in_flight_charges_the_prompt():
+    orchestrator = _orchestrator(0.5, 0.0, "DIAGNOSTICO_ESTRUCTURAL")
+
+    async def run() -> dict:
+        result = await orchestrator.ainvoke("hola", thread_id="hilo")
+        await orchestrator.adrain_metaproduction()
+        return result
+
+    result = asyncio.run(run())
+    wasted = result["request_cost"]["by_node"]["speculation"]
+    assert wasted["prompt_tokens"] > 0 and wasted["completion_tokens"] == 0
+    assert orchestrator.speculation_stats()["uncancelled"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
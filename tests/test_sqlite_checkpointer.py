@@ -0,0 +1,131 @@
+"""
+SqliteCheckpointSaver: persistencia entre instancias, compresión y
+políticas de retención (por hilo, por antigüedad y por tamaño total).
+"""
+
+import asyncio
+import operator
+import sys
+from pathlib import Path
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import sqlite_checkpointer  # noqa: E402
+from sqlite_checkpointer import SqliteCheckpointSaver  # noqa: E402
+
+
+class CounterState(TypedDict):
+    items: Annotated[list, operator.add]
+
+
+def _app(saver: SqliteCheckpointSaver, payload: str = "x"):
+    graph = StateGraph(CounterState)
+    graph.add_node("append", lambda state: {"items": [payload]})
+    graph.add_edge(START, "append")
+    graph.add_edge("append", END)
+    return graph.compile(checkpointer=saver)
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_state_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    saver = SqliteCheckpointSaver(path)
+    app = _app(saver)
+    app.invoke({"items": []}, _config("hilo"))
+    app.invoke({"items": []}, _config("hilo"))
+    saver.close()
+
+    reopened = SqliteCheckpointSaver(path)
+    state = _app(reopened).get_state(_config("hilo"))
+    assert state.values["items"] == ["x", "x"]
+    reopened.close()
+
+
+def test_large_values_round_trip_compressed(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), compress_min_bytes=64)
+    large = "texto repetido " * 500
+    _app(saver, payload=large).invoke({"items": []}, _config("hilo"))
+    assert saver.get_tuple(_config("hilo")).checkpoint["channel_values"]["items"] == [large]
+    assert saver.stats()["stored_bytes"] < len(large)
+    saver.close()
+
+
+def test_checkpoints_per_thread_are_bounded(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), max_checkpoints_per_thread=3)
+    app = _app(saver)
+    for _ in range(5):
+        app.invoke({"items": []}, _config("hilo"))
+    assert len(list(saver.list(_config("hilo")))) == 3
+    # Los blobs de los checkpoints conservados siguen ahí
+    assert app.get_state(_config("hilo")).values["items"] == ["x"] * 5
+    saver.close()
+
+
+def test_inactive_threads_expire(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(sqlite_checkpointer.time, "time", lambda: now[0])
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), max_age_seconds=60)
+    app = _app(saver)
+    app.invoke({"items": []}, _config("viejo"))
+    now[0] += 120
+    app.invoke({"items": []}, _config("nuevo"))
+
+    saver.prune()
+    assert saver.get_tuple(_config("viejo")) is None
+    assert saver.get_tuple(_config("nuevo")) is not None
+    assert saver.stats()["threads"] == 1
+    saver.close()
+
+
+def test_total_size_evicts_the_least_recent_threads(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(sqlite_checkpointer.time, "time", lambda: now[0])
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), compress=False)
+    for thread_id in ("a", "b", "c"):
+        _app(saver, payload="y" * 2000).invoke({"items": []}, _config(thread_id))
+        now[0] += 1
+    per_thread = saver.stats()["stored_bytes"] // 3
+
+    saver.max_total_bytes = per_thread * 2
+    saver.prune()
+    assert saver.get_tuple(_config("a")) is None
+    assert saver.get_tuple(_config("c")) is not None
+    assert saver.stats()["stored_bytes"] <= saver.max_total_bytes
+    saver.close()
+
+
+def test_delete_thread_removes_everything(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"))
+    _app(saver).invoke({"items": []}, _config("hilo"))
+    saver.delete_thread("hilo")
+    assert saver.get_tuple(_config("hilo")) is None
+    assert saver.stats() == {"threads": 0, "checkpoints": 0, "stored_bytes": 0}
+    saver.close()
+
+
+def test_async_variants(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"))
+    app = _app(saver)
+
+    async def run():
+        await app.ainvoke({"items": []}, _config("hilo"))
+        await app.ainvoke({"items": []}, _config("hilo"))
+        checkpoints = [checkpoint async for checkpoint in saver.alist(_config("hilo"))]
+        latest = await saver.aget_tuple(_config("hilo"))
+        return checkpoints, latest
+
+    checkpoints, latest = asyncio.run(run())
+    assert checkpoints and latest.checkpoint["channel_values"]["items"] == ["x", "x"]
+    saver.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,98 @@
+"""
+Los nodos del grafo devuelven solo los mensajes nuevos del turno.
+
+Con un hilo persistido, cada turno debe hacer crecer `messages`
+exactamente en los mensajes que añade (tarea, nota del router y
+respuesta), sin que el reductor `add_messages` ni el nodo de memoria
+dupliquen el historial.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from conversation_memory import ROUTER_MESSAGE_NAME  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+
+
+def _decision(route: str) -> RouterDecision:
+    return RouterDecision(
+        route=route,
+        reasoning="stub",
+        task_complexity=0.2 if route == "EJECUCION_DIRECTA" else 0.9,
+        requires_new_agent=route != "EJECUCION_DIRECTA",
+    )
+
+
+def _orchestrator(routes: list[str], **kwargs) -> AutopoieticOrchestrator:
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta del agente"]),
+        enforce_deadline=False,
+        **kwargs,
+    )
+    pending = iter(routes)
+    orchestrator.router.structured_llm = RunnableLambda(lambda _: _decision(next(pending)))
+    return orchestrator
+
+
+def _run_turns(orchestrator: AutopoieticOrchestrator, turns: int) -> list:
+    thread_id = "hilo"
+    history: list = []
+    for turn in range(turns):
+        task = f"tarea número {turn}"
+        result = orchestrator.invoke(task, thread_id=thread_id)
+        orchestrator.wait_for_metaproduction()
+        messages = result["messages"]
+        new = messages[len(history):]
+
+        # El historial previo se conserva tal cual y no se repite
+        assert [m.id for m in messages[:len(history)]] == [m.id for m in history]
+        assert len({m.id for m in messages}) == len(messages)
+
+        # Exactamente los mensajes del turno: tarea, nota del router, respuesta
+        assert len(messages) == len(history) + 3
+        assert isinstance(new[0], HumanMessage) and new[0].content == task
+        assert new[1].name == ROUTER_MESSAGE_NAME
+        assert isinstance(new[2], AIMessage) and new[2].name != ROUTER_MESSAGE_NAME
+        history = messages
+    return history
+
+
+def test_direct_execution_turns_grow_by_new_messages_only():
+    _run_turns(_orchestrator(["EJECUCION_DIRECTA"] * 3), turns=3)
+
+
+def test_structural_diagnosis_turns_grow_by_new_messages_only():
+    routes = ["EJECUCION_DIRECTA", "DIAGNOSTICO_ESTRUCTURAL", "EJECUCION_DIRECTA"]
+    _run_turns(_orchestrator(routes), turns=3)
+
+
+def test_memory_summaries_do_not_add_messages():
+    # Presupuesto mínimo: el nodo de memoria resume en casi todos los turnos
+    orchestrator = _orchestrator(["EJECUCION_DIRECTA"] * 4, memory_max_tokens=120)
+    _run_turns(orchestrator, turns=4)
+    state = orchestrator.app.get_state({"configurable": {"thread_id": "hilo"}}).values
+    assert state.get("conversation_summary")
+
+
+def test_nodes_return_only_their_delta():
+    orchestrator = _orchestrator(["EJECUCION_DIRECTA"])
+    state = orchestrator._initial_state("hola")
+    state["messages"] = [HumanMessage(content="antes", id="h0"), HumanMessage(content="hola", id="h1")]
+    update = orchestrator.router.evaluate_task(state)
+    assert len(update["messages"]) == 1
+
+    update = orchestrator.direct_executor.execute({**state, **update})
+    assert len(update["messages"]) == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,136 @@
+"""
+TokenBudget: recorte de prompts por prioridad, registros de uso y límite
+de la respuesta (`max_tokens`) en las llamadas de los nodos.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+from query_llm import CloudflareLLM  # noqa: E402
+from token_budget import TRUNCATION_MARKER, TokenBudget, TokenCounter  # noqa: E402
+
+
+# `max_tokens` recibido en cada llamada de RecordingChat
+MAX_TOKENS_SEEN: list = []
+
+
+class RecordingChat(FakeListChatModel):
+    """Modelo falso que registra el `max_tokens` de cada llamada."""
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        MAX_TOKENS_SEEN.append(kwargs.get("max_tokens"))
+        return "respuesta"
+
+
+@pytest.fixture
+def counter() -> TokenCounter:
+    # Sin tokenizador: ~4 caracteres por token, determinista
+    counter = TokenCounter()
+    counter.encoding = None
+    return counter
+
+
+def test_completion_reserve_is_capped_at_half_the_budget():
+    budget = TokenBudget(max_tokens=1000, completion_reserve=800)
+    assert budget.completion_reserve == 500
+    assert budget.prompt_budget == 500
+
+
+def test_fit_trims_lowest_priority_sections_first(counter):
+    budget = TokenBudget(max_tokens=200, completion_reserve=100, counter=counter)
+    sections = [("instrucciones", "x" * 40), ("catalogo", "c" * 400), ("tarea", "t" * 200)]
+    texts, trimmed, total = budget.fit(sections, trim_order=["catalogo", "tarea"])
+
+    assert trimmed == ["catalogo"]
+    assert texts["instrucciones"] == "x" * 40 and texts["tarea"] == "t" * 200
+    assert texts["catalogo"].endswith(TRUNCATION_MARKER)
+    assert total <= budget.prompt_budget
+
+
+def test_fit_leaves_prompts_that_fit_untouched(counter):
+    budget = TokenBudget(max_tokens=1000, counter=counter)
+    texts, trimmed, total = budget.fit([("tarea", "hola")], trim_order=["tarea"], reserved=10)
+    assert texts == {"tarea": "hola"} and trimmed == [] and total == 11
+
+
+def test_usage_record(counter):
+    budget = TokenBudget(counter=counter)
+    record = budget.usage("execution", 12, "abcdefgh", trimmed=["history"], agent_id="general_assistant")
+    assert record == {
+        "node": "execution",
+        "prompt_tokens": 12,
+        "completion_tokens": 2,
+        "agent_id": "general_assistant",
+        "trimmed": ["history"],
+    }
+    assert budget.usage("router", 5, 7, error=True)["error"] is True
+
+
+def test_limit_completion_uses_the_model_field_when_there_is_one():
+    budget = TokenBudget(max_tokens=4000, completion_reserve=512)
+    llm = budget.limit_completion(ChatOpenAI(model="gpt-4o", api_key="test"))
+    assert llm.max_tokens == 512
+    # Conserva la salida estructurada del router
+    assert llm.with_structured_output(RouterDecision) is not None
+
+    cloudflare = CloudflareLLM(account_id="cuenta", auth_token="token", max_tokens=256)
+    assert budget.limit_completion(cloudflare) is cloudflare
+
+
+def test_limit_completion_binds_max_tokens_otherwise():
+    MAX_TOKENS_SEEN.clear()
+    llm = TokenBudget(max_tokens=4000, completion_reserve=300).limit_completion(
+        RecordingChat(responses=["-"])
+    )
+    llm.invoke("hola")
+    assert MAX_TOKENS_SEEN == [300]
+
+
+def test_node_calls_send_the_completion_reserve():
+    MAX_TOKENS_SEEN.clear()
+    orchestrator = AutopoieticOrchestrator(
+        llm=RecordingChat(responses=["-"]),
+        token_budget=TokenBudget(max_tokens=4000, completion_reserve=333),
+        background_metaproduction=False,
+        conversation_memory=False,
+        enforce_deadline=False,
+    )
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(
+            route="DIAGNOSTICO_ESTRUCTURAL", reasoning="stub", task_complexity=0.9, requires_new_agent=True
+        )
+    )
+    orchestrator.invoke("diseña un sistema nuevo", thread_id="hilo")
+    orchestrator.router.structured_llm = None
+    orchestrator.invoke("hola", thread_id="hilo")
+
+    # Brecha, diseño, respuesta provisional y ejecución directa
+    assert len(MAX_TOKENS_SEEN) == 4
+    assert set(MAX_TOKENS_SEEN) == {333}
+
+
+def test_oversized_task_is_trimmed_before_the_call():
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta"]),
+        token_budget=TokenBudget(max_tokens=600, completion_reserve=200),
+        conversation_memory=False,
+        enforce_deadline=False,
+    )
+    result = orchestrator.invoke("palabra " * 2000, thread_id="hilo")
+    execution = [record for record in result["token_usage"] if record["node"] == "direct_execution"][0]
+    assert "task" in execution["trimmed"]
+    assert execution["prompt_tokens"] <= 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
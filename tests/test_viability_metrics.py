@@ -0,0 +1,115 @@
+"""
+ViabilityMonitor: ventana circular de peticiones, percentiles, validación
+con SystemInvariants y KPIs por bandas para el prompt del router.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+# Añadir src al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from autopoietic_orchestrator import AutopoieticOrchestrator  # noqa: E402
+from orchestrator_state import RouterDecision  # noqa: E402
+from viability_metrics import ViabilityMonitor, format_kpis  # noqa: E402
+
+
+def test_empty_window_has_no_metrics():
+    monitor = ViabilityMonitor(window_size=4)
+    assert monitor.snapshot() is None and monitor.metrics() is None
+    assert format_kpis(None) == ""
+    with pytest.raises(ValueError):
+        ViabilityMonitor(window_size=0)
+
+
+def test_snapshot_aggregates_the_window():
+    monitor = ViabilityMonitor(window_size=100)
+    for latency in range(1, 101):
+        monitor.record(latency, cost=0.01, tokens=200, route="EJECUCION_DIRECTA")
+    snapshot = monitor.snapshot()
+
+    assert snapshot["window"] == 100
+    assert snapshot["latency_p50_ms"] == pytest.approx(50.5)
+    assert snapshot["latency_p95_ms"] == snapshot["latency_ms"] == pytest.approx(95.05)
+    assert snapshot["cost_per_request"] == pytest.approx(0.01)
+    assert snapshot["tokens_per_request"] == 200
+    assert snapshot["error_rate"] == 0 and snapshot["accuracy"] == 1
+    assert snapshot["diagnosis_rate"] == 0
+    assert snapshot["within_viability"] is True
+    assert monitor.metrics().latency_ms == pytest.approx(95.05)
+
+
+def test_window_only_keeps_the_latest_requests():
+    monitor = ViabilityMonitor(window_size=3)
+    monitor.record(10_000, error=True)
+    for _ in range(3):
+        monitor.record(100, route="DIAGNOSTICO_ESTRUCTURAL")
+    snapshot = monitor.snapshot()
+    assert monitor.total_requests == 4
+    assert snapshot["window"] == 3
+    assert snapshot["latency_p99_ms"] == 100 and snapshot["error_rate"] == 0
+    assert snapshot["diagnosis_rate"] == 1
+
+    monitor.reset()
+    assert monitor.snapshot() is None and monitor.total_requests == 0
+
+
+def test_invariant_violations_leave_the_viability_kernel():
+    monitor = ViabilityMonitor(window_size=10)
+    for index in range(10):
+        monitor.record(200, error=index < 3)
+    snapshot = monitor.snapshot()
+    assert snapshot["error_rate"] == pytest.approx(0.3)
+    assert snapshot["within_viability"] is False
+
+
+def test_snapshot_is_cached_until_the_next_record():
+    monitor = ViabilityMonitor(window_size=10)
+    monitor.record(100)
+    first = monitor.snapshot()
+    assert monitor.snapshot() is first
+    monitor.record(300)
+    assert monitor.snapshot() is not first
+
+
+def test_format_kpis_only_changes_between_bands():
+    monitor = ViabilityMonitor(window_size=10)
+    monitor.record(100)
+    fast = format_kpis(monitor.snapshot())
+    monitor.record(120)
+    # Otra latencia dentro de la misma banda: mismo texto (la caché acierta)
+    assert format_kpis(monitor.snapshot()) == fast
+    assert "holgada" in fast and "Dentro del núcleo de viabilidad: sí" in fast
+
+    for _ in range(10):
+        monitor.record(9000, error=True, route="DIAGNOSTICO_ESTRUCTURAL")
+    slow = format_kpis(monitor.snapshot())
+    assert "excedida" in slow and "por encima del umbral" in slow
+    assert "Tasa de diagnósticos estructurales: alta" in slow
+    assert "Dentro del núcleo de viabilidad: NO" in slow
+
+
+def test_orchestrator_records_each_request():
+    orchestrator = AutopoieticOrchestrator(
+        llm=FakeListChatModel(responses=["respuesta"]),
+        background_metaproduction=False,
+        viability_window=8,
+    )
+    orchestrator.router.structured_llm = RunnableLambda(
+        lambda _: RouterDecision(route="EJECUCION_DIRECTA", reasoning="stub", task_complexity=0.5, requires_new_agent=False)
+    )
+    first = orchestrator.invoke("hola", thread_id="hilo")
+    assert first["viability_kpis"] is None
+    second = orchestrator.invoke("hola otra vez", thread_id="hilo")
+
+    assert orchestrator.viability.total_requests == 2
+    assert second["viability_kpis"]["window"] == 1
+    assert orchestrator.viability_kpis()["tokens_per_request"] > 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))